@@ -40,32 +40,8 @@ warnings.simplefilter('module', DeprecationWarning)
 # Enable logging of python warnings.
 logging.captureWarnings(True)
 
-# XXX: respect the level? Need to translate between C and Python log levels.
-log_bd_message = lambda level, msg: program_log.info(msg)
-
-import gi
-gi.require_version("GLib", "2.0")
-gi.require_version("BlockDev", "1.0")
-
-# initialize the libblockdev library
-from gi.repository import GLib
-from gi.repository import BlockDev as blockdev
-if arch.is_s390():
-    _REQUESTED_PLUGIN_NAMES = set(("lvm", "btrfs", "swap", "crypto", "loop", "mdraid", "mpath", "dm", "s390"))
-else:
-    _REQUESTED_PLUGIN_NAMES = set(("lvm", "btrfs", "swap", "crypto", "loop", "mdraid", "mpath", "dm"))
-
-_requested_plugins = blockdev.plugin_specs_from_names(_REQUESTED_PLUGIN_NAMES)
-try:
-    succ_, avail_plugs = blockdev.try_reinit(require_plugins=_requested_plugins, reload=False, log_func=log_bd_message)
-except GLib.GError as err:
-    raise RuntimeError("Failed to intialize the libblockdev library: %s" % err)
-else:
-    avail_plugs = set(avail_plugs)
-
-missing_plugs = _REQUESTED_PLUGIN_NAMES - avail_plugs
-for p in missing_plugs:
-    log.info("Failed to load plugin %s", p)
+# libblockdev and its plugins are initialized on first use, see the
+# libblockdev module
 
 
 class _LazyImportObject(object):
@@ -20,16 +20,22 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import copy
 from functools import wraps
+import heapq
 
+from .actionplan import ExecutionPlan
 from .callbacks import callbacks as _callbacks
 from .deviceaction import ActionCreateDevice
 from .deviceaction import action_type_from_string, action_object_from_string
 from .devicelibs import lvm
-from .devices import PartitionDevice
+from .devices import LVMLogicalVolumeDevice, PartitionDevice
 from .errors import DiskLabelCommitError, StorageError
 from .flags import flags
+from .snapshot import journal
+from .static_data import lvm_info
 from . import tsort
 from .threads import blivet_lock, SynchronizedMeta
 
@@ -53,6 +59,24 @@ def with_flag(flag_attr):
     return run_func_with_flag_attr_set
 
 
+def _changes_lvm(action):
+    """ Return True if executing action changes the lvm metadata. """
+    return (action.device.type.startswith("lvm") or
+            (action.is_format and action.format.type == "lvmpv"))
+
+
+def _disklabel_disk(action):
+    """ Return the disk whose disklabel executing action may change, if any. """
+    device = action.device
+    if isinstance(device, PartitionDevice):
+        return device.disk
+
+    if action.is_format and action.format.type == "disklabel":
+        return device
+
+    return None
+
+
 class ActionList(object, metaclass=SynchronizedMeta):
     _unsynchronized_methods = ['process']
 
@@ -63,16 +87,86 @@ class ActionList(object, metaclass=SynchronizedMeta):
         self._completed_actions = []
         self.processing = False
 
+        # indexes of the registered actions, each mapping a key to a dict of
+        # actions keyed by action id
+        self._by_device = defaultdict(dict)
+        self._by_type = defaultdict(dict)
+        self._by_object = defaultdict(dict)
+        self._by_container = defaultdict(dict)
+        self._positions = {}
+        self._next_position = 0
+
+        # ordering requirements found by the last sort, mapping the id of an
+        # action (or a negative number for a barrier between action types)
+        # to the set of the ones that have to be executed before it
+        self._requirements = {}
+
     def __iter__(self):
         return iter(self._actions)
 
+    def _index_action(self, action, position=None):
+        """ Add an action to the indexes.
+
+            :keyword int position: sort key for the action's place in the
+                                   list, by default after all others
+        """
+        if position is None:
+            position = self._next_position
+            self._next_position += 1
+
+        self._positions[action.id] = position
+        self._by_device[action.device.id][action.id] = action
+        self._by_type[action.type][action.id] = action
+        self._by_object[action.obj][action.id] = action
+        if action.is_container:
+            self._by_container[action.container.id][action.id] = action
+
+    def _unindex_action(self, action):
+        """ Remove an action from the indexes. """
+        self._positions.pop(action.id, None)
+        self._by_device[action.device.id].pop(action.id, None)
+        self._by_type[action.type].pop(action.id, None)
+        self._by_object[action.obj].pop(action.id, None)
+        if action.is_container:
+            self._by_container[action.container.id].pop(action.id, None)
+
+    def _insert_action(self, index, action, position=None):
+        self._actions.insert(index, action)
+        self._index_action(action, position=position)
+        journal(self._delete_action, index)
+
+    def _delete_action(self, index):
+        action = self._actions.pop(index)
+        position = self._positions[action.id]
+        self._unindex_action(action)
+        journal(self._insert_action, index, action, position)
+        return action
+
+    def _append_action(self, action):
+        self._insert_action(len(self._actions), action)
+
+    def _set_actions(self, actions):
+        """ Replace the list of actions, rebuilding the indexes. """
+        journal(self._set_actions, self._actions)
+        self._actions = actions
+        for index in (self._by_device, self._by_type, self._by_object,
+                      self._by_container, self._positions):
+            index.clear()
+
+        for action in actions:
+            self._index_action(action)
+
+    def _in_order(self, actions):
+        """ Return the given registered actions in list order. """
+        return sorted(actions, key=lambda a: self._positions[a.id])
+
     def add(self, action):
         if self._add_func is not None:
             self._add_func(action)
 
         # apply the action before adding it in case apply raises an exception
         action.apply()
-        self._actions.append(action)
+        self._append_action(action)
         _callbacks.action_added(action=action)
         log.info("registered action: %s", action)
 
@@ -81,7 +175,7 @@ class ActionList(object, metaclass=SynchronizedMeta):
             self._remove_func(action)
 
         action.cancel()
-        self._actions.remove(action)
+        self._delete_action(self._actions.index(action))
         _callbacks.action_removed(action=action)
         log.info("canceled action %s", action)
 
@@ -114,8 +208,24 @@ class ActionList(object, metaclass=SynchronizedMeta):
         _type = action_type_from_string(action_type)
         _object = action_object_from_string(object_type)
 
+        # start from the smallest matching index, then filter on the rest
+        indexed = []
+        if device is not None:
+            indexed.append(self._by_device.get(device.id, {}))
+        if devid is not None:
+            indexed.append(self._by_device.get(devid, {}))
+        if _type is not None:
+            indexed.append(self._by_type.get(_type, {}))
+        if _object is not None:
+            indexed.append(self._by_object.get(_object, {}))
+
+        if indexed:
+            candidates = self._in_order(min(indexed, key=len).values())
+        else:
+            candidates = self._actions
+
         actions = []
-        for action in self._actions:
+        for action in candidates:
             if device is not None and action.device != device:
                 continue
 
@@ -136,57 +246,172 @@ class ActionList(object, metaclass=SynchronizedMeta):
         return actions
 
     def prune(self):
-        """ Remove redundant/obsolete actions from the action list. """
+        """ Remove redundant/obsolete actions from the action list.
+
+            An action can only obsolete actions on the same device or, for a
+            device destroy action, member actions on the destroyed container,
+            so only those are compared.
+        """
+        pruned = set()
         for action in reversed(self._actions[:]):
-            if action not in self._actions:
+            if action.id in pruned:
                 log.debug("action %d already pruned", action.id)
                 continue
 
-            for obsolete in self._actions[:]:
+            related = dict(self._by_device[action.device.id])
+            if action.is_destroy and action.is_device:
+                related.update(self._by_container.get(action.device.id, {}))
+
+            for obsolete in self._in_order(related.values()):
+                if obsolete.id in pruned:
+                    continue
+
                 if action.obsoletes(obsolete):
                     log.info("removing obsolete action %d (%d)",
                              obsolete.id, action.id)
-                    self._actions.remove(obsolete)
+                    pruned.add(obsolete.id)
 
-                    if obsolete.obsoletes(action) and action in self._actions:
+                    if obsolete.obsoletes(action) and action.id not in pruned:
                         log.info("removing mutually-obsolete action %d (%d)",
                                  action.id, obsolete.id)
-                        self._actions.remove(action)
+                        pruned.add(action.id)
+
+        if pruned:
+            self._set_actions([a for a in self._actions if a.id not in pruned])
 
     def sort(self):
-        """ Sort actions based on dependencies. """
+        """ Sort actions based on dependencies.
+
+            Rather than asking every action whether it requires every other
+            action, the actions are indexed by device, disk, volume group and
+            container, and only actions that can possibly require each other
+            are compared. The ordering of non-container actions by type is
+            expressed through one barrier node per action type instead of an
+            edge between every pair of actions of different types.
+        """
         if not self._actions:
             return
 
-        edges = []
+        candidates = self._sort_candidates()
 
         # collect all ordering requirements for the actions
-        for action in self._actions:
-            action_idx = self._actions.index(action)
-            children = []
-            for _action in self._actions:
-                if _action == action:
-                    continue
-
-                # create edges based on both action type and dependencies.
-                if _action.requires(action):
-                    children.append(_action)
-
-            for child in children:
-                child_idx = self._actions.index(child)
-                edges.append((action_idx, child_idx))
+        edges = []
+        for (idx, other_idx) in candidates:
+            action = self._actions[idx]
+            other = self._actions[other_idx]
+            if other.requires(action):
+                edges.append((idx, other_idx))
+            if action.requires(other):
+                edges.append((other_idx, idx))
+
+        # order actions by type using a chain of barrier nodes
+        by_type = defaultdict(list)
+        for (idx, action) in enumerate(self._actions):
+            if not action.is_container:
+                by_type[action.type].append(idx)
+
+        barrier = len(self._actions)
+        for (i, action_type) in enumerate(sorted(by_type, reverse=True)):
+            for idx in by_type[action_type]:
+                if i:
+                    edges.append((barrier - 1, idx))
+                edges.append((idx, barrier))
+            barrier += 1
 
         # create a graph reflecting the ordering information we have
-        graph = tsort.create_graph(list(range(len(self._actions))), edges)
+        edges.sort()
+        graph = tsort.create_graph(list(range(barrier)), edges)
 
         # perform a topological sort based on the graph's contents
         order = tsort.tsort(graph)
 
+        # keep the requirements for executing independent actions concurrently
+        def node_key(idx):
+            if idx < len(self._actions):
+                return self._actions[idx].id
+            return len(self._actions) - idx - 1
+
+        self._requirements = defaultdict(set)
+        for (parent, child) in edges:
+            self._requirements[node_key(child)].add(node_key(parent))
+
         # now replace self._actions with a sorted version of the same list
         actions = []
         for idx in order:
-            actions.append(self._actions[idx])
-        self._actions = actions
+            if idx < len(self._actions):
+                actions.append(self._actions[idx])
+        self._set_actions(actions)
+
+    def _sort_candidates(self):
+        """ Return the index pairs of actions that may require each other.
+
+            :returns: (lower, higher) pairs of indices into the action list
+            :rtype: set of tuple
+
+            Two actions can only require each other (other than by type) if
+            one operates on an ancestor of the other's device or on a device
+            depending on it other than as a descendant (like a snapshot and
+            its origin), if both are partition actions on the same disk, if
+            both create LVs in the same VG with different allocation priority,
+            or if one of them adds or removes a member of the other's
+            container.
+        """
+        by_device = defaultdict(list)
+        by_disk = defaultdict(list)
+        by_vg = defaultdict(list)
+        by_container = defaultdict(list)
+        for (idx, action) in enumerate(self._actions):
+            device = action.device
+            by_device[device.id].append(idx)
+            if isinstance(device, PartitionDevice) and device.disk is not None:
+                by_disk[device.disk.id].append(idx)
+            elif (action.is_create and action.is_device and
+                  isinstance(device, LVMLogicalVolumeDevice)):
+                by_vg[device.vg.id].append(idx)
+
+            containers = set(c for c in (action.container, getattr(device, "container", None))
+                             if c is not None)
+            for container in containers:
+                by_container[container.id].append(idx)
+
+        candidates = set()
+
+        def add_pair(idx, other_idx):
+            if idx != other_idx:
+                candidates.add((min(idx, other_idx), max(idx, other_idx)))
+
+        for (idx, action) in enumerate(self._actions):
+            device = action.device
+            related = list(device.ancestors) + device._extra_dependents
+            # a destroyed snapshot is no longer listed by its origin
+            related.extend(d for d in (getattr(device, "origin", None), getattr(device, "source", None))
+                           if d is not None)
+            for other in related:
+                for other_idx in by_device.get(other.id, []):
+                    add_pair(idx, other_idx)
+
+        for indices in by_disk.values():
+            for (i, idx) in enumerate(indices):
+                for other_idx in indices[i + 1:]:
+                    add_pair(idx, other_idx)
+
+        # see ActionCreateDevice.requires for the LV creation order
+        for indices in by_vg.values():
+            for (i, idx) in enumerate(indices):
+                lv = self._actions[idx].device
+                for other_idx in indices[i + 1:]:
+                    other_lv = self._actions[other_idx].device
+                    if (lv.cached != other_lv.cached or
+                            (lv.seg_type == "linear") != (other_lv.seg_type == "linear")):
+                        add_pair(idx, other_idx)
+
+        for indices in by_container.values():
+            members = [idx for idx in indices if self._actions[idx].is_container]
+            for idx in members:
+                for other_idx in indices:
+                    add_pair(idx, other_idx)
+
+        return candidates
 
     def _pre_process(self, devices=None):
         """ Prepare the action queue for execution. """
@@ -238,26 +463,30 @@ class ActionList(object, metaclass=SynchronizedMeta):
         #     tree (eg: non-existent sda6 and previous sda6 that will become
         #     sda5 in the course of partitioning), so we access the list
         #     directly here.
-        for device in devices:
-            if isinstance(device, PartitionDevice) and \
-               device.is_extended and not device.exists and \
-               not self.find(device=device, action_type="create"):
-                # don't properly register the action since the device is
-                # already in the tree
-                action = ActionCreateDevice(device)
-                # apply the action first in case the apply method fails
-                action.apply()
-                self._actions.append(action)
+        for device in self._unregistered_extended_partitions(devices):
+            # don't properly register the action since the device is
+            # already in the tree
+            action = ActionCreateDevice(device)
+            # apply the action first in case the apply method fails
+            action.apply()
+            self._append_action(action)
 
         log.info("sorting actions...")
         self.sort()
+        in_tree = set(devices)
         for action in self._actions:
             log.debug("action: %s", action)
 
             # Remove lvm filters for devices we are operating on
-            for device in (d for d in devices if d.depends_on(action.device)):
+            for device in (d for d in action.device.dependents if d in in_tree):
                 lvm.lvm_cc_removeFilterRejectRegexp(device.name)
 
+    def _unregistered_extended_partitions(self, devices):
+        """ Return the new extended partitions without a create action. """
+        return [d for d in devices
+                if isinstance(d, PartitionDevice) and d.is_extended and not d.exists and
+                not self.find(device=d, action_type="create")]
+
     def _post_process(self, devices=None):
         """ Clean up relics from action queue execution. """
         devices = devices or []
@@ -299,52 +528,253 @@ class ActionList(object, metaclass=SynchronizedMeta):
         devices = [a.name for a in active if any(d in disks for d in a.disks)]
         return devices
 
+    def _execute_action(self, action, callbacks=None, devices=None):
+        """ Execute an action, retrying after a failed disklabel commit. """
+        devices = devices or []
+        try:
+            action.execute(callbacks)
+        except DiskLabelCommitError:
+            # it's likely that a previous action
+            # triggered setup of an lvm or md device.
+            # include deps no longer in the tree due to pending removal
+            devs = devices + [a.device for a in self._actions]
+            for dep in set(devs):
+                if dep.exists and \
+                   any(dep.depends_on(disk) for disk in action.device.disks):
+                    dep.teardown(recursive=True)
+
+            action.execute(callbacks)
+
+    def _complete_action(self, action, devices=None):
+        """ Update the list and the devices after an action was executed.
+
+            :param devices: devices that may have been renumbered by the action
+        """
+        devices = devices or []
+        if _changes_lvm(action):
+            lvm_info.drop_cache()
+
+        for device in devices:
+            # make sure we catch any renumbering parted does
+            if device.exists and isinstance(device, PartitionDevice):
+                # also update existence for partitions on unsupported disklabels
+                if not device.disklabel_supported and \
+                   action.is_destroy and action.is_format and action.device == device.disk:
+                    device.exists = False
+                    continue
+
+                device.update_name()
+                device.format.device = device.path
+
+        self._completed_actions.append(self._delete_action(self._actions.index(action)))
+        _callbacks.action_executed(action=action)
+
+    def _process_concurrently(self, callbacks=None, devices=None, workers=2):
+        """ Execute the sorted actions, running their programs concurrently.
+
+            Every action is performed by the calling thread, which keeps
+            holding the global lock. Only the external programs returned by
+            :meth:`~.deviceaction.DeviceAction.prepare` are run by a pool of
+            worker threads, up to the given number at a time; they do not use
+            any blivet state. An action is started as soon as all actions it
+            requires have been finished. Actions that may change the same
+            disk's disklabel are executed one at a time in their sorted order.
+
+            If an action fails to commit a disklabel, the running programs
+            are waited for and the action is executed again. Any other error
+            stops the execution once the running programs have finished and
+            is raised again.
+        """
+        devices = devices or []
+        actions = dict((a.id, a) for a in self._actions)
+        positions = dict((a.id, i) for (i, a) in enumerate(self._actions))
+
+        # the unmet requirements of the actions and the barriers between them
+        requirements = dict((key, set(reqs)) for (key, reqs) in self._requirements.items())
+        dependents = defaultdict(list)
+        for (key, reqs) in requirements.items():
+            for req in reqs:
+                dependents[req].append(key)
+
+        # actions on each disk's disklabel, in the order they have to run in
+        disk_queues = defaultdict(deque)
+        for action in self._actions:
+            disk = _disklabel_disk(action)
+            if disk is not None:
+                disk_queues[disk.id].append(action.id)
+
+        ready = []
+
+        def satisfy(key):
+            keys = [key]
+            while keys:
+                key = keys.pop()
+                for dependent in dependents.pop(key, []):
+                    requirements[dependent].discard(key)
+                    if not requirements[dependent]:
+                        if dependent < 0:
+                            keys.append(dependent)
+                        else:
+                            heapq.heappush(ready, (positions[dependent], dependent))
+
+        for action in self._actions:
+            if not requirements.get(action.id):
+                heapq.heappush(ready, (positions[action.id], action.id))
+
+        def complete(action):
+            disk = _disklabel_disk(action)
+            if disk is not None:
+                disk_queues[disk.id].popleft()
+                renumbered = [d for d in devices
+                              if isinstance(d, PartitionDevice) and d.disk == disk]
+            else:
+                renumbered = []
+
+            self._complete_action(action, devices=renumbered)
+            satisfy(action.id)
+
+        running = {}
+        retries = []
+        error = None
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while running or retries or (ready and error is None):
+                started = False
+                waiting = []
+                while ready and not retries and error is None and len(running) < workers:
+                    (position, key) = heapq.heappop(ready)
+                    action = actions[key]
+                    disk = _disklabel_disk(action)
+                    if disk is not None and disk_queues[disk.id][0] != key:
+                        waiting.append((position, key))
+                        continue
+
+                    log.info("executing action: %s", action)
+                    started = True
+                    try:
+                        program = action.prepare(callbacks)
+                    except DiskLabelCommitError:
+                        retries.append(action)
+                        continue
+                    except Exception as e:  # pylint: disable=broad-except
+                        error = e
+                        continue
+
+                    if program is None:
+                        complete(action)
+                    else:
+                        running[pool.submit(program)] = action
+
+                for item in waiting:
+                    heapq.heappush(ready, item)
+
+                if running:
+                    (done, _not_done) = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in sorted(done, key=lambda f: positions[running[f].id]):
+                        action = running.pop(future)
+                        if future.exception() is not None:
+                            error = error or future.exception()
+                        else:
+                            action.finish(callbacks)
+                            complete(action)
+                elif retries:
+                    # nothing else is running, so the devices using the disk
+                    # can be deactivated safely
+                    action = retries.pop(0)
+                    self._execute_action(action, callbacks, devices=devices)
+                    complete(action)
+                elif not started:
+                    break
+
+        if error is not None:
+            raise error
+
+        if self._actions:
+            raise RuntimeError("failed to schedule actions: %s" %
+                               ", ".join(str(a) for a in self._actions))
+
+    def _plan(self, devices=None):
+        """ Return the estimated cost of executing the actions.
+
+            :rtype: :class:`~.actionplan.ExecutionPlan`
+
+            The actions are pruned and sorted in a separate list, so neither
+            this list nor the devices are changed.
+        """
+        devices = devices or []
+        planned = ActionList()
+        planned._set_actions(self._actions[:])
+        planned.prune()
+
+        # the extended partitions _pre_process would add, without applying
+        for device in planned._unregistered_extended_partitions(devices):
+            planned._append_action(ActionCreateDevice(device))
+
+        planned.sort()
+        for action in planned:
+            log.info("planned action: %s", action)
+
+        plan = planned._execution_plan()
+        log.info("execution plan: %s written in about %.1f seconds, "
+                 "%.1f actions at a time on average",
+                 plan.bytes_written, plan.duration, plan.parallelism)
+        return plan
+
+    def _execution_plan(self):
+        """ Return the estimated cost of executing the sorted actions.
+
+            :rtype: :class:`~.actionplan.ExecutionPlan`
+        """
+        requirements = defaultdict(set)
+        for (key, reqs) in self._requirements.items():
+            requirements[key].update(reqs)
+
+        # actions on the same disk's disklabel are executed one at a time
+        previous = {}
+        for action in self._actions:
+            disk = _disklabel_disk(action)
+            if disk is not None:
+                if disk.id in previous:
+                    requirements[action.id].add(previous[disk.id])
+                previous[disk.id] = action.id
+
+        return ExecutionPlan(self._actions, requirements)
+
     @with_flag("processing")
-    def process(self, callbacks=None, devices=None, dry_run=None):
+    def process(self, callbacks=None, devices=None, dry_run=None, workers=1):
         """
         Execute all registered actions.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :param devices: a list of all devices current in the devicetree
         :type callbacks: :class:`~.callbacks.DoItCallbacks`
+        :keyword bool dry_run: only log the actions and return the plan,
+                               without changing the actions or the devices
+        :keyword int workers: number of external programs to run concurrently
+        :returns: the estimated cost of executing the actions if dry_run
+        :rtype: :class:`~.actionplan.ExecutionPlan` or NoneType
+
+        With more than one worker, the external programs of actions that do
+        not require each other run concurrently, see
+        :meth:`_process_concurrently`. The actions themselves and the
+        callbacks are still run by the calling thread.
 
         """
         devices = devices or []
+        if dry_run:
+            with blivet_lock:
+                return self._plan(devices=devices)
+
         self._pre_process(devices=devices)
 
+        if workers > 1:
+            self._process_concurrently(callbacks=callbacks, devices=devices, workers=workers)
+            self._post_process(devices=devices)
+            return
+
         for action in self._actions[:]:
             log.info("executing action: %s", action)
-            if dry_run:
-                continue
-
             with blivet_lock:
-                try:
-                    action.execute(callbacks)
-                except DiskLabelCommitError:
-                    # it's likely that a previous action
-                    # triggered setup of an lvm or md device.
-                    # include deps no longer in the tree due to pending removal
-                    devs = devices + [a.device for a in self._actions]
-                    for dep in set(devs):
-                        if dep.exists and \
-                           any(dep.depends_on(disk) for disk in action.device.disks):
-                            dep.teardown(recursive=True)
-
-                    action.execute(callbacks)
-
-                for device in devices:
-                    # make sure we catch any renumbering parted does
-                    if device.exists and isinstance(device, PartitionDevice):
-                        # also update existence for partitions on unsupported disklabels
-                        if not device.disklabel_supported and \
-                           action.is_destroy and action.is_format and action.device == device.disk:
-                            device.exists = False
-                            continue
-
-                        device.update_name()
-                        device.format.device = device.path
-
-                self._completed_actions.append(self._actions.pop(0))
-                _callbacks.action_executed(action=action)
+                self._execute_action(action, callbacks, devices=devices)
+                self._complete_action(action, devices=devices)
 
         self._post_process(devices=devices)
@@ -0,0 +1,324 @@
+# actionplan.py
+# Cost estimates for executing a list of actions.
+#
+# Copyright (C) 2017  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+from .deviceaction import ACTION_TYPE_CREATE, ACTION_TYPE_DESTROY, ACTION_TYPE_RESIZE
+from .errors import StorageError
+from .size import Size
+
+import logging
+log = logging.getLogger("blivet")
+
+# amount of data written to wipe a format's signatures
+WIPE_SIZE = Size("64 KiB")
+
+# amount of data written to update a disklabel or the metadata of a
+# volume group, an md array or a LUKS device
+METADATA_SIZE = Size("1 MiB")
+
+# fixed and relative amount of metadata written when creating a format, by
+# format type
+FORMAT_METADATA = {"ext2": (Size("1 MiB"), 0.016),
+                   "ext3": (Size("128 MiB"), 0.016),
+                   "ext4": (Size("128 MiB"), 0.016),
+                   "xfs": (Size("10 MiB"), 0.001),
+                   "btrfs": (Size("16 MiB"), 0.0),
+                   "vfat": (Size("1 MiB"), 0.004),
+                   "efi": (Size("1 MiB"), 0.004),
+                   "swap": (Size("4 KiB"), 0.0),
+                   "lvmpv": (METADATA_SIZE, 0.0),
+                   "luks": (Size("2 MiB"), 0.0),
+                   "mdmember": (METADATA_SIZE, 0.0),
+                   "disklabel": (METADATA_SIZE, 0.0)}
+DEFAULT_FORMAT_METADATA = (Size("1 MiB"), 0.01)
+
+# default timing model: time spent on each external program and rate of
+# writing data
+COMMAND_TIME = 0.5
+THROUGHPUT = Size("100 MiB")
+
+
+def _format_metadata_size(fmt, size):
+    (fixed, ratio) = FORMAT_METADATA.get(fmt.type, DEFAULT_FORMAT_METADATA)
+    return min(size, fixed + Size(int(size) * ratio))
+
+
+def _used_size(fmt):
+    """ Return the amount of data stored in a format, as far as it is known. """
+    try:
+        return fmt.current_size - fmt.free
+    except (AttributeError, StorageError):
+        return fmt.current_size
+
+
+def estimate_bytes(action):
+    """ Return the estimated amount of data executing an action writes.
+
+        :param action: the action
+        :type action: :class:`~.deviceaction.DeviceAction`
+        :rtype: :class:`~.size.Size`
+
+        Data that is moved, by shrinking a filesystem, moving extents off
+        a physical volume or syncing an md array, is counted as written.
+    """
+    device = action.device
+    if action.is_format:
+        if action.is_create:
+            return _format_metadata_size(action.format, device.size)
+        elif action.is_destroy:
+            return WIPE_SIZE
+        elif action.is_shrink:
+            # at most the data beyond the new end of the filesystem is moved
+            delta = action.orig_size - device.format.target_size
+            return max(Size(0), min(delta, _used_size(device.format)))
+        else:
+            delta = device.format.target_size - action.orig_size
+            return _format_metadata_size(device.format, max(Size(0), delta))
+
+    redundant = getattr(getattr(device, "level", None), "has_redundancy", lambda: False)()
+    if action.is_create and action.is_device:
+        if device.type == "mdarray" and redundant:
+            # the initial sync writes all of the members
+            return sum((m.size for m in device.members), Size(0))
+        return METADATA_SIZE
+    elif action.is_resize:
+        if device.type == "mdarray" and redundant and action.is_grow:
+            return (device.target_size - action.origsize) * max(1, len(device.members))
+        return METADATA_SIZE
+    elif action.is_add:
+        if action.container.type == "mdarray":
+            # the new member gets synced with the others
+            return device.size
+        return METADATA_SIZE
+    elif action.is_remove:
+        if action.container.type == "lvmvg" and device.format.type == "lvmpv":
+            # the used extents are moved to the remaining members
+            try:
+                return max(Size(0), device.format.size - device.format.free)
+            except StorageError:
+                return device.format.size
+        return METADATA_SIZE
+
+    return METADATA_SIZE
+
+
+def _mkfs_command(fmt):
+    try:
+        return fmt._mkfs._mkfs_command([], False)
+    except (AttributeError, StorageError, NotImplementedError):
+        return None
+
+
+def _resize_command(fmt):
+    try:
+        return fmt._resize._resize_command()
+    except (AttributeError, StorageError, NotImplementedError):
+        return None
+
+
+# commands run for device actions, by action type and device type
+_DEVICE_COMMANDS = {(ACTION_TYPE_CREATE, "lvmvg"): lambda d: [["vgcreate", d.name] + [p.path for p in d.parents]],
+                    (ACTION_TYPE_CREATE, "lvmlv"): lambda d: [["lvcreate", "-n", d.lvname, d.vg.name]],
+                    (ACTION_TYPE_CREATE, "lvmthinpool"): lambda d: [["lvcreate", "--thinpool", d.lvname, d.vg.name]],
+                    (ACTION_TYPE_CREATE, "lvmthinlv"): lambda d: [["lvcreate", "--thin", d.lvname, d.vg.name]],
+                    (ACTION_TYPE_CREATE, "mdarray"): lambda d: [["mdadm", "--create", d.path] + [m.path for m in d.members]],
+                    (ACTION_TYPE_DESTROY, "lvmvg"): lambda d: [["vgreduce", d.name], ["vgremove", d.name]],
+                    (ACTION_TYPE_DESTROY, "lvmlv"): lambda d: [["lvremove", d.path]],
+                    (ACTION_TYPE_DESTROY, "lvmthinpool"): lambda d: [["lvremove", d.path]],
+                    (ACTION_TYPE_DESTROY, "lvmthinlv"): lambda d: [["lvremove", d.path]],
+                    (ACTION_TYPE_DESTROY, "mdarray"): lambda d: [["mdadm", "--zero-superblock", m.path] for m in d.members],
+                    (ACTION_TYPE_RESIZE, "lvmlv"): lambda d: [["lvresize", d.path]],
+                    (ACTION_TYPE_RESIZE, "lvmthinpool"): lambda d: [["lvresize", d.path]],
+                    (ACTION_TYPE_RESIZE, "lvmthinlv"): lambda d: [["lvresize", d.path]],
+                    (ACTION_TYPE_RESIZE, "mdarray"): lambda d: [["mdadm", "--grow", d.path]]}
+
+
+def external_commands(action):
+    """ Return the external programs executing an action is expected to run.
+
+        :param action: the action
+        :type action: :class:`~.deviceaction.DeviceAction`
+        :returns: argument lists, exact where blivet builds them itself
+        :rtype: list of list of str
+
+        Changes to disklabels are made through libparted and do not run
+        any program.
+    """
+    device = action.device
+    if action.is_format:
+        fmt = action.format
+        if fmt.type in ("disklabel", None):
+            return []
+        elif action.is_create:
+            command = _mkfs_command(fmt)
+            if command is None:
+                command = {"lvmpv": ["pvcreate", device.path],
+                           "luks": ["cryptsetup", "luksFormat", device.path],
+                           "swap": ["mkswap", device.path]}.get(fmt.type)
+            return [command] if command else []
+        elif action.is_destroy:
+            return [["wipefs", "-f", "-a", device.path]]
+        else:
+            command = _resize_command(fmt)
+            return [command] if command else []
+
+    if action.is_add or action.is_remove:
+        container = action.container
+        if container.type == "mdarray":
+            return [["mdadm", "--add" if action.is_add else "--remove", container.path, device.path]]
+        elif action.is_add:
+            return [["vgextend", container.name, device.path]]
+        else:
+            return [["pvmove", device.path], ["vgreduce", container.name, device.path]]
+
+    commands = _DEVICE_COMMANDS.get((action.type, device.type))
+    return commands(device) if commands else []
+
+
+class PlannedAction(object):
+
+    """ The estimated cost of executing one action. """
+
+    def __init__(self, action, requires, bytes_written, commands, duration):
+        self.action = action
+        self.requires = requires
+        self.bytes_written = bytes_written
+        self.commands = commands
+        self.duration = duration
+        self.start = 0.0
+        self.finish = duration
+
+    def to_dict(self):
+        return {"id": self.action.id,
+                "action": str(self.action),
+                "requires": sorted(self.requires),
+                "bytes_written": int(self.bytes_written),
+                "commands": self.commands,
+                "duration": self.duration,
+                "start": self.start,
+                "finish": self.finish}
+
+
+class ExecutionPlan(object):
+
+    """ Estimated cost of executing a sorted list of actions.
+
+        Every action takes :const:`COMMAND_TIME` per external program plus the
+        time to write its data at the given throughput. With enough workers
+        each action can start as soon as the actions it requires are done, so
+        the plan's duration is the length of the longest (critical) path
+        through the requirements. The parallelism is the total duration of
+        all the actions divided by that.
+    """
+
+    def __init__(self, actions, requirements, throughput=THROUGHPUT, command_time=COMMAND_TIME):
+        """
+            :param actions: the sorted actions
+            :type actions: list of :class:`~.deviceaction.DeviceAction`
+            :param dict requirements: action ids (or negative numbers for
+                                      barriers between groups of actions)
+                                      mapped to the ones they require
+            :keyword throughput: amount of data written per second
+            :type throughput: :class:`~.size.Size`
+            :keyword float command_time: time taken by each external program
+        """
+        self.throughput = throughput
+        self.command_time = command_time
+        self.steps = []
+        for action in actions:
+            written = estimate_bytes(action)
+            commands = external_commands(action)
+            duration = len(commands) * command_time + float(written) / float(throughput)
+            requires = set(key for key in self._action_requirements(action.id, requirements))
+            self.steps.append(PlannedAction(action, requires, written, commands, duration))
+
+        self.critical_path = []
+        self._schedule()
+
+    @staticmethod
+    def _action_requirements(key, requirements):
+        """ Yield the ids of the actions key requires, looking through barriers. """
+        seen = set()
+        keys = list(requirements.get(key, []))
+        while keys:
+            key = keys.pop()
+            if key in seen:
+                continue
+
+            seen.add(key)
+            if key < 0:
+                keys.extend(requirements.get(key, []))
+            else:
+                yield key
+
+    def _schedule(self):
+        # the sorted list is a topological order of the actions
+        by_id = dict((step.action.id, step) for step in self.steps)
+        for step in self.steps:
+            required = [by_id[key] for key in step.requires if key in by_id]
+            step.start = max([r.finish for r in required] or [0.0])
+            step.finish = step.start + step.duration
+
+        if not self.steps:
+            return
+
+        step = max(self.steps, key=lambda s: s.finish)
+        path = [step]
+        while step.start > 0:
+            step = max((by_id[key] for key in step.requires if key in by_id),
+                       key=lambda s: s.finish)
+            path.append(step)
+
+        self.critical_path = [s.action for s in reversed(path)]
+
+    @property
+    def bytes_written(self):
+        return sum((step.bytes_written for step in self.steps), Size(0))
+
+    @property
+    def duration(self):
+        return max([step.finish for step in self.steps] or [0.0])
+
+    @property
+    def parallelism(self):
+        """ Average number of actions running at the same time. """
+        if not self.duration:
+            return 1.0
+
+        return sum(step.duration for step in self.steps) / self.duration
+
+    @property
+    def max_parallelism(self):
+        """ Largest number of actions running at the same time. """
+        events = sorted([(step.start, 1) for step in self.steps if step.duration] +
+                        [(step.finish, -1) for step in self.steps if step.duration])
+        (running, peak) = (0, 0)
+        for (_time, change) in events:
+            running += change
+            peak = max(peak, running)
+
+        return peak or min(1, len(self.steps))
+
+    def to_dict(self):
+        return {"actions": [step.to_dict() for step in self.steps],
+                "bytes_written": int(self.bytes_written),
+                "duration": self.duration,
+                "critical_path": [action.id for action in self.critical_path],
+                "parallelism": self.parallelism,
+                "max_parallelism": self.max_parallelism}
@@ -131,16 +131,21 @@ class Blivet(object, metaclass=SynchronizedMeta):
             log.debug("new sysroot: %s", sysroot)
             self._sysroot = sysroot
 
-    def do_it(self, callbacks=None):
+    def do_it(self, callbacks=None, workers=1, dry_run=False):
         """
         Commit queued changes to disk.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :type callbacks: return value of the :func:`~.callbacks.create_new_callbacks_register`
+        :keyword int workers: number of external programs to run concurrently
+        :keyword bool dry_run: only estimate the cost of executing the actions
+        :returns: the estimated cost if dry_run, otherwise None
+        :rtype: :class:`~.actionplan.ExecutionPlan` or NoneType
 
         """
 
-        self.devicetree.actions.process(callbacks=callbacks, devices=self.devices)
+        return self.devicetree.actions.process(callbacks=callbacks, devices=self.devices,
+                                               workers=workers, dry_run=dry_run)
 
     @property
     def next_id(self):
@@ -178,9 +183,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
     @property
     def devices(self):
         """ A list of all the devices in the device tree. """
-        devices = self.devicetree.devices
-        devices.sort(key=lambda d: d.name)
-        return devices
+        return self.devicetree.get_devices_by_view("devices")
 
     @property
     def disks(self):
@@ -193,12 +196,11 @@ class Blivet(object, metaclass=SynchronizedMeta):
             system's disks.
         """
         disks = []
-        for device in self.devicetree.devices:
-            if device.is_disk:
-                if not device.media_present:
-                    log.info("Skipping disk: %s: No media present", device.name)
-                    continue
-                disks.append(device)
+        for device in self.devicetree.get_devices_by_view("disks"):
+            if not device.media_present:
+                log.info("Skipping disk: %s: No media present", device.name)
+                continue
+            disks.append(device)
         disks.sort(key=self.compare_disks_key)
         return disks
 
@@ -216,17 +218,13 @@ class Blivet(object, metaclass=SynchronizedMeta):
             system's disks.
         """
         partitioned = []
-        for device in self.devicetree.devices:
-            if not device.partitioned:
-                continue
-
+        for device in self.devicetree.get_devices_by_view("partitioned"):
             if not device.media_present:
                 log.info("Skipping device: %s: No media present", device.name)
                 continue
 
             partitioned.append(device)
 
-        partitioned.sort(key=lambda d: d.name)
         return partitioned
 
     @property
@@ -237,9 +235,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        partitions = [d for d in self.devices if isinstance(d, PartitionDevice)]
-        partitions.sort(key=lambda d: d.name)
-        return partitions
+        return self.devicetree.get_devices_by_view("partitions")
 
     @property
     def vgs(self):
@@ -249,9 +245,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        vgs = [d for d in self.devices if d.type == "lvmvg"]
-        vgs.sort(key=lambda d: d.name)
-        return vgs
+        return self.devicetree.get_devices_by_view("vgs")
 
     @property
     def lvs(self):
@@ -261,8 +255,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        lvs = (d for d in self.devices if d.type in ("lvmlv", "lvmthinpool", "lvmthinlv"))
-        return sorted(lvs, key=lambda d: d.name)
+        return self.devicetree.get_devices_by_view("lvs")
 
     @property
     def thinlvs(self):
@@ -272,9 +265,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        thin = [d for d in self.devices if d.type == "lvmthinlv"]
-        thin.sort(key=lambda d: d.name)
-        return thin
+        return self.devicetree.get_devices_by_view("thinlvs")
 
     @property
     def thinpools(self):
@@ -284,9 +275,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        pools = [d for d in self.devices if d.type == "lvmthinpool"]
-        pools.sort(key=lambda d: d.name)
-        return pools
+        return self.devicetree.get_devices_by_view("thinpools")
 
     @property
     def pvs(self):
@@ -296,10 +285,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        devices = self.devicetree.devices
-        pvs = [d for d in devices if d.format.type == "lvmpv"]
-        pvs.sort(key=lambda d: d.name)
-        return pvs
+        return self.devicetree.get_devices_by_view("pvs")
 
     @property
     def mdarrays(self):
@@ -309,16 +295,12 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        arrays = [d for d in self.devices if d.type == "mdarray"]
-        arrays.sort(key=lambda d: d.name)
-        return arrays
+        return self.devicetree.get_devices_by_view("mdarrays")
 
     @property
     def mdcontainers(self):
         """ A list of the MD containers in the device tree. """
-        arrays = [d for d in self.devices if d.type == "mdcontainer"]
-        arrays.sort(key=lambda d: d.name)
-        return arrays
+        return self.devicetree.get_devices_by_view("mdcontainers")
 
     @property
     def mdmembers(self):
@@ -328,10 +310,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        devices = self.devicetree.devices
-        members = [d for d in devices if d.format.type == "mdmember"]
-        members.sort(key=lambda d: d.name)
-        return members
+        return self.devicetree.get_devices_by_view("mdmembers")
 
     @property
     def btrfs_volumes(self):
@@ -341,8 +320,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        return sorted((d for d in self.devices if d.type == "btrfs volume"),
-                      key=lambda d: d.name)
+        return self.devicetree.get_devices_by_view("btrfs_volumes")
 
     @property
     def swaps(self):
@@ -352,10 +330,7 @@ class Blivet(object, metaclass=SynchronizedMeta):
             does not necessarily reflect the actual on-disk state of the
             system's disks.
         """
-        devices = self.devicetree.devices
-        swaps = [d for d in devices if d.format.type == "swap"]
-        swaps.sort(key=lambda d: d.name)
-        return swaps
+        return self.devicetree.get_devices_by_view("swaps")
 
     @property
     def encryption_passphrase(self):
@@ -1017,7 +992,11 @@ class Blivet(object, metaclass=SynchronizedMeta):
         self.devicetree.setup_disk_images()
 
     def dump_state(self, suffix):
-        """ Dump the current device list to the storage shelf. """
+        """ Dump the current device list to the storage shelf.
+
+            The profile of the last populate is dumped along with it, if
+            there is one.
+        """
         key = "devices.%d.%s" % (time.time(), suffix)
         with contextlib.closing(shelve.open(self._dump_file)) as shelf:
             try:
@@ -1025,6 +1004,10 @@ class Blivet(object, metaclass=SynchronizedMeta):
             except AttributeError:
                 log_exception_info()
 
+            profile = self.devicetree.populate_profile
+            if profile is not None:
+                shelf["populate_profile.%d.%s" % (time.time(), suffix)] = profile.report()
+
     @property
     def packages(self):
         pkgs = set()
@@ -1234,6 +1217,29 @@ class Blivet(object, metaclass=SynchronizedMeta):
         factory.configure()
         return factory.device
 
+    def snapshot(self):
+        """ Return a snapshot of the current state of the storage model.
+
+            This is much cheaper than :meth:`copy`. See
+            :meth:`~.devicetree.DeviceTree.snapshot`.
+
+            :rtype: :class:`~.snapshot.Snapshot`
+        """
+        snapshot = self.devicetree.snapshot()
+        snapshot.save_attrs(self, "roots")
+        for root in self.roots:
+            snapshot.save_attrs(root, "mounts", "swaps")
+
+        return snapshot
+
+    def restore_snapshot(self, snapshot):
+        """ Undo all changes to the storage model since a snapshot was taken.
+
+            :param snapshot: a snapshot from :meth:`snapshot`
+            :type snapshot: :class:`~.snapshot.Snapshot`
+        """
+        self.devicetree.restore_snapshot(snapshot)
+
     def copy(self):
         log.debug("starting Blivet copy")
         new = copy.deepcopy(self)
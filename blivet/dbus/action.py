@@ -40,8 +40,7 @@ class DBusAction(DBusObject):
     def interface(self):
         return ACTION_INTERFACE
 
-    @property
-    def properties(self):
+    def _get_properties(self):
         props = {"Description": str(self._action),
                  "Device": dbus.ObjectPath(self._manager.get_object_by_id(self._action.device.id).object_path),
                  "Format": dbus.ObjectPath(self._manager.get_object_by_id(self._action.format.id).object_path),
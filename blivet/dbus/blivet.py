@@ -61,6 +61,9 @@ class DBusBlivet(DBusObject):
         callbacks.action_added.add(self._action_added)
         callbacks.action_removed.add(self._action_removed)
         callbacks.action_executed.add(self._action_executed)
+        callbacks.attribute_changed.add(self._attribute_changed)
+        callbacks.parent_added.add(self._parent_changed)
+        callbacks.parent_removed.add(self._parent_changed)
 
     @property
     def id(self):
@@ -74,8 +77,7 @@ class DBusBlivet(DBusObject):
     def interface(self):
         return BLIVET_INTERFACE
 
-    @property
-    def properties(self):
+    def _get_properties(self):
         props = {"Devices": self.ListDevices(),
                  "DEVICE_TYPE_LVM": DEVICE_TYPE_LVM,
                  "DEVICE_TYPE_LVM_THINP": DEVICE_TYPE_LVM_THINP,
@@ -100,6 +102,8 @@ class DBusBlivet(DBusObject):
             removed.present = False
             self._manager.add_object(removed)
 
+        self._device_path_changed(device)
+
     def _device_added(self, device):
         """ Update ObjectManager interface after a device is added. """
         added = self._manager.get_object_by_id(device.id)
@@ -110,6 +114,7 @@ class DBusBlivet(DBusObject):
             added = DBusDevice(device, self._manager)
 
         self._manager.add_object(added)
+        self._device_path_changed(device)
 
     def _format_removed(self, device, fmt, keep=True):  # pylint: disable=unused-argument
         removed = self._manager.get_object_by_id(fmt.id)
@@ -122,6 +127,8 @@ class DBusBlivet(DBusObject):
             removed.present = False
             self._manager.add_object(removed)
 
+        self._format_path_changed(device, fmt)
+
     def _format_added(self, device, fmt):  # pylint: disable=unused-argument
         added = self._manager.get_object_by_id(fmt.id)
         if added:
@@ -131,6 +138,7 @@ class DBusBlivet(DBusObject):
             added = DBusFormat(fmt, self._manager)
 
         self._manager.add_object(added)
+        self._format_path_changed(device, fmt)
 
     def _action_removed(self, action):
         removed = self._manager.get_object_by_id(action.id)
@@ -149,6 +157,35 @@ class DBusBlivet(DBusObject):
 
         self._action_removed(action)
 
+    def _invalidate_properties(self, *items):
+        """ Make the objects of blivet's devices, formats or actions rebuild their properties. """
+        for item in items:
+            obj = self._manager.get_object_by_id(item.id)
+            if obj is not None:
+                obj.invalidate_properties()
+
+    def _actions_on(self, item):
+        """ Return the actions whose object refers to a device or format. """
+        dbus_actions = (a for a in self._manager.objects if isinstance(a, DBusAction))
+        return [a._action for a in dbus_actions
+                if item in (a._action.device, a._action.format)]
+
+    def _device_path_changed(self, device):
+        """ Rebuild the properties referring to a device's object path. """
+        # the device list is one of this object's properties
+        self.invalidate_properties()
+        self._invalidate_properties(*(list(device.parents) + device.children + self._actions_on(device)))
+
+    def _format_path_changed(self, device, fmt):
+        """ Rebuild the properties referring to a format's object path. """
+        self._invalidate_properties(device, *self._actions_on(fmt))
+
+    def _attribute_changed(self, device, attr, old, new, fmt=None):  # pylint: disable=unused-argument
+        self._invalidate_properties(device, fmt or device.format)
+
+    def _parent_changed(self, device, parent):
+        self._invalidate_properties(device, parent)
+
     def _list_dbus_devices(self, removed=False):
         dbus_devices = (d for d in self._manager.objects if isinstance(d, DBusDevice))
         return [d for d in dbus_devices if removed or d.present]
@@ -171,14 +208,15 @@ class DBusBlivet(DBusObject):
     @dbus.service.method(dbus_interface=BLIVET_INTERFACE)
     def Reset(self):
         """ Reset the Blivet instance and populate the device tree. """
-        old_devices = self._blivet.devices[:]
-        for removed in old_devices:
-            self._device_removed(device=removed, keep=False)
+        with self._manager.batch():
+            old_devices = self._blivet.devices[:]
+            for removed in old_devices:
+                self._device_removed(device=removed, keep=False)
 
-        for action in self._blivet.devicetree.actions:
-            self._action_removed(action)
+            for action in self._blivet.devicetree.actions:
+                self._action_removed(action)
 
-        self._blivet.reset()
+            self._blivet.reset()
 
     @dbus.service.method(dbus_interface=BLIVET_INTERFACE)
     def Exit(self):
@@ -206,20 +244,23 @@ class DBusBlivet(DBusObject):
     def RemoveDevice(self, object_path):
         """ Remove a device and all devices built on it. """
         device = self._get_device_by_object_path(object_path)
-        self._blivet.devicetree.recursive_remove(device)
+        with self._manager.batch():
+            self._blivet.devicetree.recursive_remove(device)
 
     @dbus.service.method(dbus_interface=BLIVET_INTERFACE, in_signature='o')
     def InitializeDisk(self, object_path):
         """ Clear a disk and create a disklabel on it. """
-        self.RemoveDevice(object_path)
-        device = self._get_device_by_object_path(object_path)
-        self._blivet.initialize_disk(device)
+        with self._manager.batch():
+            self.RemoveDevice(object_path)
+            device = self._get_device_by_object_path(object_path)
+            self._blivet.initialize_disk(device)
 
     @dbus.service.method(dbus_interface=BLIVET_INTERFACE)
     def Commit(self):
         """ Commit pending changes to disk. """
         try:
-            self._blivet.do_it()
+            with self._manager.batch():
+                self._blivet.do_it()
         except StorageError as e:
             raise dbus.exceptions.DBusException('%s.%s' % (BUS_NAME, e.__class__.__name__),
                                                 "An error occured while committing the "
@@ -236,7 +277,8 @@ class DBusBlivet(DBusObject):
             kwargs["device"] = device
 
         try:
-            device = self._blivet.factory_device(device_type, Size(size), **kwargs)
+            with self._manager.batch():
+                device = self._blivet.factory_device(device_type, Size(size), **kwargs)
         except StorageError as e:
             raise dbus.exceptions.DBusException('%s.%s' % (BUS_NAME, e.__class__.__name__),
                                                 "An error occured while configuring the "
@@ -45,8 +45,7 @@ class DBusDevice(DBusObject):
     def interface(self):
         return DEVICE_INTERFACE
 
-    @property
-    def properties(self):
+    def _get_properties(self):
         parents = (self._manager.get_object_by_id(d.id).object_path for d in self._device.parents)
         children = (self._manager.get_object_by_id(d.id).object_path for d in self._device.children)
         fmt = self._manager.get_object_by_id(self._device.format.id).object_path
@@ -77,9 +76,16 @@ class DBusDevice(DBusObject):
     @dbus.service.method(dbus_interface=DEVICE_INTERFACE)
     def Setup(self):
         """ Activate this device. """
-        self._device.setup()
+        try:
+            self._device.setup()
+        finally:
+            # the status of this device and its parents may have changed
+            self._manager.invalidate_properties()
 
     @dbus.service.method(dbus_interface=DEVICE_INTERFACE)
     def Teardown(self):
         """ Deactivate this device. """
-        self._device.teardown()
+        try:
+            self._device.teardown()
+        finally:
+            self._manager.invalidate_properties()
@@ -45,8 +45,7 @@ class DBusFormat(DBusObject):
     def interface(self):
         return FORMAT_INTERFACE
 
-    @property
-    def properties(self):
+    def _get_properties(self):
         props = {"Device": self._format.device,
                  "Type": self._format.type or "Unknown",
                  "ID": self._format.id,
@@ -59,8 +58,15 @@ class DBusFormat(DBusObject):
 
     @dbus.service.method(dbus_interface=FORMAT_INTERFACE, in_signature='a{sv}')
     def Setup(self, kwargs):
-        self._format.setup(**kwargs)
+        try:
+            self._format.setup(**kwargs)
+        finally:
+            # the status of the device may have changed along with the format's
+            self._manager.invalidate_properties()
 
     @dbus.service.method(dbus_interface=FORMAT_INTERFACE)
     def Teardown(self):
-        self._format.teardown()
+        try:
+            self._format.teardown()
+        finally:
+            self._manager.invalidate_properties()
@@ -17,6 +17,9 @@
 #
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import dbus
 
 from .constants import BUS_NAME, OBJECT_MANAGER_INTERFACE, OBJECT_MANAGER_PATH
@@ -29,33 +32,100 @@ class ObjectManager(dbus.service.Object):
         variously (and with mutual-exclusivity) implement blivet's Device,
         Format, Action interfaces.
     """
-    def __init__(self):
-        self._objects = list()
-        self._by_id = dict()
+    def __init__(self, bus=None):
+        """
+            :keyword bus: the bus to export the objects on (default: system bus)
+            :type bus: :class:`dbus.bus.BusConnection`
+        """
+        self._by_id = OrderedDict()
         self._by_path = dict()
-        super().__init__(bus_name=dbus.service.BusName(BUS_NAME, dbus.SystemBus()),
+
+        # object paths changed in a batch, mapped to whether the path was
+        # exported before the batch, the interface and the object (None
+        # if removed)
+        self._batch_depth = 0
+        self._pending = OrderedDict()
+
+        self._bus = bus or dbus.SystemBus()
+        super().__init__(bus_name=dbus.service.BusName(BUS_NAME, self._bus),
                          object_path=OBJECT_MANAGER_PATH)
 
+    @property
+    def bus(self):
+        """ The bus the objects are exported on. """
+        return self._bus
+
+    def invalidate_properties(self):
+        """ Make all of the objects rebuild their property dicts. """
+        for obj in self._by_id.values():
+            obj.invalidate_properties()
+
     @dbus.service.method(dbus_interface=OBJECT_MANAGER_INTERFACE, out_signature='a{oa{sa{sv}}}')
     def GetManagedObjects(self):
-        return dict((obj.object_path, {obj.interface: obj.properties}) for obj in self._objects)
+        return dict((obj.object_path, {obj.interface: obj.properties}) for obj in self._by_id.values())
 
     def remove_object(self, obj):
-        self._objects.remove(obj)
+        object_path = obj.object_path
         del self._by_id[obj.id]
-        del self._by_path[obj.object_path]
-        self.InterfacesRemoved(obj.object_path, [obj.interface])
+        del self._by_path[object_path]
+        self._object_changed(object_path, obj.interface, None)
         obj.remove_from_connection()
 
     def add_object(self, obj):
-        self._objects.append(obj)
         self._by_id[obj.id] = obj
         self._by_path[obj.object_path] = obj
-        self.InterfacesAdded(obj.object_path, {obj.interface: obj.properties})
+        self._object_changed(obj.object_path, obj.interface, obj)
+
+    def _object_changed(self, object_path, interface, obj):
+        if not self._batch_depth:
+            if obj is None:
+                self.InterfacesRemoved(object_path, [interface])
+            else:
+                self.InterfacesAdded(object_path, {interface: obj.properties})
+            return
+
+        if object_path in self._pending:
+            (exported, interface, _obj) = self._pending[object_path]
+        else:
+            # the first change to a path tells whether it was exported before
+            exported = obj is None
+
+        self._pending[object_path] = (exported, interface, obj)
+
+    @contextmanager
+    def batch(self):
+        """ Coalesce the signals for objects added and removed in this context.
+
+            Only the net changes are signalled when the outermost batch ends:
+            objects added and removed within the batch are not signalled at
+            all and the properties of the added objects are only built once.
+            The removals are signalled before the additions.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._flush()
+
+    def _flush(self):
+        (pending, self._pending) = (self._pending, OrderedDict())
+
+        # blivet's objects may have changed in ways no callback reports
+        self.invalidate_properties()
+
+        for (object_path, (exported, interface, _obj)) in pending.items():
+            if exported:
+                self.InterfacesRemoved(object_path, [interface])
+
+        for (object_path, (_exported, _interface, obj)) in pending.items():
+            if obj is not None:
+                self.InterfacesAdded(object_path, {obj.interface: obj.properties})
 
     @property
     def objects(self):
-        return self._objects
+        return list(self._by_id.values())
 
     def get_object_by_id(self, obj_id):
         return self._by_id.get(obj_id)
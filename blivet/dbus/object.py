@@ -29,14 +29,15 @@ class DBusObject(dbus.service.Object):
     def __init__(self, manager):
         # pylint: disable=super-init-not-called
         self._present = True
-        self._init_dbus_object()
+        self._properties = None
         self._manager = manager  # provides ObjectManager interface
+        self._init_dbus_object()
 
     # This is here to make it easier to prevent the dbus.service.Object
     # constructor from running during unit testing.
     def _init_dbus_object(self):
         """ Initialize superclass. """
-        super().__init__(bus_name=dbus.service.BusName(BUS_NAME, dbus.SystemBus()),
+        super().__init__(bus_name=dbus.service.BusName(BUS_NAME, self._manager.bus),
                          object_path=self.object_path)
 
     @property
@@ -70,9 +71,24 @@ class DBusObject(dbus.service.Object):
 
     @property
     def properties(self):
-        """ dict of property key/value pairs to export via dbus. """
+        """ dict of property key/value pairs to export via dbus.
+
+            The dict is built once and kept until :meth:`invalidate_properties`
+            is called.
+        """
+        if self._properties is None:
+            self._properties = self._get_properties()
+
+        return self._properties
+
+    def _get_properties(self):
+        """ Return a new dict of property key/value pairs to export via dbus. """
         raise NotImplementedError()
 
+    def invalidate_properties(self):
+        """ Make the next access to :attr:`properties` rebuild the dict. """
+        self._properties = None
+
     @dbus.service.method(dbus_interface=dbus.PROPERTIES_IFACE, in_signature='s', out_signature='a{sv}')
     def GetAll(self, interface_name):
         if interface_name != self.interface:
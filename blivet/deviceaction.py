@@ -28,10 +28,12 @@ from .devices import PartitionDevice, LVMLogicalVolumeDevice
 from .formats import get_format, luks
 from parted import partitionFlag, PARTITION_LBA
 from .i18n import _, N_
+from .callbacks import callbacks as _callbacks
 from .callbacks import CreateFormatPreData, CreateFormatPostData
 from .callbacks import ResizeFormatPreData, ResizeFormatPostData
 from .callbacks import WaitForEntropyData, ReportProgressData
 from .size import Size
+from .snapshot import SnapshotMixin
 from .threads import SynchronizedMeta
 from .static_data import luks_data
 
@@ -100,7 +102,7 @@ def resize_type_from_string(type_string):
             return k
 
 
-class DeviceAction(util.ObjectID, metaclass=SynchronizedMeta):
+class DeviceAction(util.ObjectID, SnapshotMixin, metaclass=SynchronizedMeta):
 
     """ An action that will be carried out in the future on a Device.
 
@@ -183,6 +185,35 @@ class DeviceAction(util.ObjectID, metaclass=SynchronizedMeta):
             msg = _("Executing %(action)s") % {"action": str(self)}
             callbacks.report_progress(ReportProgressData(msg))
 
+    def prepare(self, callbacks=None):
+        """
+        Start performing the action, up to running its external program.
+
+        :param callbacks: callbacks to be run when matching actions are
+                          executed (see :meth:`~.blivet.Blivet.do_it`)
+        :returns: the program performing the bulk of the action or None
+        :rtype: callable or NoneType
+
+        The returned callable does not use any devices, formats or other
+        blivet state, so it can be run in another thread without holding the
+        global lock while other actions are performed. :meth:`finish` has to
+        be called once it is done. Actions that cannot be split like this
+        are performed right away, None is returned for them.
+
+        """
+        self.execute(callbacks=callbacks)
+        return None
+
+    def finish(self, callbacks=None):
+        """
+        Complete the action started by :meth:`prepare`.
+
+        :param callbacks: callbacks to be run when matching actions are
+                          executed (see :meth:`~.blivet.Blivet.do_it`)
+
+        """
+        pass
+
     def cancel(self):
         """ cancel the action """
         self._applied = False
@@ -543,6 +574,7 @@ class ActionCreateFormat(DeviceAction):
             self.orig_format = get_format(None)
 
         self._format = fmt or device.format
+        self._old_uuid = None   # the format's UUID before it was created
 
         if self._format.exists:
             raise ValueError("specified format already exists")
@@ -559,6 +591,13 @@ class ActionCreateFormat(DeviceAction):
         super(ActionCreateFormat, self).apply()
 
     def execute(self, callbacks=None):
+        program = self.prepare(callbacks=callbacks)
+        if program is not None:
+            program()
+
+        self.finish(callbacks=callbacks)
+
+    def prepare(self, callbacks=None):
         super(ActionCreateFormat, self).execute(callbacks=callbacks)
         if callbacks and callbacks.create_format_pre:
             msg = _("Creating %(type)s on %(device)s") % {"type": self.device.format.type, "device": self.device.path}
@@ -603,8 +642,14 @@ class ActionCreateFormat(DeviceAction):
                     luks_data.min_entropy = 0
 
         self.device.setup()
-        self.device.format.create(device=self.device.path,
-                                  options=self.device.format_args)
+        # some formats set their new UUID themselves when they are created
+        self._old_uuid = self.device.format.uuid
+        return self.device.format.prepare_create(device=self.device.path,
+                                                 options=self.device.format_args)
+
+    def finish(self, callbacks=None):
+        self.device.format.finish_create(device=self.device.path,
+                                         options=self.device.format_args)
 
         # Get the UUID now that the format is created
         udev.settle()
@@ -620,6 +665,11 @@ class ActionCreateFormat(DeviceAction):
             # udev lookup failing is a serious issue for anything other than tmpfs
             log.error("udev lookup failed for device: %s", self.device)
 
+        if self.device.format.uuid != self._old_uuid:
+            _callbacks.attribute_changed(device=self.device, fmt=self.device.format,
+                                         attr="uuid", old=self._old_uuid,
+                                         new=self.device.format.uuid)
+
         if callbacks and callbacks.create_format_post:
             msg = _("Created %(type)s on %(device)s") % {"type": self.device.format.type, "device": self.device.path}
             callbacks.create_format_post(CreateFormatPostData(msg))
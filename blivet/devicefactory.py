@@ -20,6 +20,7 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
+from .callbacks import callbacks
 from .storage_log import log_method_call
 from .errors import DeviceFactoryError, StorageError
 from .devices import BTRFSDevice, DiskDevice
@@ -36,10 +37,7 @@ from .partitioning import do_partitioning
 from .size import Size
 from .static_data import luks_data
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from .libblockdev import blockdev
 
 import logging
 log = logging.getLogger("blivet")
@@ -344,10 +342,7 @@ class DeviceFactory(object):
             self.min_luks_entropy = min_luks_entropy
 
         # used for error recovery
-        self.__devices = []
-        self.__actions = []
-        self.__names = []
-        self.__roots = []
+        self.__snapshot = None
 
     @property
     def raid_level(self):
@@ -732,7 +727,10 @@ class DeviceFactory(object):
 
             if (hasattr(current_format, "label") and
                     current_format.label != self.label):
+                old_label = current_format.label
                 current_format.label = self.label
+                callbacks.attribute_changed(device=self.device, fmt=current_format,
+                                            attr="label", old=old_label, new=self.label)
 
     def _set_encryption(self):
         # toggle encryption of the leaf device as needed
@@ -833,6 +831,9 @@ class DeviceFactory(object):
                 raise DeviceFactoryError from e
 
             raise
+        else:
+            if self.parent_factory is None:
+                self._discard_devicetree_backup()
 
     def _configure(self):
         self._set_container()
@@ -880,17 +881,15 @@ class DeviceFactory(object):
     # methods for error recovery
     #
     def _save_devicetree(self):
-        _blivet_copy = self.storage.copy()
-        self.__devices = _blivet_copy.devicetree._devices
-        self.__actions = _blivet_copy.devicetree._actions
-        self.__names = _blivet_copy.devicetree.names
-        self.__roots = _blivet_copy.roots
+        self.__snapshot = self.storage.snapshot()
 
     def _revert_devicetree(self):
-        self.storage.devicetree._devices = self.__devices
-        self.storage.devicetree._actions = self.__actions
-        self.storage.devicetree.names = self.__names
-        self.storage.roots = self.__roots
+        self.storage.restore_snapshot(self.__snapshot)
+        self.__snapshot = None
+
+    def _discard_devicetree_backup(self):
+        self.__snapshot.discard()
+        self.__snapshot = None
 
 
 class PartitionFactory(DeviceFactory):
@@ -26,10 +26,7 @@ import re
 from collections import namedtuple
 import itertools
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 import logging
 log = logging.getLogger("blivet")
@@ -39,6 +36,7 @@ from ..size import Size
 from ..i18n import N_
 from ..flags import flags
 from ..tasks import availability
+from ..static_data import lvm_info
 
 # some of lvm's defaults that we have no way to ask it for
 LVM_PE_START = Size("1 MiB")
@@ -100,10 +98,11 @@ def _set_global_config():
 
 
 def needs_config_refresh(fn):
-    if not availability.BLOCKDEV_LVM_PLUGIN.available:
-        return lambda *args, **kwargs: None
-
+    # the plugin is checked on the first call, not when this module is imported
     def fn_with_refresh(*args, **kwargs):
+        if not availability.BLOCKDEV_LVM_PLUGIN.available:
+            return None
+
         ret = fn(*args, **kwargs)
         _set_global_config()
         return ret
@@ -158,7 +157,7 @@ def determine_parent_lv(vg_name, internal_lv, lvs):
     for lv in lvs:
         # cache pools are internal LVs of cached LVs
         try:
-            pool_name = blockdev.lvm.cache_pool_name(vg_name, lv.lvname)
+            pool_name = lvm_info.cache_pool_name(vg_name, lv.lvname)
         except blockdev.LVMError:
             # cannot determine, just go on
             pass
@@ -168,7 +167,7 @@ def determine_parent_lv(vg_name, internal_lv, lvs):
 
         # pools have internal data and metadata LVs
         try:
-            data_lv_name = blockdev.lvm.data_lv_name(vg_name, lv.lvname)
+            data_lv_name = lvm_info.data_lv_name(vg_name, lv.lvname)
         except blockdev.LVMError:
             # cannot determine, just go on
             pass
@@ -176,7 +175,7 @@ def determine_parent_lv(vg_name, internal_lv, lvs):
             if data_lv_name == internal_lv.lvname:
                 return lv
         try:
-            metadata_lv_name = blockdev.lvm.metadata_lv_name(vg_name, lv.lvname)
+            metadata_lv_name = lvm_info.metadata_lv_name(vg_name, lv.lvname)
         except blockdev.LVMError:
             # cannot determine, just go on
             pass
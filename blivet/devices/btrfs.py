@@ -23,10 +23,7 @@ import os
 import copy
 import tempfile
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 from ..devicelibs import btrfs
 from ..devicelibs import raid
@@ -69,6 +66,13 @@ class BTRFSDevice(StorageDevice):
         self.req_size = kwargs.pop("size", None)
         super(BTRFSDevice, self).__init__(*args, **kwargs)
 
+    @property
+    def _extra_dependents(self):
+        # snapshots depend on their source
+        volume = self if isinstance(self, BTRFSVolumeDevice) else self.volume
+        return [s for s in volume.subvolumes
+                if isinstance(s, BTRFSSnapShotDevice) and s.source == self]
+
     def update_sysfs_path(self):
         """ Update this device's sysfs path. """
         log_method_call(self, self.name, status=self.status)
@@ -23,16 +23,18 @@
 import pprint
 
 from .. import util
+from ..callbacks import callbacks
+from ..snapshot import SnapshotMixin, record
 from ..storage_log import log_method_call
 from ..threads import SynchronizedMeta
 
 import logging
 log = logging.getLogger("blivet")
 
-from .lib import ParentList
+from .lib import ParentList, ancestry_cache
 
 
-class Device(util.ObjectID, metaclass=SynchronizedMeta):
+class Device(util.ObjectID, SnapshotMixin, metaclass=SynchronizedMeta):
 
     """ A generic device.
 
@@ -177,6 +179,7 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
     def remove_child(self, child):
         """ Decrement the child counter for this device. """
         log_method_call(self, name=self.name, child=child._name, kids=len(self.children))
+        record(self)
         self._children.remove(child)
 
     def add_child(self, child):
@@ -185,6 +188,7 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
         if child in self._children:
             raise ValueError("child is already accounted for")
 
+        record(self)
         self._children.append(child)
 
     def setup(self, orig=False):
@@ -235,14 +239,70 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
             :rtype: bool
         """
         # XXX does a device depend on itself?
-        if dep in self.parents:
+        (ancestors, overriding) = self._ancestry
+        if dep in ancestors:
             return True
 
-        for parent in self.parents:
-            if parent.depends_on(dep):
-                return True
+        # ancestors that add dependencies of their own
+        return any(ancestor.depends_on(dep) for ancestor in overriding)
 
-        return False
+    @property
+    def _ancestry(self):
+        """ This device's ancestors, not including itself.
+
+            :returns: a set of all ancestors and a list of the nearest ones
+                      whose class overrides :meth:`depends_on`
+            :rtype: tuple
+
+            The result is cached until a parent list changes.
+        """
+        ancestry = ancestry_cache.get(self)
+        if ancestry is None:
+            ancestors = set()
+            overriding = []
+            for parent in self.parents:
+                ancestors.add(parent)
+                ancestors.update(parent._ancestry[0])
+                if type(parent).depends_on is not Device.depends_on:
+                    overriding.append(parent)
+                else:
+                    overriding.extend(a for a in parent._ancestry[1] if a not in overriding)
+
+            ancestry = (ancestors, overriding)
+            ancestry_cache[self] = ancestry
+
+        return ancestry
+
+    @property
+    def _extra_dependents(self):
+        """ Devices depending on this one other than as descendants.
+
+            Subclasses whose :meth:`depends_on` adds dependencies that do not
+            follow :attr:`parents` have to list the devices that depend on
+            them that way here.
+        """
+        return []
+
+    @property
+    def dependents(self):
+        """ All devices that depend on this one, directly or indirectly.
+
+            This follows :attr:`children` instead of checking every device,
+            so it also includes devices that are not in a device tree.
+        """
+        dependents = []
+        seen = set([self])
+        queue = self.children + self._extra_dependents
+        while queue:
+            device = queue.pop()
+            if device in seen:
+                continue
+
+            seen.add(device)
+            dependents.append(device)
+            queue.extend(device.children)
+
+        return dependents
 
     def dracut_setup_args(self):
         return set()
@@ -260,8 +320,19 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
             raise ValueError("%s is not a valid name for this device" % value)
         self._name = value
 
+    def _change_name(self, value):
+        """ Set the device's name and announce the change.
+
+            Subclasses customize :meth:`_set_name`, not this method.
+        """
+        old_name = self.name
+        self._set_name(value)
+        if self.name != old_name:
+            callbacks.attribute_changed(device=self, attr="name",
+                                        old=old_name, new=self.name)
+
     name = property(lambda s: s._get_name(),
-                    lambda s, v: s._set_name(v),
+                    lambda s, v: s._change_name(v),
                     doc="This device's name")
 
     @property
@@ -282,10 +353,7 @@ class Device(util.ObjectID, metaclass=SynchronizedMeta):
     @property
     def ancestors(self):
         """ A list of all of this device's ancestors, including itself. """
-        l = set([self])
-        for p in [d for d in self.parents if d not in l]:
-            l.update(set(p.ancestors))
-        return list(l)
+        return list(self._ancestry[0] | set([self]))
 
     @property
     def packages(self):
@@ -19,8 +19,10 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 import os
+import weakref
 
 from .. import errors
+from .. import snapshot
 from .. import udev
 from ..size import Size
 
@@ -124,6 +126,12 @@ def device_name_to_disk_by_path(device_name=None):
         return ret
     raise errors.DeviceNotFoundError(device_name)
 
+# ancestry of devices, see Device._ancestry; any change to a parent list can
+# change the ancestry of any number of devices, so all of it is dropped
+# whenever one changes. The devices themselves are the keys since copies of a
+# device keep its id.
+ancestry_cache = weakref.WeakKeyDictionary()
+
 
 class ParentList(object):
 
@@ -186,12 +194,21 @@ class ParentList(object):
     def __len__(self):
         return len(self.items)
 
+    def _snapshot_state(self):
+        return self.items[:]
+
+    def _restore_snapshot_state(self, state):
+        ancestry_cache.clear()
+        self.items = state
+
     def append(self, y):
         """ Add an item to the list after running a callback. """
         if y in self.items:
             raise ValueError("item is already in the list")
 
         self.appendfunc(y)
+        snapshot.record(self)
+        ancestry_cache.clear()
         self.items.append(y)
 
     def remove(self, y):
@@ -200,4 +217,6 @@ class ParentList(object):
             raise ValueError("item is not in the list")
 
         self.removefunc(y)
+        snapshot.record(self)
+        ancestry_cache.clear()
         self.items.remove(y)
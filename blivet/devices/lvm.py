@@ -29,10 +29,7 @@ from collections import namedtuple
 from functools import wraps
 from enum import Enum
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 # device backend modules
 from ..devicelibs import lvm
@@ -43,6 +40,8 @@ from ..storage_log import log_method_call
 from .. import udev
 from ..size import Size, KiB, MiB, ROUND_UP, ROUND_DOWN
 from ..tasks import availability
+from ..static_data import lvm_info
+from ..snapshot import record
 
 import logging
 log = logging.getLogger("blivet")
@@ -118,6 +117,8 @@ class LVMVolumeGroupDevice(ContainerDevice):
         # These attributes are used by _add_parent, so they must be initialized
         # prior to instantiating the superclass.
         self._lvs = []
+        self._pv_space = None   # see _get_pv_space
+        self._lv_space = None   # see _get_lv_space
         self.has_duplicate = False
         self._complete = False  # have we found all of this VG's PVs?
         self.pv_count = util.numeric_type(pv_count)
@@ -293,11 +294,14 @@ class LVMVolumeGroupDevice(ContainerDevice):
             raise errors.DeviceError("new lv is too large to fit in free space", self.name)
 
         log.debug("Adding %s/%s to %s", lv.name, lv.size, self.name)
+        record(self)
         self._lvs.append(lv)
+        self._lv_space = None
 
         # snapshot accounting
         origin = getattr(lv, "origin", None)
         if origin:
+            record(origin)
             origin.snapshots.append(lv)
 
         # PV space accounting
@@ -320,11 +324,14 @@ class LVMVolumeGroupDevice(ContainerDevice):
         if lv not in self.lvs:
             raise ValueError("specified lv is not part of this vg")
 
+        record(self)
         self._lvs.remove(lv)
+        self._lv_space = None
 
         # snapshot accounting
         origin = getattr(lv, "origin", None)
         if origin:
+            record(origin)
             origin.snapshots.remove(lv)
 
         # PV space accounting
@@ -337,6 +344,7 @@ class LVMVolumeGroupDevice(ContainerDevice):
 
     def _add_parent(self, member):
         super(LVMVolumeGroupDevice, self)._add_parent(member)
+        self._pv_space = None
 
         if (self.exists and member.format.exists and
                 len(self.parents) + 1 == self.pv_count):
@@ -355,6 +363,7 @@ class LVMVolumeGroupDevice(ContainerDevice):
         #     Maybe remove_member could be a wrapper with the checks and the
         #     devicefactory could call the _ versions to bypass the checks.
         super(LVMVolumeGroupDevice, self)._remove_parent(member)
+        self._pv_space = None
         member.format.free = None
         member.format.container_uuid = None
 
@@ -390,6 +399,43 @@ class LVMVolumeGroupDevice(ContainerDevice):
         else:
             return self.align(pv.size - pv.format.pe_start)
 
+    def _get_pv_space(self):
+        """ Return the usable space of the PVs, their total size and usable space.
+
+            The results are kept until the PVs, their sizes or the extent
+            size change. PVs can be resized (e.g. by partition allocation)
+            without the VG being told, so their sizes are compared on every
+            call, which is cheap as long as the LVs are not looked at.
+        """
+        pvs = self.parents
+        key = (self.pe_size, [(id(pv), pv.size, pv.format.pe_start) for pv in pvs])
+        if self._pv_space is None or self._pv_space[0] != key:
+            usable = [self._get_pv_usable_space(pv) for pv in pvs]
+            total = sum((pv.size for pv in pvs), Size(0))
+            self._pv_space = (key, usable, total, sum(usable, Size(0)))
+
+        return self._pv_space[1:]
+
+    def _get_lv_space(self):
+        """ Return the space used by the LVs and the size of the pmspare LV.
+
+            The results are kept until an LV is added or removed, the extent
+            size changes or one of the LVs reports a change of the space it
+            uses (see :meth:`_drop_lv_space`).
+        """
+        key = self.pe_size
+        if self._lv_space is None or self._lv_space[0] != key:
+            used = sum((lv.vg_space_used for lv in self._lvs), Size(0))
+            pmspare = max([lv.metadata_size for lv in self._lvs] + [Size(0)])
+            log.debug("vg %s: %s used by %d lvs", self.name, used, len(self._lvs))
+            self._lv_space = (key, used, pmspare)
+
+        return self._lv_space[1:]
+
+    def _drop_lv_space(self):
+        """ Forget the space used by the LVs, one of them has changed. """
+        self._lv_space = None
+
     @property
     def lvm_metadata_space(self):
         """ The amount of the space LVM metadata cost us in this VG's PVs """
@@ -402,11 +448,8 @@ class LVMVolumeGroupDevice(ContainerDevice):
         # TODO: move this to either LVMPhysicalVolume's pe_start property once
         #       formats know about their devices or to a new LVMPhysicalVolumeDevice
         #       class once it exists
-        diff = Size(0)
-        for pv in self.pvs:
-            diff += pv.size - self._get_pv_usable_space(pv)
-
-        return diff
+        (_usable, total, usable_total) = self._get_pv_space()
+        return total - usable_total
 
     @property
     def size(self):
@@ -414,10 +457,8 @@ class LVMVolumeGroupDevice(ContainerDevice):
         # TODO: just ask lvm if isModified returns False
 
         # sum up the sizes of the PVs, subtract the unusable (meta data) space
-        size = sum(pv.size for pv in self.pvs)
-        size -= self.lvm_metadata_space
-
-        return size
+        (_usable, _total, usable_total) = self._get_pv_space()
+        return usable_total
 
     @property
     def extents(self):
@@ -431,19 +472,10 @@ class LVMVolumeGroupDevice(ContainerDevice):
         """ The amount of free space in this VG. """
         # TODO: just ask lvm if is_modified returns False
 
-        # get the number of disks used by PVs on RAID (if any)
-        raid_disks = 0
-        for pv in self.pvs:
-            if isinstance(pv, MDRaidArrayDevice):
-                raid_disks = max([raid_disks, len(pv.disks)])
-
         # total the sizes of any LVs
-        log.debug("%s size is %s", self.name, self.size)
-        used = sum((lv.vg_space_used for lv in self.lvs), Size(0))
+        (used, _pmspare) = self._get_lv_space()
         used += self.reserved_space
-        free = self.size - used
-        log.debug("vg %s has %s free", self.name, free)
-        return free
+        return self.size - used
 
     @property
     def free_extents(self):
@@ -458,8 +490,9 @@ class LVMVolumeGroupDevice(ContainerDevice):
         :rtype: list of PVFreeInfo
 
         """
-        return [PVFreeInfo(pv, self._get_pv_usable_space(pv), pv.format.free)
-                for pv in self.pvs]
+        (usable, _total, _usable_total) = self._get_pv_space()
+        return [PVFreeInfo(pv, pv_usable, pv.format.free)
+                for (pv, pv_usable) in zip(self.pvs, usable)]
 
     def align(self, size, roundup=False):
         """ Align a size to a multiple of physical extent size. """
@@ -496,7 +529,8 @@ class LVMVolumeGroupDevice(ContainerDevice):
 
         """
         # TODO: report correctly/better for existing VGs
-        return max([lv.metadata_size for lv in self.lvs] + [Size(0)])
+        (_used, pmspare) = self._get_lv_space()
+        return pmspare
 
     @property
     def complete(self):
@@ -886,13 +920,39 @@ class LVMLogicalVolumeBase(DMDevice, RaidDevice):
                                  if not s.is_thin_lv)
         return super(LVMLogicalVolumeBase, self).isleaf and not non_thin_snapshots
 
+    @property
+    def _extra_dependents(self):
+        return [s for s in self.snapshots if s.depends_on(self)]
+
+    def _vg_space_changed(self):
+        """ Let the VG know the space used by this LV has to be summed up again. """
+        vg = self.vg
+        if vg is not None:
+            vg._drop_lv_space()
+
+    def _set_size(self, newsize):
+        super(LVMLogicalVolumeBase, self)._set_size(newsize)
+        self._vg_space_changed()
+
+    def _set_target_size(self, newsize):
+        super(LVMLogicalVolumeBase, self)._set_target_size(newsize)
+        self._vg_space_changed()
+
+    def update_size(self, newsize=None):
+        super(LVMLogicalVolumeBase, self).update_size(newsize=newsize)
+        self._vg_space_changed()
+
     def add_internal_lv(self, int_lv):
         if int_lv not in self._internal_lvs:
+            record(self)
             self._internal_lvs.append(int_lv)
+            self._vg_space_changed()
 
     def remove_internal_lv(self, int_lv):
         if int_lv in self._internal_lvs:
+            record(self)
             self._internal_lvs.remove(int_lv)
+            self._vg_space_changed()
         else:
             msg = "the specified internal LV '%s' doesn't belong to this LV ('%s')" % (int_lv.lv_name,
                                                                                        self.name)
@@ -1094,6 +1154,7 @@ class LVMInternalLogicalVolumeMixin(object):
         if not self.takes_extra_space:
             if size <= self.parent_lv.size:  # pylint: disable=no-member
                 self._size = size  # pylint: disable=attribute-defined-outside-init
+                self._vg_space_changed()  # pylint: disable=no-member
             else:
                 raise ValueError("Internal LV cannot be bigger than its parent LV")
         else:
@@ -1394,6 +1455,7 @@ class LVMThinPoolMixin(object):
         # TODO: add some checking to prevent overcommit for preexisting
         self.vg._add_log_vol(lv)
         log.debug("Adding %s/%s to %s", lv.name, lv.size, self.name)
+        record(self)
         self._lvs.append(lv)
 
     @util.requires_property("is_thin_pool")
@@ -1402,6 +1464,7 @@ class LVMThinPoolMixin(object):
         if lv not in self._lvs:
             raise ValueError("specified lv is not part of this vg")
 
+        record(self)
         self._lvs.remove(lv)
         self.vg._remove_log_vol(lv)
 
@@ -1990,6 +2053,7 @@ class LVMLogicalVolumeDevice(LVMLogicalVolumeBase, LVMInternalLogicalVolumeMixin
             raise errors.DeviceError("Cannot attach a cache pool to the '%s' LV" % self.name)
         blockdev.lvm.cache_attach(self.vg.name, self.lvname, cache_pool_lv.lvname)
         self._cache = LVMCache(self, size=cache_pool_lv.size, exists=True)
+        self._vg_space_changed()
 
 
 class LVMCache(Cache):
@@ -2113,7 +2177,7 @@ class LVMCache(Cache):
     def cache_device_name(self):
         if self._exists:
             vg_name = self._cached_lv.vg.name
-            return "%s-%s" % (vg_name, blockdev.lvm.cache_pool_name(vg_name, self._cached_lv.lvname))
+            return "%s-%s" % (vg_name, lvm_info.cache_pool_name(vg_name, self._cached_lv.lvname))
         else:
             return None
 
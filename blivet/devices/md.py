@@ -22,13 +22,11 @@
 import os
 import six
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 from ..devicelibs import mdraid, raid
 
+from ..callbacks import callbacks
 from .. import errors
 from .. import util
 from ..storage_log import log_method_call
@@ -530,7 +528,11 @@ class MDRaidArrayDevice(ContainerDevice, RaidDevice):
         # update our uuid attribute with the new array's UUID
         # XXX this won't work for containers since no UUID is reported for them
         info = blockdev.md.detail(self.path)
+        old_uuid = self.uuid
         self.uuid = info.uuid
+        if self.uuid != old_uuid:
+            callbacks.attribute_changed(device=self, attr="uuid",
+                                        old=old_uuid, new=self.uuid)
         for member in self.members:
             member.format.md_uuid = self.uuid
 
@@ -23,10 +23,7 @@ import os
 import parted
 import _ped
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 from .. import errors
 from .. import util
@@ -36,6 +33,7 @@ from ..storage_log import log_method_call
 from .. import udev
 from ..formats import DeviceFormat, get_format
 from ..size import Size, MiB
+from ..snapshot import record
 
 import logging
 log = logging.getLogger("blivet")
@@ -282,13 +280,11 @@ class PartitionDevice(StorageDevice):
             # change this partition's geometry in-memory so that other
             # partitioning operations can complete (e.g., autopart)
             super(PartitionDevice, self)._set_target_size(newsize)
-            disk = self.disk.format.parted_disk
 
             # resize the partition's geometry in memory
             (constraint, geometry) = self._compute_resize(self.parted_partition)
-            disk.setPartitionGeometry(partition=self.parted_partition,
-                                      constraint=constraint,
-                                      start=geometry.start, end=geometry.end)
+            self.disk.format.set_partition_geometry(self.parted_partition, constraint,
+                                                    geometry.start, geometry.end)
 
     @property
     def path(self):
@@ -411,6 +407,15 @@ class PartitionDevice(StorageDevice):
 
         return Device.depends_on(self, dep)
 
+    @property
+    def _extra_dependents(self):
+        # logical partitions depend on the extended partition
+        if not self.is_extended or not self.disk:
+            return []
+
+        return [p for p in self.disk.children
+                if isinstance(p, PartitionDevice) and p.depends_on(self)]
+
     @property
     def isleaf(self):
         """ True if no other device depends on this one. """
@@ -474,6 +479,7 @@ class PartitionDevice(StorageDevice):
         if not self.parted_partition or not self.flag_available(flag):
             return
 
+        record(self.disk.format)
         self.parted_partition.setFlag(flag)
 
     def unset_flag(self, flag):
@@ -481,6 +487,7 @@ class PartitionDevice(StorageDevice):
         if not self.parted_partition or not self.flag_available(flag):
             return
 
+        record(self.disk.format)
         self.parted_partition.unsetFlag(flag)
 
     @property
@@ -664,10 +671,8 @@ class PartitionDevice(StorageDevice):
         partition = parted_disk.getPartitionByPath(self.path)
         (constraint, geometry) = self._compute_resize(partition)
 
-        parted_disk.setPartitionGeometry(partition=partition,
-                                         constraint=constraint,
-                                         start=geometry.start,
-                                         end=geometry.end)
+        self.disk.format.set_partition_geometry(partition, constraint,
+                                                geometry.start, geometry.end)
 
         self.disk.format.commit()
         self.update_size()
@@ -279,6 +279,7 @@ class StorageDevice(Device):
         if not self.exists:
             raise errors.DeviceError("device has not been created", self.name)
 
+        old_sysfs_path = self.sysfs_path
         try:
             udev_device = pyudev.Devices.from_device_file(udev.global_udev,
                                                           self.path)
@@ -292,6 +293,10 @@ class StorageDevice(Device):
             self.sysfs_path = udev_device.sys_path
             log.debug("%s sysfs_path set to %s", self.name, self.sysfs_path)
 
+        if self.sysfs_path != old_sysfs_path:
+            callbacks.attribute_changed(device=self, attr="sysfs_path",
+                                        old=old_sysfs_path, new=self.sysfs_path)
+
     @property
     def format_args(self):
         """ Device-specific arguments to format creation program. """
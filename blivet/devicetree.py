@@ -20,14 +20,13 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+import bisect
 import os
 import pprint
 import re
+import weakref
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from .libblockdev import blockdev
 
 from .actionlist import ActionList
 from .callbacks import callbacks
@@ -40,6 +39,7 @@ from .devicelibs import lvm
 from .events.handler import EventHandlerMixin
 from . import util
 from .populator import PopulatorMixin
+from .snapshot import Snapshot, journal
 from .storage_log import log_method_call, log_method_return
 from .threads import SynchronizedMeta
 
@@ -48,6 +48,66 @@ log = logging.getLogger("blivet")
 
 _LVM_DEVICE_CLASSES = (LVMLogicalVolumeDevice, LVMVolumeGroupDevice)
 
+_INDEXED_ATTRS = ("name", "path", "uuid", "label", "sysfs_path")
+""" Device attributes the device tree maintains lookup indexes for. """
+
+_LV_TYPES = ("lvmlv", "lvmthinpool", "lvmthinlv")
+
+DEVICE_VIEWS = {
+    "devices": lambda d: True,
+    "disks": lambda d: d.is_disk,
+    "partitioned": lambda d: d.partitioned,
+    "partitions": lambda d: isinstance(d, PartitionDevice),
+    "vgs": lambda d: d.type == "lvmvg",
+    "lvs": lambda d: d.type in _LV_TYPES,
+    "thinlvs": lambda d: d.type == "lvmthinlv",
+    "thinpools": lambda d: d.type == "lvmthinpool",
+    "pvs": lambda d: d.format.type == "lvmpv",
+    "mdarrays": lambda d: d.type == "mdarray",
+    "mdcontainers": lambda d: d.type == "mdcontainer",
+    "mdmembers": lambda d: d.format.type == "mdmember",
+    "btrfs_volumes": lambda d: d.type == "btrfs volume",
+    "swaps": lambda d: d.format.type == "swap"
+}
+""" Predicates defining the per-type device lists kept by the device tree.
+
+    See :meth:`DeviceTreeBase.get_devices_by_view`.
+"""
+
+_trees = weakref.WeakSet()
+""" Live device trees that want to hear about changes to their devices. """
+
+
+def _device_changed_cb(device, **kwargs):  # pylint: disable=unused-argument
+    for tree in list(_trees):
+        tree._device_changed(device)
+
+callbacks.attribute_changed.add(_device_changed_cb)
+callbacks.format_added.add(_device_changed_cb)
+
+
+class _SortedDeviceList(object):
+    """ A list of devices kept sorted by name.
+
+        Devices with the same name are kept in the order they were added.
+    """
+    def __init__(self):
+        self._keys = []
+        self._devices = []
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    def add(self, device, key):
+        i = bisect.bisect(self._keys, key)
+        self._keys.insert(i, key)
+        self._devices.insert(i, device)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        del self._keys[i]
+        del self._devices[i]
+
 
 class DeviceTreeBase(object, metaclass=SynchronizedMeta):
     """ A quasi-tree that represents the devices in the system.
@@ -95,6 +155,9 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
         self._hidden = []
 
+        self._rebuild_index()
+        _trees.add(self)
+
         lvm.lvm_cc_resetFilter()
 
         self.exclusive_disks = exclusive_disks
@@ -102,6 +165,12 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
         self.edd_dict = {}
 
+    def __setstate__(self, state):
+        # copies of the tree (eg: from Blivet.copy) need to track their own
+        # devices' changes
+        self.__dict__.update(state)
+        _trees.add(self)
+
     def __str__(self):
         done = []
 
@@ -122,25 +191,265 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             tree += show_subtree(root, 0)
         return tree
 
+    #
+    # Lookup indexes
+    #
+    def _rebuild_index(self):
+        """ Rebuild the lookup indexes from scratch.
+
+            This is only needed when the device lists have been replaced
+            wholesale, eg: when reverting to a saved copy of the tree.
+        """
+        self._index = dict((attr, dict()) for attr in _INDEXED_ATTRS)
+        self._index_entries = {}    # device id -> list of (attr, value)
+        self._id_index = {}         # device id -> device
+        self._device_order = {}     # device id -> (hidden, sequence number)
+        self._maybe_incomplete = {}  # device id -> device w/ a complete attr
+        self._views = dict((view, _SortedDeviceList()) for view in DEVICE_VIEWS)
+        self._view_entries = {}     # device id -> (sort key, list of views)
+        self._index_seq = 0
+        self._version = 0
+        self._devices_snapshot = (None, [])
+
+        for device in self._devices:
+            self._index_device(device)
+
+        for device in self._hidden:
+            self._index_device(device, hidden=True)
+
+    @staticmethod
+    def _indexed_values(device, attr):
+        """ Return the values under which device is indexed for attr. """
+        if attr == "uuid":
+            values = [getattr(device, "uuid", None), getattr(device.format, "uuid", None)]
+        elif attr == "label":
+            values = [getattr(device.format, "label", None)]
+        else:
+            values = [getattr(device, attr, None)]
+
+        return [v for (i, v) in enumerate(values) if v and v not in values[:i]]
+
+    def _index_device(self, device, hidden=False, seq=None):
+        """ Add a device to the lookup indexes.
+
+            Unless seq is given, the device is ordered after all devices
+            indexed so far, which matches the order of the lists the device
+            is being appended to.
+        """
+        if seq is None:
+            self._index_seq += 1
+            seq = self._index_seq
+
+        self._version += 1
+        self._device_order[device.id] = (hidden, seq)
+        self._id_index[device.id] = device
+        if not hidden and hasattr(type(device), "complete"):
+            self._maybe_incomplete[device.id] = device
+        self._add_index_entries(device)
+        if not hidden:
+            self._add_view_entries(device)
+
+    def _unindex_device(self, device):
+        """ Remove a device from the lookup indexes. """
+        self._version += 1
+        self._remove_index_entries(device)
+        self._remove_view_entries(device)
+        self._id_index.pop(device.id, None)
+        self._device_order.pop(device.id, None)
+        self._maybe_incomplete.pop(device.id, None)
+
+    def _insert_device(self, device, hidden=False, index=None, seq=None):
+        """ Add a device to the device list or the hidden list. """
+        devices = self._hidden if hidden else self._devices
+        if index is None:
+            index = len(devices)
+
+        devices.insert(index, device)
+        self._index_device(device, hidden=hidden, seq=seq)
+        journal(self._delete_device, device, hidden)
+
+    def _delete_device(self, device, hidden=False):
+        """ Remove a device from the device list or the hidden list. """
+        devices = self._hidden if hidden else self._devices
+        index = devices.index(device)
+        seq = self._device_order[device.id][1]
+        del devices[index]
+        self._unindex_device(device)
+        journal(self._insert_device, device, hidden, index, seq)
+
+    def _insert_name(self, name, index=None):
+        """ Add a name to the list of device names. """
+        if index is None:
+            index = len(self.names)
+
+        self.names.insert(index, name)
+        journal(self._remove_name, name)
+
+    def _remove_name(self, name):
+        """ Remove a name from the list of device names. """
+        index = self.names.index(name)
+        del self.names[index]
+        journal(self._insert_name, name, index)
+
+    def _in_tree(self, device):
+        """ Return True if device is in the (non-hidden) device list. """
+        return (self._id_index.get(device.id) is device and
+                not self._device_order[device.id][0])
+
+    def _add_index_entries(self, device):
+        entries = []
+        for attr in _INDEXED_ATTRS:
+            for value in self._indexed_values(device, attr):
+                self._index[attr].setdefault(value, []).append(device)
+                entries.append((attr, value))
+
+        self._index_entries[device.id] = entries
+
+    def _remove_index_entries(self, device):
+        for (attr, value) in self._index_entries.pop(device.id, []):
+            bucket = self._index[attr][value]
+            bucket.remove(device)
+            if not bucket:
+                del self._index[attr][value]
+
+    def _add_view_entries(self, device):
+        key = (str(device.name), self._device_order[device.id][1])
+        views = [view for (view, pred) in DEVICE_VIEWS.items() if pred(device)]
+        for view in views:
+            self._views[view].add(device, key)
+
+        self._view_entries[device.id] = (key, views)
+
+    def _remove_view_entries(self, device):
+        (key, views) = self._view_entries.pop(device.id, (None, []))
+        for view in views:
+            self._views[view].remove(key)
+
+    def _device_changed(self, device):
+        """ Update the indexes after an attribute of a device changed.
+
+            Name changes also change the names and paths of devices built on
+            top of the device (eg: lvs of a renamed vg), so the device's
+            descendants are re-indexed as well.
+        """
+        if self._id_index.get(device.id) is not device:
+            return
+
+        # the device's restored attributes need re-indexing as well
+        journal(self._device_changed, device)
+
+        self._version += 1
+        self._remove_index_entries(device)
+        self._add_index_entries(device)
+        if device.id in self._view_entries:
+            self._remove_view_entries(device)
+            self._add_view_entries(device)
+
+        for child in device.children:
+            self._device_changed(child)
+
+    def _find_indexed(self, attr, values, match, incomplete=False, hidden=False, last=False):
+        """ Return the first indexed device whose attr is one of values.
+
+            :param str attr: the indexed attribute
+            :param values: the values to look up
+            :param match: callable returning whether a device is a match
+            :param bool incomplete: include incomplete devices in search
+            :param bool hidden: include hidden devices in search
+            :param bool last: return the last match instead of the first one
+            :returns: the matching device or None
+            :rtype: :class:`~.devices.Device`
+
+            "First" refers to the order of :attr:`_devices` followed by
+            :attr:`_hidden`, which is the order a linear search would use.
+
+            A device whose attribute changed without notifying the tree is
+            indexed under its old value. Such entries are re-indexed when a
+            lookup comes across them. When nothing is found the devices are
+            searched linearly, so a device that is not indexed under its
+            current value yet is found as well.
+        """
+        def wanted(device):
+            return ((hidden or not self._device_order[device.id][0]) and
+                    (incomplete or getattr(device, "complete", True)))
+
+        candidates = []
+        stale = []
+        for value in values:
+            for device in self._index[attr].get(value, []):
+                if value not in self._indexed_values(device, attr):
+                    # the device changed without telling us
+                    stale.append(device)
+                elif device not in candidates and match(device):
+                    candidates.append(device)
+
+        if not any(wanted(d) for d in candidates):
+            devices = self._devices + self._hidden if hidden else self._devices
+            stale.extend(d for d in devices if d not in candidates and d not in stale and match(d))
+
+        for device in stale:
+            log.debug("re-indexing stale entry for %s", device.name)
+            self._remove_index_entries(device)
+            self._add_index_entries(device)
+            if device not in candidates and match(device):
+                candidates.append(device)
+
+        candidates = [d for d in candidates if wanted(d)]
+        if not candidates:
+            return None
+
+        order = (max if last else min)
+        return order(candidates, key=lambda d: self._device_order[d.id])
+
     #
     # Device list
     #
     @property
     def devices(self):
         """ List of devices currently in the tree """
+        return self._get_devices()[:]
+
+    def _get_devices(self):
+        """ Return the shared, cached list backing :attr:`devices`. """
+        # The list only changes when the tree does or when a device's
+        # completeness changes, so reuse the last one if neither happened.
+        incomplete = tuple(i for (i, d) in self._maybe_incomplete.items()
+                           if not d.complete)
+        stamp = (self._version, incomplete)
+        if self._devices_snapshot[0] == stamp:
+            return self._devices_snapshot[1]
+
         devices = []
+        uuids = set()
         for device in self._devices:
             if not getattr(device, "complete", True):
                 continue
 
-            if device.uuid and device.uuid in [d.uuid for d in devices] and \
+            if device.uuid and device.uuid in uuids and \
                not isinstance(device, NoDevice):
                 raise DeviceTreeError("duplicate uuids in device tree")
 
+            uuids.add(device.uuid)
             devices.append(device)
 
+        self._devices_snapshot = (stamp, devices)
         return devices
 
+    def get_devices_by_view(self, view):
+        """ Return the devices in one of the tree's per-type lists.
+
+            :param str view: the name of the list (a key of :data:`DEVICE_VIEWS`)
+            :returns: the matching devices, sorted by name
+            :rtype: list of :class:`~.devices.StorageDevice`
+
+            The result is the same as filtering and sorting :attr:`devices`,
+            but the lists are maintained as devices are added, removed,
+            renamed or reformatted, so no full scan or sort is needed.
+        """
+        # this also catches duplicate uuids just like :attr:`devices` does
+        self._get_devices()
+        return [d for d in self._views[view] if getattr(d, "complete", True)]
+
     def _add_device(self, newdev, new=True):
         """ Add a device to the tree.
 
@@ -150,24 +459,25 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             Raise ValueError if the device's identifier is already
             in the list.
         """
-        if newdev.uuid and newdev.uuid in [d.uuid for d in self._devices] and \
-           not isinstance(newdev, NoDevice):
+        if newdev.uuid and not isinstance(newdev, NoDevice) and \
+           any(d.uuid == newdev.uuid and self._in_tree(d)
+               for d in self._index["uuid"].get(newdev.uuid, [])):
             raise ValueError("device is already in tree")
 
         # make sure this device's parent devices are in the tree already
         for parent in newdev.parents:
-            if parent not in self._devices:
+            if not self._in_tree(parent):
                 raise DeviceTreeError("parent device not in tree")
 
         newdev.add_hook(new=new)
-        self._devices.append(newdev)
+        self._insert_device(newdev)
 
         # don't include "req%d" partition names
         if ((newdev.type != "partition" or
              not newdev.name.startswith("req")) and
                 newdev.type != "btrfs volume" and
                 newdev.name not in self.names):
-            self.names.append(newdev.name)
+            self._insert_name(newdev.name)
         callbacks.device_added(device=newdev)
         log.info("added %s %s (id %d) to device tree", newdev.type,
                  newdev.name,
@@ -187,7 +497,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
                 Only leaves may be removed.
         """
-        if dev not in self._devices:
+        if not self._in_tree(dev):
             raise ValueError("Device '%s' not in tree" % dev.name)
 
         if not dev.isleaf and not force:
@@ -196,7 +506,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
         # handle name registry first since removing an lv from the vg changes its name
         if dev.name in self.names and getattr(dev, "complete", True):
-            self.names.remove(dev.name)
+            self._remove_name(dev.name)
 
         dev.remove_hook(modparent=modparent)
         if modparent:
@@ -210,7 +520,7 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
                        device.disk == dev.disk:
                         device.update_name()
 
-        self._devices.remove(dev)
+        self._delete_device(dev)
         callbacks.device_removed(device=dev)
         log.info("removed %s %s (id %d) from device tree", dev.type,
                  dev.name,
@@ -269,6 +579,49 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             else:
                 self._remove_device(device, modparent=modparent)
 
+    #
+    # Snapshots
+    #
+    def snapshot(self):
+        """ Return a snapshot of the current state of the tree.
+
+            Devices, formats and actions are not copied. Each one saves its
+            state in the snapshot the first time it changes afterwards, and
+            changes to the device lists and the action list are journaled,
+            so neither taking nor restoring a snapshot depends on the number
+            of devices in the tree.
+
+            The snapshot records changes until it is passed to
+            :meth:`restore_snapshot` or its
+            :meth:`~.snapshot.Snapshot.discard` method is called.
+
+            :rtype: :class:`~.snapshot.Snapshot`
+        """
+        return Snapshot()
+
+    def restore_snapshot(self, snapshot):
+        """ Undo all changes to the tree since a snapshot was taken.
+
+            :param snapshot: a snapshot from :meth:`snapshot`
+            :type snapshot: :class:`~.snapshot.Snapshot`
+        """
+        restored = snapshot.restore()
+        self._version += 1
+
+        # partitions on a restored disklabel have to use the partitions of
+        # its restored parted disk
+        for disklabel in restored:
+            if not isinstance(disklabel, formats.disklabel.DiskLabel):
+                continue
+
+            disk = self.get_device_by_path(disklabel.device, hidden=True)
+            if disk is None or disk.format is not disklabel:
+                continue
+
+            for partition in disk.children:
+                if isinstance(partition, PartitionDevice) and partition._parted_partition:
+                    partition.parted_partition = disklabel.parted_disk.getPartitionByPath(partition.path)
+
     #
     # Actions
     #
@@ -286,10 +639,10 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             get here.
         """
         if not (action.is_create and action.is_device) and \
-           action.device not in self._devices:
+           not self._in_tree(action.device):
             raise DeviceTreeError("device is not in the tree")
         elif (action.is_create and action.is_device):
-            if action.device in self._devices:
+            if self._in_tree(action.device):
                 raise DeviceTreeError("device is already in the tree")
 
         if action.is_create and action.is_device:
@@ -363,14 +716,12 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             log.debug("dep is a leaf")
             return dependents
 
-        devices = self._devices[:]
+        # devices in the tree are their parents' children, but hidden devices
+        # are not
+        dependents = [d for d in dep.dependents if self._in_tree(d)]
+        dependents.sort(key=lambda d: self._device_order[d.id])
         if hidden:
-            devices.extend(self._hidden)
-
-        for device in devices:
-            log.debug("checking if %s depends on %s", device.name, dep.name)
-            if device.depends_on(dep):
-                dependents.append(device)
+            dependents.extend(d for d in self._hidden if d.depends_on(dep))
 
         return dependents
 
@@ -431,24 +782,6 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
     #
     # Device search by property
     #
-    def _filter_devices(self, incomplete=False, hidden=False):
-        """ Return list of devices modified according to parameters.
-
-            :param bool incomplete: include incomplete devices in result
-            :param bool hidden: include hidden devices in result
-
-            :returns: a generator of devices
-            :rtype: generator of :class:`~.devices.Device`
-        """
-        if hidden:
-            devices = (d for d in self._devices[:] + self._hidden[:])
-        else:
-            devices = (d for d in self._devices[:])
-
-        if not incomplete:
-            devices = (d for d in devices if getattr(d, "complete", True))
-        return devices
-
     def get_device_by_sysfs_path(self, path, incomplete=False, hidden=False):
         """ Return a list of devices with a matching sysfs path.
 
@@ -461,8 +794,9 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.sysfs_path == path), None)
+            result = self._find_indexed("sysfs_path", [path],
+                                        lambda d: d.sysfs_path == path,
+                                        incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -478,8 +812,9 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, uuid=uuid, incomplete=incomplete, hidden=hidden)
         result = None
         if uuid:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.uuid == uuid or d.format.uuid == uuid), None)
+            result = self._find_indexed("uuid", [uuid],
+                                        lambda d: d.uuid == uuid or d.format.uuid == uuid,
+                                        incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -495,8 +830,9 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, label=label, incomplete=incomplete, hidden=hidden)
         result = None
         if label:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if getattr(d.format, "label", None) == label), None)
+            result = self._find_indexed("label", [label],
+                                        lambda d: getattr(d.format, "label", None) == label,
+                                        incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -512,10 +848,11 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, name=name, incomplete=incomplete, hidden=hidden)
         result = None
         if name:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.name == name or
-                           (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == name.replace("--", "-"))),
-                          None)
+            lvm_name = name.replace("--", "-")
+            result = self._find_indexed("name", [name, lvm_name],
+                                        lambda d: d.name == name or
+                                        (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == lvm_name),
+                                        incomplete=incomplete, hidden=hidden)
         log_method_return(self, result)
         return result
 
@@ -534,14 +871,14 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
-
             # The usual order of the devices list is one where leaves are at
             # the end. So that the search can prefer leaves to interior nodes
-            # the list that is searched is the reverse of the devices list.
-            result = next((d for d in reversed(list(devices)) if d.path == path or
-                           (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == path.replace("--", "-"))),
-                          None)
+            # the last match in the devices list is the one returned.
+            lvm_path = path.replace("--", "-")
+            result = self._find_indexed("path", [path, lvm_path],
+                                        lambda d: d.path == path or
+                                        (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == lvm_path),
+                                        incomplete=incomplete, hidden=hidden, last=True)
 
         log_method_return(self, result)
         return result
@@ -556,8 +893,11 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
             :rtype: :class:`~.devices.Device`
         """
         log_method_call(self, id_num=id_num, incomplete=incomplete, hidden=hidden)
-        devices = self._filter_devices(incomplete=incomplete, hidden=hidden)
-        result = next((d for d in devices if d.id == id_num), None)
+        result = self._id_index.get(id_num)
+        if result is not None:
+            if (not hidden and self._device_order[id_num][0]) or \
+               (not incomplete and not getattr(result, "complete", True)):
+                result = None
         log_method_return(self, result)
         return result
 
@@ -839,11 +1179,11 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
 
         self._remove_device(device, force=True, modparent=False)
 
-        self._hidden.append(device)
+        self._insert_device(device, hidden=True)
         lvm.lvm_cc_addFilterRejectRegexp(device.name)
 
         if device.name not in self.names:
-            self.names.append(device.name)
+            self._insert_name(device.name)
 
     def unhide(self, device):
         """ Restore a device's visibility.
@@ -866,8 +1206,8 @@ class DeviceTreeBase(object, metaclass=SynchronizedMeta):
                 log.info("unhiding device %s %s (id %d)", hidden.type,
                          hidden.name,
                          hidden.id)
-                self._hidden.remove(hidden)
-                self._devices.append(hidden)
+                self._delete_device(hidden, hidden=True)
+                self._insert_device(hidden)
                 hidden.add_hook(new=False)
                 lvm.lvm_cc_removeFilterRejectRegexp(hidden.name)
 
@@ -21,8 +21,9 @@
 #
 
 import abc
+from collections import deque
 import inspect
-from threading import current_thread, RLock, Thread
+from threading import Condition, current_thread, RLock, Thread
 import pyudev
 import sys
 import time
@@ -126,11 +127,31 @@ class EventMask(util.ObjectID):
         return self._device_match(event) and self._action_match(event)
 
 
+class _QueuedEvent(object):
+    """ An event waiting to be handled. """
+    def __init__(self, event, debounce):
+        self.event = event
+        self.queued = time.time()
+        self.due = self.queued + debounce if event.action == "change" else self.queued
+
+    @property
+    def device(self):
+        return self.event.device
+
+
 #
 # EventManager
 #
 class EventManager(object, metaclass=abc.ABCMeta):
-    def __init__(self, handler_cb=None, notify_cb=None, error_cb=None):
+    def __init__(self, handler_cb=None, notify_cb=None, error_cb=None,
+                 workers=1, max_queued=1000, debounce=0):
+        """
+            :keyword int workers: number of threads handling events
+            :keyword int max_queued: number of events that can wait to be
+                                     handled before new ones are dropped
+            :keyword float debounce: seconds to wait for more change events
+                                     on a device before handling them as one
+        """
         self._handler_cb = None
         """ event handler (must accept 'event', 'notify_cb' kwargs """
 
@@ -155,6 +176,29 @@ class EventManager(object, metaclass=abc.ABCMeta):
         self._lock = RLock()
         """Re-entrant lock to serialize access to mask list."""
 
+        self.workers = workers
+        self.max_queued = max_queued
+        self.debounce = debounce
+
+        self._queue = deque()
+        """ events waiting to be handled, oldest first """
+
+        self._queued = dict()
+        """ events waiting to be handled, oldest first, by device """
+
+        self._active = dict()
+        """ number of events being handled, by device """
+
+        self._workers = []
+        self._worker_generation = 0
+        """ workers exit once this differs from the value they started with """
+
+        self._queue_cond = Condition()
+        """ condition for changes to the queue """
+
+        self._stats = dict.fromkeys(("queued", "handled", "coalesced", "cancelled",
+                                     "dropped", "max_depth", "latency", "max_latency"), 0)
+
     @property
     def handler_cb(self):
         """ the main event handler """
@@ -209,9 +253,14 @@ class EventManager(object, metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def disable(self):
-        """ Disable monitoring and handling of events. """
+        """ Disable monitoring and handling of events.
+
+            Events that are still waiting to be handled are dropped and the
+            worker threads exit once they are done with their current event.
+        """
         event_log.info("disabling event handling")
         disable_callbacks()
+        self._stop_workers()
 
     def _mask_event(self, event):
         """ Return True if this event should be ignored """
@@ -247,9 +296,12 @@ class EventManager(object, metaclass=abc.ABCMeta):
     def handle_event(self, *args, **kwargs):
         """ Handle an event by running the registered handler.
 
-            Currently the handler is run in a separate thread. This removes any
-            threading-related expectations about the behavior of whatever is
-            telling us about the events.
+            The event is queued and the handler is run in one of
+            :attr:`workers` threads. This removes any threading-related
+            expectations about the behavior of whatever is telling us about
+            the events. Events that arrive while others are waiting to be
+            handled may be merged with them or cancel them out, see
+            :meth:`_enqueue`.
 
             Unhandled exceptions in event handler threads present a bit of a
             challenge. Generally, an unhandled exception in an event handler
@@ -270,11 +322,192 @@ class EventManager(object, metaclass=abc.ABCMeta):
             event_log.debug("ignoring masked event %s", event)
             return
 
-        t = Thread(target=self._run_event_handler,
-                   name="event%d" % event.id,
-                   kwargs={"event": event},
-                   daemon=True)
-        t.start()
+        self._enqueue(event)
+
+    @property
+    def queue_depth(self):
+        """ number of events waiting to be handled """
+        with self._queue_cond:
+            return len(self._queue)
+
+    @property
+    def stats(self):
+        """ event queue metrics
+
+            "queued", "handled", "coalesced", "cancelled" and "dropped" count
+            events.
+            "depth" and "max_depth" are the current and largest number of
+            events waiting to be handled. "latency" is the total and
+            "max_latency" the largest number of seconds between an event's
+            arrival and the start of its handling.
+        """
+        with self._queue_cond:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._queue)
+            return stats
+
+    def wait(self, timeout=None):
+        """ Wait until all queued events have been handled.
+
+            :keyword float timeout: maximum number of seconds to wait
+            :returns: whether the queue was emptied in time
+            :rtype: bool
+        """
+        with self._queue_cond:
+            return self._queue_cond.wait_for(lambda: not self._queue and not self._active,
+                                             timeout=timeout)
+
+    def _enqueue(self, event):
+        """ Queue an event for one of the workers.
+
+            A change event on a device that already has a change event
+            waiting is merged into it, and an add event still waiting is
+            dropped along with everything after it when the device is
+            removed again.
+
+            This runs in whatever thread reports the event, so it never waits
+            for the workers. When :attr:`max_queued` events are already
+            waiting the new event is dropped.
+        """
+        with self._queue_cond:
+            queued = self._queued.get(event.device, [])
+            if event.action == "change" and queued and queued[-1].event.action == "change":
+                event_log.debug("coalescing event %s with %s", event, queued[-1].event)
+                queued[-1].event = event
+                self._stats["coalesced"] += 1
+                return
+
+            adds = [i for (i, q) in enumerate(queued) if q.event.action == "add"]
+            if event.action == "remove" and adds:
+                cancelled = queued[adds[-1]:]
+                event_log.debug("dropping event %s and the %d before it",
+                                event, len(cancelled))
+                for entry in cancelled:
+                    self._queue.remove(entry)
+
+                del queued[adds[-1]:]
+                if not queued:
+                    del self._queued[event.device]
+
+                self._stats["cancelled"] += len(cancelled) + 1
+                self._queue_cond.notify_all()
+                return
+
+            if len(self._queue) >= self.max_queued:
+                event_log.error("event queue is full, dropping event %s", event)
+                self._stats["dropped"] += 1
+                return
+
+            entry = _QueuedEvent(event, self.debounce)
+            self._queue.append(entry)
+            self._queued.setdefault(event.device, []).append(entry)
+            self._stats["queued"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+            self._start_workers()
+            self._queue_cond.notify_all()
+
+    def _start_workers(self):
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.workers:
+            worker = Thread(target=self._run_worker,
+                            args=(self._worker_generation,),
+                            name="event-worker%d" % len(self._workers),
+                            daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _stop_workers(self):
+        """ Drop the queued events and wait for the workers to exit. """
+        with self._queue_cond:
+            self._stats["dropped"] += len(self._queue)
+            self._queue.clear()
+            self._queued.clear()
+            self._worker_generation += 1
+            workers = self._workers
+            self._workers = []
+            self._queue_cond.notify_all()
+
+        for worker in workers:
+            if worker is not current_thread():
+                worker.join()
+
+    def _ready_entry(self):
+        """ Return the first queued entry that can be handled now.
+
+            :returns: the entry, or None and the number of seconds until
+                      another entry becomes due (None if there is none)
+            :rtype: tuple
+
+            Events on a device are taken in order, so only the oldest queued
+            event of each device is considered. It has to be due and no other
+            worker may be handling an event on its device.
+        """
+        now = time.time()
+        timeout = None
+        seen = set()
+        for entry in self._queue:
+            if entry.device in seen:
+                continue
+
+            seen.add(entry.device)
+            if self._active.get(entry.device):
+                continue
+
+            if entry.due > now:
+                if timeout is None or entry.due - now < timeout:
+                    timeout = entry.due - now
+                continue
+
+            return (entry, None)
+
+        return (None, timeout)
+
+    def _next_event(self, generation):
+        """ Wait for a queued event to be ready and take it.
+
+            :param int generation: the worker generation of the caller
+            :returns: the event, or None if the worker should exit
+        """
+        with self._queue_cond:
+            while True:
+                if generation != self._worker_generation:
+                    return None
+
+                (entry, timeout) = self._ready_entry()
+                if entry is not None:
+                    break
+
+                self._queue_cond.wait(timeout=timeout)
+
+            self._queue.remove(entry)
+            queued = self._queued[entry.device]
+            queued.pop(0)
+            if not queued:
+                del self._queued[entry.device]
+
+            self._active[entry.device] = self._active.get(entry.device, 0) + 1
+            latency = time.time() - entry.queued
+            self._stats["latency"] += latency
+            self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+            self._queue_cond.notify_all()
+            return entry.event
+
+    def _run_worker(self, generation):
+        while True:
+            event = self._next_event(generation)
+            if event is None:
+                return
+
+            try:
+                self._run_event_handler(event)
+            finally:
+                with self._queue_cond:
+                    self._active[event.device] -= 1
+                    if not self._active[event.device]:
+                        del self._active[event.device]
+
+                    self._stats["handled"] += 1
+                    self._queue_cond.notify_all()
 
     def _run_event_handler(self, event):
         """ Run the event handler and account for unhandled exceptions. """
@@ -295,8 +528,9 @@ class EventManager(object, metaclass=abc.ABCMeta):
 
 
 class UdevEventManager(EventManager):
-    def __init__(self, handler_cb=None, notify_cb=None):
-        super().__init__(handler_cb=handler_cb, notify_cb=notify_cb)
+    def __init__(self, handler_cb=None, notify_cb=None, **kwargs):
+        kwargs.setdefault("debounce", 0.1)
+        super().__init__(handler_cb=handler_cb, notify_cb=notify_cb, **kwargs)
         self._pyudev_observer = None
 
     @property
@@ -317,17 +551,22 @@ class UdevEventManager(EventManager):
 
     def disable(self):
         """ Disable monitoring and handling of block device uevents. """
-        super().disable()
         if self.enabled:
             self._pyudev_observer.stop()
 
         self._pyudev_observer = None
+        super().disable()
         with threads.blivet_lock:
             flags.uevents = False
 
     def __call__(self, *args, **kwargs):
         return self
 
+    def handle_event(self, *args, **kwargs):
+        # any uevent, masked or not, means the udev database has changed
+        udev.invalidate_device_snapshot()
+        super().handle_event(*args, **kwargs)
+
     def _create_event(self, *args, **kwargs):
         return Event(args[0].action, udev.device_get_name(args[0]), args[0])
 
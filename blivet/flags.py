@@ -84,6 +84,17 @@ class Flags(object):
         # whether to include nodev filesystems in the devicetree
         self.include_nodev = False
 
+        # number of threads used to probe devices ahead of time while
+        # populating the devicetree; 1 probes each device as it is handled
+        self.populate_workers = 1
+
+        # record where populating the devicetree spends its time
+        self.profile_populate = False
+
+        # set to False to skip the tracing of method calls and returns, which
+        # is only logged at debug level but still has a cost when it is
+        self.trace_method_calls = True
+
         self.boot_cmdline = {}
 
         self.update_from_boot_cmdline()
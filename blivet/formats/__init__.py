@@ -21,10 +21,7 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 import os
 import importlib
@@ -32,6 +29,7 @@ import importlib
 from ..util import get_sysfs_path_by_name
 from ..util import run_program
 from ..util import ObjectID
+from ..snapshot import SnapshotMixin
 from ..storage_log import log_method_call
 from ..errors import DeviceFormatError, FormatCreateError, FormatDestroyError, FormatSetupError
 from ..i18n import N_
@@ -132,7 +130,7 @@ def get_device_format_class(fmt_type):
     return fmt
 
 
-class DeviceFormat(ObjectID, metaclass=SynchronizedMeta):
+class DeviceFormat(ObjectID, SnapshotMixin, metaclass=SynchronizedMeta):
 
     """ Generic device format.
 
@@ -156,6 +154,7 @@ class DeviceFormat(ObjectID, metaclass=SynchronizedMeta):
     _check = False
     _hidden = False                     # hide devices with this formatting?
     _ks_mountpoint = None
+    _create_runs_program = False        # _create only runs _create_program()
 
     _resize_class = fsresize.UnimplementedFSResize
     _size_info_class = fssize.UnimplementedFSSize
@@ -525,11 +524,44 @@ class DeviceFormat(ObjectID, metaclass=SynchronizedMeta):
         if self.status:
             raise DeviceFormatError("device exists and is active")
 
+    def prepare_create(self, **kwargs):
+        """ Start creating the format, up to running its external program.
+
+            :returns: the program creating the format or None
+            :rtype: callable or NoneType
+
+            The returned callable does not use any devices or formats, so it
+            can be run in another thread without holding the global lock.
+            :meth:`finish_create` completes the creation once it is done.
+            Formats that are not created by a single external program are
+            created right away, None is returned for them.
+        """
+        if not self._create_runs_program:
+            self.create(**kwargs)
+            return None
+
+        log_method_call(self, device=self.device,
+                        type=self.type, status=self.status)
+        self._pre_create(**kwargs)
+        return self._create_program(**kwargs)
+
+    def finish_create(self, **kwargs):
+        """ Complete the creation started by :meth:`prepare_create`. """
+        if self._create_runs_program:
+            self._post_create(**kwargs)
+
     # pylint: disable=unused-argument
     def _create(self, **kwargs):
         """ Type-specific create method. """
         pass
 
+    def _create_program(self, **kwargs):
+        """ Return a callable running the program that creates the format.
+
+            Only used if :attr:`_create_runs_program` is True.
+        """
+        raise NotImplementedError()
+
     # pylint: disable=unused-argument
     def _post_create(self, **kwargs):
         self.exists = True
@@ -21,6 +21,7 @@
 #
 
 import os
+from collections import namedtuple
 
 from ..storage_log import log_exception_info, log_method_call
 import parted
@@ -32,12 +33,32 @@ from .. import udev
 from .. import util
 from ..flags import flags
 from ..i18n import _, N_
+from ..snapshot import record
 from . import DeviceFormat, register_device_format
 from ..size import Size
 
 import logging
 log = logging.getLogger("blivet")
 
+PartitionSlots = namedtuple("PartitionSlots", ["primary", "max_primary", "logical", "max_logical",
+                                               "extended", "supports_extended"])
+PartitionSlots.__doc__ = """ Numbers of used and available partition slots of a disk. """
+
+
+def get_partition_slots(parted_disk):
+    """ Return the used and available partition slots of a disk.
+
+        :param parted_disk: the disk
+        :type parted_disk: :class:`parted.Disk`
+        :rtype: :class:`PartitionSlots`
+    """
+    return PartitionSlots(primary=parted_disk.primaryPartitionCount,
+                          max_primary=parted_disk.maxPrimaryPartitionCount,
+                          logical=len(parted_disk.getLogicalPartitions()),
+                          max_logical=parted_disk.getMaxLogicalPartitions(),
+                          extended=parted_disk.getExtendedPartition(),
+                          supports_extended=parted_disk.supportsFeature(parted.DISK_TYPE_EXTENDED))
+
 
 class DiskLabel(DeviceFormat):
 
@@ -74,6 +95,13 @@ class DiskLabel(DeviceFormat):
         self._disk_label_alignment = None
         self._minimal_alignment = None
         self._optimal_alignment = None
+        self._alignment_grain_sizes = None
+        self._end_alignments = {}
+
+        # answers about the parted disk's partitions and free space, valid
+        # until the partitions are changed through this instance's methods
+        self._layout_disk = None
+        self._layout = {}
 
         if self.parted_device:
             # set up the parted objects and raise exception on failure
@@ -90,9 +118,24 @@ class DiskLabel(DeviceFormat):
             We can't do copy.deepcopy on parted objects, which is okay.
         """
         return util.variable_copy(self, memo,
-                                  shallow=('_parted_device', '_optimal_alignment', '_minimal_alignment',),
+                                  shallow=('_parted_device', '_optimal_alignment', '_minimal_alignment',
+                                           '_end_alignments', '_layout_disk', '_layout'),
                                   duplicate=('_parted_disk', '_orig_parted_disk'))
 
+    def _snapshot_state(self):
+        """ Return a copy of this object's state.
+
+            The parted disk is changed in place by partitioning, so it is
+            duplicated rather than shared.
+        """
+        state = super()._snapshot_state()
+        if self._parted_disk is not None:
+            state["_parted_disk"] = self._parted_disk.duplicate()
+            if self._orig_parted_disk is self._parted_disk:
+                state["_orig_parted_disk"] = state["_parted_disk"]
+
+        return state
+
     def __repr__(self):
         s = DeviceFormat.__repr__(self)
         if flags.testing:
@@ -147,6 +190,7 @@ class DiskLabel(DeviceFormat):
         """ Set this instance's parted_disk to reflect the disk's contents. """
         log_method_call(self, device=self.device)
         self._parted_disk = self._orig_parted_disk
+        self._layout_changed()
 
     def fresh_parted_disk(self):
         """ Return a new, empty parted.Disk instance for this device. """
@@ -158,6 +202,10 @@ class DiskLabel(DeviceFormat):
         if not self.parted_device:
             return None
 
+        # callers are free to change the parted disk, so keep a copy of it in
+        # active snapshots
+        record(self)
+
         if not self._parted_disk and self.supported:
             if self.exists:
                 try:
@@ -297,6 +345,33 @@ class DiskLabel(DeviceFormat):
         else:
             self.update_orig_parted_disk()
 
+    def _layout_changed(self):
+        """ Forget what is known about the partitions and free space. """
+        self._layout_disk = None
+        self._layout = {}
+
+    def _layout_query(self, name, query):
+        """ Return the cached result of a query about the parted disk's layout.
+
+            :param str name: name of the query
+            :param query: function returning the result for a parted disk
+            :type query: callable
+
+            Results are kept until the partitions are changed through
+            :meth:`add_partition`, :meth:`remove_partition`,
+            :meth:`set_partition_geometry` or :meth:`reset_parted_disk`, or
+            the parted disk is replaced.
+        """
+        parted_disk = self.parted_disk
+        if self._layout_disk is not parted_disk:
+            self._layout_disk = parted_disk
+            self._layout = {}
+
+        if name not in self._layout:
+            self._layout[name] = query(parted_disk)
+
+        return self._layout[name]
+
     def add_partition(self, start, end, ptype=None):
         """ Add a partition to the disklabel.
 
@@ -304,6 +379,8 @@ class DiskLabel(DeviceFormat):
             :param int end: end sector
             :param ptype: partition type or None
             :type ptype: int (parted partition type constant) or NoneType
+            :returns: the new partition
+            :rtype: :class:`parted.Partition`
 
             Partition type will default to either PARTITION_NORMAL or
             PARTITION_LOGICAL, depending on whether the start sector is within
@@ -323,8 +400,10 @@ class DiskLabel(DeviceFormat):
                                          geometry=geometry)
 
         constraint = parted.Constraint(exactGeom=geometry)
+        self._layout_changed()
         self.parted_disk.addPartition(partition=new_partition,
                                       constraint=constraint)
+        return new_partition
 
     def remove_partition(self, partition):
         """ Remove a partition from the disklabel.
@@ -332,12 +411,28 @@ class DiskLabel(DeviceFormat):
             :param partition: the partition to remove
             :type partition: :class:`parted.Partition`
         """
+        self._layout_changed()
         self.parted_disk.removePartition(partition)
 
+    def set_partition_geometry(self, partition, constraint, start, end):
+        """ Change the geometry of a partition on the disklabel.
+
+            :param partition: the partition to change
+            :type partition: :class:`parted.Partition`
+            :param constraint: constraint the new geometry has to satisfy
+            :type constraint: :class:`parted.Constraint`
+            :param int start: new start sector
+            :param int end: new end sector
+        """
+        self._layout_changed()
+        self.parted_disk.setPartitionGeometry(partition=partition,
+                                              constraint=constraint,
+                                              start=start, end=end)
+
     @property
     def extended_partition(self):
         try:
-            extended = self.parted_disk.getExtendedPartition()
+            extended = self._layout_query("extended", lambda d: d.getExtendedPartition())
         except Exception:  # pylint: disable=broad-except
             log_exception_info()
             extended = None
@@ -346,7 +441,7 @@ class DiskLabel(DeviceFormat):
     @property
     def logical_partitions(self):
         try:
-            logicals = self.parted_disk.getLogicalPartitions()
+            logicals = list(self._layout_query("logicals", lambda d: d.getLogicalPartitions()))
         except Exception:  # pylint: disable=broad-except
             log_exception_info()
             logicals = []
@@ -355,12 +450,22 @@ class DiskLabel(DeviceFormat):
     @property
     def primary_partitions(self):
         try:
-            primaries = self.parted_disk.getPrimaryPartitions()
+            primaries = list(self._layout_query("primaries", lambda d: d.getPrimaryPartitions()))
         except Exception:  # pylint: disable=broad-except
             log_exception_info()
             primaries = []
         return primaries
 
+    @property
+    def partition_slots(self):
+        """ The used and available partition slots (:class:`PartitionSlots`). """
+        return self._layout_query("slots", get_partition_slots)
+
+    @property
+    def free_space_regions(self):
+        """ The regions of free space (list of :class:`parted.Geometry`). """
+        return list(self._layout_query("free_regions", lambda d: d.getFreeSpaceRegions()))
+
     @property
     def first_partition(self):
         try:
@@ -372,7 +477,10 @@ class DiskLabel(DeviceFormat):
 
     @property
     def partitions(self):
-        return getattr(self.parted_disk, "partitions", [])
+        if self.parted_disk is None:
+            return []
+
+        return list(self._layout_query("partitions", lambda d: getattr(d, "partitions", [])))
 
     def _get_disk_label_alignment(self):
         """ Return the disklabel's required alignment for new partitions.
@@ -457,8 +565,11 @@ class DiskLabel(DeviceFormat):
         # use the minimal alignment if the requested size is smaller than the
         # optimal io size
         minimal_alignment = self._get_minimal_alignment()
-        optimal_grain_size = Size(alignment.grainSize * self.sector_size)
-        minimal_grain_size = Size(minimal_alignment.grainSize * self.sector_size)
+        if not self._alignment_grain_sizes:
+            self._alignment_grain_sizes = (Size(minimal_alignment.grainSize * self.sector_size),
+                                           Size(alignment.grainSize * self.sector_size))
+
+        (minimal_grain_size, optimal_grain_size) = self._alignment_grain_sizes
         if size < minimal_grain_size:
             raise AlignmentError("requested size cannot be aligned")
         elif size < optimal_grain_size:
@@ -481,8 +592,12 @@ class DiskLabel(DeviceFormat):
         if alignment is None:
             alignment = self.get_alignment(size=size)
 
-        return parted.Alignment(offset=alignment.offset - 1,
-                                grainSize=alignment.grainSize)
+        key = (alignment.offset, alignment.grainSize)
+        if key not in self._end_alignments:
+            self._end_alignments[key] = parted.Alignment(offset=alignment.offset - 1,
+                                                         grainSize=alignment.grainSize)
+
+        return self._end_alignments[key]
 
     @property
     def alignment(self):
@@ -494,12 +609,12 @@ class DiskLabel(DeviceFormat):
 
     @property
     def free(self):
-        if self.parted_disk is not None:
-            free_areas = self.parted_disk.getFreeSpacePartitions()
-        else:
-            free_areas = []
+        if self.parted_disk is None:
+            return Size(0)
 
-        return sum((Size(f.getLength(unit="B")) for f in free_areas), Size(0))
+        return self._layout_query("free",
+                                  lambda d: sum((Size(f.getLength(unit="B")) for f in d.getFreeSpacePartitions()),
+                                                Size(0)))
 
     @property
     def magic_partition_number(self):
@@ -58,6 +58,17 @@ import logging
 log = logging.getLogger("blivet")
 
 
+class _SizeInfoDevice(object):
+
+    """ What the size information tasks of a filesystem need to build their
+        commands, for a device that has no format instance yet.
+    """
+
+    def __init__(self, fs_class, device):
+        self.device = device
+        self._info = fs_class._info_class(self)
+
+
 class FS(DeviceFormat):
 
     """ Filesystem base class. """
@@ -76,6 +87,7 @@ class FS(DeviceFormat):
     # This number is more guess than precise number because this
     # value is already unpredictable and can change in the future...
     _metadata_size_factor = 1.0
+    _create_runs_program = True
 
     def __init__(self, **kwargs):
         """
@@ -249,6 +261,34 @@ class FS(DeviceFormat):
     label = property(lambda s: s._get_label(), lambda s, l: s._set_label(l),
                      doc="this filesystem's label")
 
+    @classmethod
+    def size_info_programs(cls, device):
+        """ Return the programs :meth:`update_size_info` runs on device.
+
+            :param str device: path to the device node of an existing
+                               filesystem of this type
+            :returns: the programs, in the order they are run
+            :rtype: list of list of str
+
+            This lets the populator start these programs before it creates
+            the format instance, which runs :meth:`update_size_info`.
+        """
+        fs = _SizeInfoDevice(cls, device)
+        if not (flags.auto_dev_updates and cls._resize_class(fs).available):
+            return []
+
+        programs = []
+        fsck_task = cls._fsck_class(fs)
+        if fsck_task.available:
+            programs.append(fsck_task._fsck_command)
+        if fs._info.available:
+            programs.append(fs._info._info_command)
+        minsize_task = cls._minsize_class(fs)
+        if minsize_task.available:
+            programs.append(minsize_task._resize_command())
+
+        return programs
+
     def update_size_info(self):
         """ Update this filesystem's current and minimum size (for resize). """
 
@@ -353,17 +393,31 @@ class FS(DeviceFormat):
         """
         log_method_call(self, type=self.mount_type, device=self.device,
                         mountpoint=self.mountpoint)
+        super(FS, self)._create()
+        self._create_program(**kwargs)()
+
+    def _create_program(self, **kwargs):
         if not self.formattable:
-            return
+            return lambda: None
 
-        super(FS, self)._create()
         try:
-            self._mkfs.do_task(options=kwargs.get("options"), label=not self.relabels())
+            mkfs = self._mkfs.prepare_task(options=kwargs.get("options"), label=not self.relabels())
         except FSWriteLabelError as e:
             log.warning("Choosing not to apply label (%s) during creation of filesystem %s. Label format is unacceptable for this filesystem.", self.label, self.type)
+            return lambda: None
         except FSError as e:
             raise FormatCreateError(e, self.device)
 
+        device = self.device
+
+        def create_fs():
+            try:
+                mkfs()
+            except FSError as e:
+                raise FormatCreateError(e, device)
+
+        return create_fs
+
     def _post_create(self, **kwargs):
         super(FS, self)._post_create(**kwargs)
         if self.label is not None and self.relabels():
@@ -822,6 +876,7 @@ class BTRFS(FS):
     _max_size = Size("16 EiB")
     _mkfs_class = fsmkfs.BTRFSMkfs
     _metadata_size_factor = 0.80  # btrfs metadata may take 20% of space
+    _create_runs_program = False  # see create
     # FIXME parted needs to be taught about btrfs so that we can set the
     # partition table type correctly for btrfs partitions
     # parted_system = fileSystemType["btrfs"]
@@ -1133,6 +1188,7 @@ class TmpFS(NoDevFS):
     # in the regard that the format is automatically created
     # once mounted
     _formattable = True
+    _create_runs_program = False  # see create
     _size_info_class = fssize.TmpFSSize
     _mount_class = fsmount.TmpFSMount
     _resize_class = fsresize.TmpFSResize
@@ -20,10 +20,7 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 import os
 
@@ -34,6 +31,7 @@ from ..tasks import availability, pvtask
 from ..i18n import N_
 from ..size import Size
 from ..errors import PhysicalVolumeError
+from ..static_data import lvm_info
 from . import DeviceFormat, register_device_format
 
 import logging
@@ -164,7 +162,7 @@ class LVMPhysicalVolume(DeviceFormat):
             if self.exists:
                 # we don't have any actual value, but the PV exists and is
                 # active, we should try to determine it
-                pv_info = blockdev.lvm.pvinfo(self.device)
+                pv_info = lvm_info.pv_info(self.device)
                 self._free = Size(pv_info.pv_free)
             else:
                 raise PhysicalVolumeError("Unknown free space information for the PV '%s'" % self.device)
@@ -26,10 +26,7 @@ from ..tasks import availability
 from . import DeviceFormat, register_device_format
 from ..size import Size
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 import logging
 log = logging.getLogger("blivet")
@@ -46,6 +43,7 @@ class SwapSpace(DeviceFormat):
     _formattable = True                # can be formatted
     _supported = True                  # is supported
     _linux_native = True                # for clearpart
+    _create_runs_program = True         # _create only runs _create_program()
     _plugin = availability.BLOCKDEV_SWAP_PLUGIN
 
     # see rhbz#744129 for details
@@ -167,6 +165,11 @@ class SwapSpace(DeviceFormat):
     def _create(self, **kwargs):
         log_method_call(self, device=self.device,
                         type=self.type, status=self.status)
-        blockdev.swap.mkswap(self.device, label=self.label)
+        self._create_program(**kwargs)()
+
+    def _create_program(self, **kwargs):
+        mkswap = blockdev.swap.mkswap
+        (device, label) = (self.device, self.label)
+        return lambda: mkswap(device, label=label)
 
 register_device_format(SwapSpace)
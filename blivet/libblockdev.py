@@ -0,0 +1,109 @@
+# libblockdev.py
+# Lazy initialization of the libblockdev library.
+#
+# Copyright (C) 2017  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+from threading import Lock
+
+import gi
+gi.require_version("GLib", "2.0")
+gi.require_version("BlockDev", "1.0")
+
+from gi.repository import GLib
+from gi.repository import BlockDev as _blockdev
+
+from . import arch
+
+import logging
+log = logging.getLogger("blivet")
+program_log = logging.getLogger("program")
+
+# XXX: respect the level? Need to translate between C and Python log levels.
+log_bd_message = lambda level, msg: program_log.info(msg)
+
+# the plugins blivet uses, keyed by the attribute of the BlockDev module (or
+# the prefix of the function names) their API is available under
+PLUGIN_NAMES = {"lvm": "lvm", "btrfs": "btrfs", "swap": "swap", "crypto": "crypto",
+                "loop": "loop", "md": "mdraid", "mpath": "mpath", "dm": "dm"}
+if arch.is_s390():
+    PLUGIN_NAMES["s390"] = "s390"
+
+_plugins_lock = Lock()
+_requested_plugins = set()
+_loaded_plugins = set()
+
+
+def load_plugins(names=None):
+    """ Load libblockdev plugins that have not been requested yet.
+
+        :param names: names of the plugins to load (all used by blivet if None)
+        :type names: iterable of str or NoneType
+        :returns: names of all the plugins loaded so far
+        :rtype: set of str
+
+        Every plugin is only tried once, a plugin that fails to load is
+        logged and reported as not loaded from then on.
+    """
+    if names is None:
+        names = PLUGIN_NAMES.values()
+
+    names = set(names)
+    if names <= _requested_plugins:
+        return _loaded_plugins
+
+    with _plugins_lock:
+        new = names - _requested_plugins
+        if not new:
+            return _loaded_plugins
+
+        # plugins loaded before are kept, but they need to stay in the list
+        # of the required ones
+        specs = _blockdev.plugin_specs_from_names(_requested_plugins | new)
+        try:
+            succ_, avail_plugs = _blockdev.try_reinit(require_plugins=specs, reload=False, log_func=log_bd_message)
+        except GLib.GError as err:
+            raise RuntimeError("Failed to intialize the libblockdev library: %s" % err)
+
+        _requested_plugins.update(new)
+        _loaded_plugins.update(avail_plugs)
+        for p in sorted(new - _loaded_plugins):
+            log.info("Failed to load plugin %s", p)
+
+    return _loaded_plugins
+
+
+class _LazyBlockDev(object):
+
+    """ The BlockDev module with its plugins loaded on first use.
+
+        Using a plugin's functions or namespace (e.g. ``blockdev.lvm`` or
+        ``blockdev.mpath_is_mpath_member``) loads the plugin first, everything
+        else is passed to the module untouched.
+    """
+
+    def __getattr__(self, attr):
+        plugin = PLUGIN_NAMES.get(attr.split("_", 1)[0])
+        if plugin is not None and plugin not in _requested_plugins:
+            load_plugins([plugin])
+
+        return getattr(_blockdev, attr)
+
+    def __dir__(self):
+        return dir(_blockdev)
+
+blockdev = _LazyBlockDev()
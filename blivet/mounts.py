@@ -20,77 +20,37 @@
 # Red Hat Author(s): Vojtech Trefny <vtrefny@redhat.com>
 #
 from collections import defaultdict
+import os
+import select
+import stat
+
 from .udev import resolve_devspec
-from . import util
 from .devicelibs import btrfs
 
 import logging
 log = logging.getLogger("blivet")
 
 
-class _MountinfoCache(object):
-
-    """ Cache for info from /proc/self/mountinfo. Looks up the root of the
-        mount within the filesystem using a pair of mountpoint, mount
-        source as keys.
+class MountsCache(object):
 
-        This is a very simple helper class for MountsCache, and would
-        have to be altered for general purpose use.
+    """ Cache object for system mountpoints.
 
-        Note that only info for fstype btrfs is stored within the cache,
-        as MountsCache methods only require information for btrfs.
+        The mount table is read from /proc/self/mountinfo, which identifies
+        each mounted device by its device number, so neither the table nor
+        lookups in it need udev to resolve device names. The kernel flags an
+        open /proc/self/mounts whenever the mount table changes, so the
+        table is only read again after that happened.
     """
 
     def __init__(self):
-        self._cache = None
-
-    def _get_cache(self):
-        """ Reads lines in /proc/self/mountinfo and builds a table. """
-        cache = {}
-
-        with open("/proc/self/mountinfo") as mountinfos:
-            for line in mountinfos:
-                fields = line.split()
-                separator_index = fields.index("-")
-                fstype = fields[separator_index + 1]
-                if not fstype.startswith("btrfs"):
-                    continue
-
-                root = fields[3]
-                mountpoint = fields[4]
-                # store the canonical device path
-                devspec = resolve_devspec(fields[separator_index + 2],
-                                          sysname=True)
-                cache[(devspec, mountpoint)] = root
-
-        return cache
-
-    def get_root(self, devspec, mountpoint):
-        """ Retrieves the root of the mount within the filesystem
-            that corresponds to devspec and mountpoint.
-
-            :param str devspec: device specification
-            :param str mountpoint: mountpoint
-            :rtype: str or NoneType
-            :returns: the root of the mount within the filesystem, if available
-        """
-        if self._cache is None:
-            self._cache = self._get_cache()
-
-        # get the canonical device path
-        devspec = resolve_devspec(devspec, sysname=True)
-        return self._cache.get((devspec, mountpoint))
-
-
-class MountsCache(object):
+        self.mountpoints = defaultdict(list)
+        """ mountpoints by (device number, btrfs subvolspec) """
 
-    """ Cache object for system mountpoints; checks /proc/mounts and
-        /proc/self/mountinfo for up-to-date information.
-    """
+        self._paths = set()
+        """ all active mountpoints """
 
-    def __init__(self):
-        self.mounts_hash = 0
-        self.mountpoints = defaultdict(list)
+        self._mounts_file = None
+        self._poller = None
 
     def get_mountpoints(self, devspec, subvolspec=None):
         """ Get mountpoints for selected device
@@ -111,18 +71,12 @@ class MountsCache(object):
         if subvolspec is not None:
             subvolspec = str(subvolspec)
 
-        # devspec == None means "get 'nodev' mount points"
-        if devspec is not None:
-            # use the canonical device path (if available)
-            canon_devspec = resolve_devspec(devspec, sysname=True)
-            if canon_devspec is not None:
-                devspec = canon_devspec
-            else:
-                # udev doesn't know about the given device, it can hardly be
-                # mounted
-                return []
+        devno = self._get_device_number(devspec)
+        if devno is None:
+            # the device does not exist, it can hardly be mounted
+            return []
 
-        return self.mountpoints[(devspec, subvolspec)]
+        return self.mountpoints.get((devno, subvolspec), [])[:]
 
     def is_mountpoint(self, path):
         """ Check to see if a path is already mounted
@@ -131,47 +85,86 @@ class MountsCache(object):
         """
         self._cache_check()
 
-        return any(path in p for p in self.mountpoints.values())
+        return path in self._paths
+
+    def _get_device_number(self, devspec):
+        """ Return the device number of a block device, or None. """
+        if devspec is None:
+            return None
+
+        if not devspec.startswith("/dev/"):
+            # eg: UUID=... or LABEL=...
+            sysname = resolve_devspec(devspec, sysname=True)
+            if sysname is None:
+                return None
+
+            devspec = "/dev/" + sysname
+
+        try:
+            st = os.stat(devspec)
+        except OSError:
+            return None
+
+        if not stat.S_ISBLK(st.st_mode):
+            return None
+
+        return st.st_rdev
 
     def _get_active_mounts(self):
-        """ Get information about mounted devices from /proc/mounts and
-            /proc/self/mountinfo
+        """ Get information about mounted devices from /proc/self/mountinfo
 
             Refreshes self.mountpoints with current mountpoint information
         """
-        self.mountpoints = defaultdict(list)
-        mountinfo = _MountinfoCache()
+        mountpoints = defaultdict(list)
+        paths = set()
 
-        with open("/proc/mounts") as mounts:
-            for line in mounts:
+        with open("/proc/self/mountinfo") as mountinfo:
+            for line in mountinfo:
+                # id parent major:minor root mountpoint options [tags] - fstype source superoptions
+                fields = line.split()
                 try:
-                    (devspec, mountpoint, fstype, _rest) = line.split(None, 3)
+                    separator = fields.index("-", 6)
+                    (major, minor) = fields[2].split(":")
+                    devno = os.makedev(int(major), int(minor))
+                    (root, mountpoint) = fields[3:5]
+                    (fstype, source) = fields[separator + 1:separator + 3]
                 except ValueError:
-                    log.error("failed to parse /proc/mounts line: %s", line)
+                    log.error("failed to parse /proc/self/mountinfo line: %s", line)
                     continue
 
-                # use the canonical device path (if available)
-                if devspec.startswith("/dev"):
-                    devspec = resolve_devspec(devspec, sysname=True) or devspec
+                paths.add(mountpoint)
+
+                # btrfs reports an anonymous device number instead of its
+                # device's
+                if os.major(devno) == 0 and source.startswith("/dev/"):
+                    devno = self._get_device_number(source) or devno
 
                 if fstype == "btrfs":
-                    root = mountinfo.get_root(devspec, mountpoint)
-                    if root is not None:
-                        subvolspec = root[1:] or str(btrfs.MAIN_VOLUME_ID)
-                        self.mountpoints[(devspec, subvolspec)].append(mountpoint)
-                    else:
-                        log.error("failed to obtain subvolspec for btrfs device %s at mountpoint %s", devspec, mountpoint)
+                    subvolspec = root[1:] or str(btrfs.MAIN_VOLUME_ID)
+                    mountpoints[(devno, subvolspec)].append(mountpoint)
                 else:
-                    self.mountpoints[(devspec, None)].append(mountpoint)
+                    mountpoints[(devno, None)].append(mountpoint)
 
-    def _cache_check(self):
-        """ Computes the MD5 hash on /proc/mounts and updates the cache on change
+        self.mountpoints = mountpoints
+        self._paths = paths
+
+    def _changed(self):
+        """ Return True if the mount table could have changed since it was
+            last checked.
         """
+        if self._poller is None:
+            # the kernel keeps track of changes for each open file, starting
+            # with the mount table as it is when the file is opened
+            self._mounts_file = open("/proc/self/mounts")
+            self._poller = select.poll()
+            self._poller.register(self._mounts_file, select.POLLPRI | select.POLLERR)
+            return True
 
-        md5hash = util.md5_file("/proc/mounts")
+        return bool(self._poller.poll(0))
 
-        if md5hash != self.mounts_hash:
-            self.mounts_hash = md5hash
+    def _cache_check(self):
+        """ Updates the cache if the mount table has changed """
+        if self._changed():
             self._get_active_mounts()
 
 mounts_cache = MountsCache()
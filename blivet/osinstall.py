@@ -46,10 +46,7 @@ import time
 import parted
 import shutil
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from .libblockdev import blockdev
 
 from pykickstart.constants import AUTOPART_TYPE_LVM, CLEARPART_TYPE_NONE, CLEARPART_TYPE_LINUX, CLEARPART_TYPE_ALL, CLEARPART_TYPE_LIST
 from pyanaconda.constants import shortProductName
@@ -1255,15 +1252,21 @@ class InstallerStorage(Blivet):
         if _storage_root:
             self._storag_root = _storage_root
 
-    def do_it(self, callbacks=None):
+    def do_it(self, callbacks=None, workers=1, dry_run=False):
         """
         Commit queued changes to disk.
 
         :param callbacks: callbacks to be invoked when actions are executed
         :type callbacks: return value of the :func:`~.callbacks.create_new_callbacks_
+        :keyword int workers: number of external programs to run concurrently
+        :keyword bool dry_run: only estimate the cost of executing the actions
+        :returns: the estimated cost if dry_run, otherwise None
+        :rtype: :class:`~.actionplan.ExecutionPlan` or NoneType
 
         """
-        super().do_it(callbacks=callbacks)
+        plan = super().do_it(callbacks=callbacks, workers=workers, dry_run=dry_run)
+        if dry_run:
+            return plan
 
         # now set the boot partition's flag
         if self.bootloader and not self.bootloader.skip_bootloader:
@@ -24,16 +24,14 @@ from operator import gt, lt
 from decimal import Decimal
 import functools
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from .libblockdev import blockdev
 
 import parted
 
 from .errors import DeviceError, PartitioningError, AlignmentError
 from .flags import flags
 from .devices import Device, PartitionDevice, LUKSDevice, device_path_to_name
+from .formats.disklabel import DiskLabel, get_partition_slots
 from .size import Size
 from .i18n import _
 from .util import stringize, unicodeize, compare
@@ -116,6 +114,32 @@ def partition_compare(part1, part2):
 _partition_compare_key = functools.cmp_to_key(partition_compare)
 
 
+def proportional_share(base, total, pool):
+    """ Return the part of pool a request with the given base gets.
+
+        :param int base: the base size of the request
+        :param int total: the base size of all the growable requests
+        :param int pool: the number of units to share
+        :returns: int(Decimal(base) / Decimal(total) * pool)
+        :rtype: int
+
+        The result is computed with integers, which gives the same result
+        as the decimal arithmetic unless the exact share is so close to a
+        whole number that the rounding of the decimal quotient decides it.
+        Only those cases are computed using the decimals.
+    """
+    if base == total:
+        return pool
+
+    (quotient, remainder) = divmod(base * pool, total)
+    # the decimal result differs from the exact one by less than 10^-20 of it
+    if min(remainder, total - remainder) * 10 ** 20 > base * pool:
+        return quotient
+
+    share = Decimal(base) / Decimal(total)
+    return int(share * pool)  # truncate, don't round
+
+
 def get_next_partition_type(disk, no_primary=None):
     """ Return the type of partition to create next on a disk.
 
@@ -130,20 +154,27 @@ def get_next_partition_type(disk, no_primary=None):
         with the keyword argument no_primary.
 
         :param disk: the disk from which a partition may be allocated
-        :type disk: :class:`parted.Disk`
+        :type disk: :class:`parted.Disk` or :class:`~.formats.disklabel.DiskLabel`
         :keyword no_primary: refuse to return :const:`parted.PARTITION_NORMAL`
         :returns: the chosen partition type
         :rtype: a parted PARTITION_* constant
+
+        A disklabel answers from what it already knows about its partitions.
     """
+    if isinstance(disk, DiskLabel):
+        slots = disk.partition_slots
+    else:
+        slots = get_partition_slots(disk)
+
     part_type = None
-    extended = disk.getExtendedPartition()
-    supports_extended = disk.supportsFeature(parted.DISK_TYPE_EXTENDED)
-    logical_count = len(disk.getLogicalPartitions())
-    max_logicals = disk.getMaxLogicalPartitions()
-    primary_count = disk.primaryPartitionCount
-
-    if primary_count < disk.maxPrimaryPartitionCount:
-        if primary_count == disk.maxPrimaryPartitionCount - 1:
+    extended = slots.extended
+    supports_extended = slots.supports_extended
+    logical_count = slots.logical
+    max_logicals = slots.max_logical
+    primary_count = slots.primary
+
+    if primary_count < slots.max_primary:
+        if primary_count == slots.max_primary - 1:
             # can we make an extended partition? now's our chance.
             if not extended and supports_extended:
                 part_type = parted.PARTITION_EXTENDED
@@ -189,7 +220,7 @@ def get_best_free_space_region(disk, part_type, req_size, start=None,
         overall best region is returned.
 
         :param disk: the disk
-        :type disk: :class:`parted.Disk`
+        :type disk: :class:`parted.Disk` or :class:`~.formats.disklabel.DiskLabel`
         :param part_type: the type of partition we want to allocate
         :type part_type: one of parted's PARTITION_* constants
         :param req_size: the requested size of the partition in MiB
@@ -206,14 +237,22 @@ def get_best_free_space_region(disk, part_type, req_size, start=None,
         :type alignment: :class:`parted.Alignment`
 
     """
+    if isinstance(disk, DiskLabel):
+        # a disklabel answers from what it already knows about its partitions
+        extended = disk.extended_partition
+        regions = disk.free_space_regions
+        disk = disk.parted_disk
+    else:
+        extended = disk.getExtendedPartition()
+        regions = disk.getFreeSpaceRegions()
+
     log.debug("get_best_free_space_region: disk=%s part_type=%d req_size=%s "
               "boot=%s best=%s grow=%s start=%s",
               disk.device.path, part_type, req_size, boot, best_free, grow,
               start)
-    extended = disk.getExtendedPartition()
     alignment = alignment or parted.Alignment(offset=0, grainSize=1)
 
-    for free_geom in disk.getFreeSpaceRegions():
+    for free_geom in regions:
         # align the start sector of the free region since we will be aligning
         # the start sector of the partition
         if start is not None and \
@@ -342,7 +381,7 @@ def remove_new_partitions(disks, remove, all_partitions):
                 # these get removed last
                 continue
 
-            part.disk.format.parted_disk.removePartition(part.parted_partition)
+            part.disk.format.remove_partition(part.parted_partition)
             part.parted_partition = None
             part.disk = None
 
@@ -353,7 +392,7 @@ def remove_new_partitions(disks, remove, all_partitions):
            (not flags.keep_empty_ext_partitions or
                 extended not in (p.parted_partition for p in all_partitions)):
             log.debug("removing empty extended partition from %s", disk.name)
-            disk.format.parted_disk.removePartition(extended)
+            disk.format.remove_partition(extended)
 
 
 def add_partition(disklabel, free, part_type, size, start=None, end=None):
@@ -438,13 +477,7 @@ def add_partition(disklabel, free, part_type, size, start=None, end=None):
         raise PartitioningError(_("requested size exceeds maximum allowed"))
 
     # create the partition and add it to the disk
-    partition = parted.Partition(disk=disklabel.parted_disk,
-                                 type=part_type,
-                                 geometry=new_geom)
-    constraint = parted.Constraint(exactGeom=new_geom)
-    disklabel.parted_disk.addPartition(partition=partition,
-                                       constraint=constraint)
-    return partition
+    return disklabel.add_partition(new_geom.start, new_geom.end, part_type)
 
 
 def get_free_regions(disks, align=False):
@@ -675,6 +708,10 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
 
     remove_new_partitions(disks, new_partitions, partitions)
 
+    # growth of the partitions allocated so far on each disk, keyed by disk
+    # path; it only changes when another partition is allocated on the disk
+    layout_growth = {}
+
     for _part in new_partitions:
         if _part.parted_partition and _part.is_extended:
             # ignore new extendeds as they are implicit requests
@@ -737,15 +774,15 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
                 log.debug("size %s rounded up to %s for disk %s",
                           _part.req_size, req_size, _disk.name)
 
-            new_part_type = get_next_partition_type(disklabel.parted_disk)
+            new_part_type = get_next_partition_type(disklabel)
             if new_part_type is None:
                 # can't allocate any more partitions on this disk
                 log.debug("no free partition slots on %s", _disk.name)
                 continue
 
             if _part.req_primary and new_part_type != parted.PARTITION_NORMAL:
-                if (disklabel.parted_disk.primaryPartitionCount <
-                        disklabel.parted_disk.maxPrimaryPartitionCount):
+                slots = disklabel.partition_slots
+                if slots.primary < slots.max_primary:
                     # don't fail to create a primary if there are only three
                     # primary partitions on the disk (#505269)
                     new_part_type = parted.PARTITION_NORMAL
@@ -757,7 +794,7 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
                     new_part_type != _part.req_part_type:
                 new_part_type = _part.req_part_type
 
-            best = get_best_free_space_region(disklabel.parted_disk,
+            best = get_best_free_space_region(disklabel,
                                               new_part_type,
                                               req_size,
                                               start=_part.req_start_sector,
@@ -770,10 +807,10 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
                new_part_type == parted.PARTITION_NORMAL:
                 # see if we can do better with a logical partition
                 log.debug("not enough free space for primary -- trying logical")
-                new_part_type = get_next_partition_type(disklabel.parted_disk,
+                new_part_type = get_next_partition_type(disklabel,
                                                         no_primary=True)
                 if new_part_type:
-                    best = get_best_free_space_region(disklabel.parted_disk,
+                    best = get_best_free_space_region(disklabel,
                                                       new_part_type,
                                                       req_size,
                                                       start=_part.req_start_sector,
@@ -789,6 +826,10 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
                     log.debug("evaluating growth potential for new layout")
                     new_growth = 0
                     for disk_path in disklabels.keys():
+                        if disk_path != _disk.path and disk_path in layout_growth:
+                            new_growth += layout_growth[disk_path]
+                            continue
+
                         log.debug("calculating growth for disk %s", disk_path)
                         # Now we check, for growable requests, which of the two
                         # free regions will allow for more growth.
@@ -811,7 +852,7 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
 
                                 _part_type = parted.PARTITION_LOGICAL
 
-                                _free = get_best_free_space_region(disklabel.parted_disk,
+                                _free = get_best_free_space_region(disklabel,
                                                                    _part_type,
                                                                    req_size,
                                                                    start=_part.req_start_sector,
@@ -823,7 +864,7 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
                                              "extended partition for growth test")
                                     if new_part_type == parted.PARTITION_EXTENDED:
                                         e = disklabel.extended_partition
-                                        disklabel.parted_disk.removePartition(e)
+                                        disklabel.remove_partition(e)
 
                                     continue
 
@@ -869,15 +910,17 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
                                   disk_path, disk_growth,
                                   sectors_to_size(disk_growth,
                                                   disk_sector_size))
+                        if disk_path != _disk.path:
+                            layout_growth[disk_path] = disk_growth
 
                     if temp_part:
-                        disklabel.parted_disk.removePartition(temp_part)
+                        disklabel.remove_partition(temp_part)
                     _part.parted_partition = None
                     _part.disk = None
 
                     if new_part_type == parted.PARTITION_EXTENDED:
                         e = disklabel.extended_partition
-                        disklabel.parted_disk.removePartition(e)
+                        disklabel.remove_partition(e)
 
                     log.debug("total growth: %d sectors", new_growth)
 
@@ -932,7 +975,7 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
 
             # recalculate freespace
             log.debug("recalculating free space")
-            free = get_best_free_space_region(disklabel.parted_disk,
+            free = get_best_free_space_region(disklabel,
                                               part_type,
                                               aligned_size,
                                               start=_part.req_start_sector,
@@ -957,6 +1000,7 @@ def allocate_partitions(storage, disks, partitions, freespace, boot_disk=None):
         # this one sets the name
         _part.parted_partition = partition
         _part.disk = _disk
+        layout_growth.pop(_disk.path, None)
 
         # parted modifies the partition in the process of adding it to
         # the disk, so we need to grab the latest version...
@@ -1237,11 +1281,15 @@ class Chunk(object):
             Under uniform growth, all requests receive an equal portion of the
             free units.
         """
+        # the sizes in the debug messages are costly to compute, so they are
+        # only computed when the messages are going to be logged
+        debug = log.isEnabledFor(logging.DEBUG)
         log.debug("Chunk.grow_requests: %r", self)
 
         self.sort_requests()
-        for req in self.requests:
-            log.debug("req: %r", req)
+        if debug:
+            for req in self.requests:
+                log.debug("req: %r", req)
 
         # we use this to hold the base for the next loop through the
         # chunk's requests since we want the base to be the same for
@@ -1254,8 +1302,9 @@ class Chunk(object):
             if uniform:
                 growth = int(last_pool / self.remaining)
 
-            log.debug("%d requests and %s (%s) left in chunk",
-                      self.remaining, self.pool, self.length_to_size(self.pool))
+            if debug:
+                log.debug("%d requests and %s (%s) left in chunk",
+                          self.remaining, self.pool, self.length_to_size(self.pool))
             for p in self.requests:
                 if p.done or p in self.skip_list:
                     continue
@@ -1264,20 +1313,21 @@ class Chunk(object):
                     # Each request is allocated free units from the pool
                     # based on the relative _base_ sizes of the remaining
                     # growable requests.
-                    share = Decimal(p.base) / Decimal(self.base)
-                    growth = int(share * last_pool)  # truncate, don't round
+                    growth = proportional_share(p.base, self.base, last_pool)
 
                 p.growth += growth
                 self.pool -= growth
-                log.debug("adding %s (%s) to %d (%s)",
-                          growth, self.length_to_size(growth),
-                          p.device.id, p.device.name)
+                if debug:
+                    log.debug("adding %s (%s) to %d (%s)",
+                              growth, self.length_to_size(growth),
+                              p.device.id, p.device.name)
 
                 new_base = self.trim_over_grown_request(p, base=new_base)
-                log.debug("new grow amount for request %d (%s) is %s "
-                          "units, or %s",
-                          p.device.id, p.device.name, p.growth,
-                          self.length_to_size(p.growth))
+                if debug:
+                    log.debug("new grow amount for request %d (%s) is %s "
+                              "units, or %s",
+                              p.device.id, p.device.name, p.growth,
+                              self.length_to_size(p.growth))
 
         if self.pool:
             # allocate any leftovers in pool to the first partition
@@ -1289,15 +1339,17 @@ class Chunk(object):
                 growth = self.pool
                 p.growth += growth
                 self.pool = 0
-                log.debug("adding %s (%s) to %d (%s)",
-                          growth, self.length_to_size(growth),
-                          p.device.id, p.device.name)
+                if debug:
+                    log.debug("adding %s (%s) to %d (%s)",
+                              growth, self.length_to_size(growth),
+                              p.device.id, p.device.name)
 
                 self.trim_over_grown_request(p)
-                log.debug("new grow amount for request %d (%s) is %s "
-                          "units, or %s",
-                          p.device.id, p.device.name, p.growth,
-                          self.length_to_size(p.growth))
+                if debug:
+                    log.debug("new grow amount for request %d (%s) is %s "
+                              "units, or %s",
+                              p.device.id, p.device.name, p.growth,
+                              self.length_to_size(p.growth))
 
                 if self.pool == 0:
                     break
@@ -1883,9 +1935,9 @@ def grow_partitions(disks, partitions, free, size_sets=None):
 
                 log.debug("setting %s new geometry: %s", name,
                           partition.geometry)
-                constraint = parted.Constraint(exactGeom=partition.geometry)
-                disklabel.parted_disk.addPartition(partition=partition,
-                                                   constraint=constraint)
+                partition = disklabel.add_partition(partition.geometry.start,
+                                                    partition.geometry.end,
+                                                    partition.type)
                 path = partition.path
                 if device:
                     # set the device's name
@@ -21,14 +21,12 @@
 #
 
 import os
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
 
 from ... import formats
 from ... import udev
 from ...errors import InvalidDiskLabelError
+from ...static_data import probe_data
+from ...static_data.probe_data import is_mpath_member
 from ...storage_log import log_exception_info, log_method_call
 from .formatpopulator import FormatPopulator
 
@@ -46,7 +44,7 @@ class DiskLabelFormatPopulator(FormatPopulator):
         return (bool(udev.device_get_disklabel_type(data)) and
                 not udev.device_is_biosraid_member(data) and
                 udev.device_get_format(data) != "iso9660" and
-                not (device.is_disk and blockdev.mpath_is_mpath_member(device.path)))
+                not (device.is_disk and probe_data.get(is_mpath_member, device.path)))
 
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
@@ -20,10 +20,7 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ...libblockdev import blockdev
 
 from ... import udev
 from ...devices import DMRaidArrayDevice
@@ -20,11 +20,6 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
-
 from ...callbacks import callbacks
 from ... import udev
 from ...devicelibs import lvm
@@ -36,7 +31,7 @@ from ...storage_log import log_method_call
 from .devicepopulator import DevicePopulator
 from .formatpopulator import FormatPopulator
 
-from ...static_data import lvs_info, pvs_info
+from ...static_data import lvm_info
 
 import logging
 log = logging.getLogger("blivet")
@@ -87,7 +82,7 @@ class LVMFormatPopulator(FormatPopulator):
     def _get_kwargs(self):
         kwargs = super()._get_kwargs()
 
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
 
         name = udev.device_get_name(self.data)
         if pv_info:
@@ -120,11 +115,12 @@ class LVMFormatPopulator(FormatPopulator):
             return
 
         vg_name = vg_device.name
-        lv_info = dict((k, v) for (k, v) in iter(lvs_info.cache.items())
+        lv_info = dict((k, v) for (k, v) in iter(lvm_info.lvs.items())
                        if v.vg_name == vg_name)
 
         # FIXME: This should account for added/removed LVs.
-        self._devicetree.names.extend(n for n in lv_info.keys() if n not in self._devicetree.names)
+        for name in lv_info.keys():
+            self._devicetree._add_name(name)
 
         for lv_device in vg_device.lvs[:]:
             if lv_device.name not in lv_info:
@@ -198,7 +194,7 @@ class LVMFormatPopulator(FormatPopulator):
 
             if lv_attr[0] in 'Ss':
                 log.info("found lvm snapshot volume '%s'", name)
-                origin_name = blockdev.lvm.lvorigin(vg_name, lv_name)
+                origin_name = lvm_info.lv_origin(vg_name, lv_name)
                 if not origin_name:
                     log.error("lvm snapshot '%s-%s' has unknown origin",
                               vg_name, lv_name)
@@ -229,11 +225,11 @@ class LVMFormatPopulator(FormatPopulator):
                 pass
             elif lv_attr[0] == 'V':
                 # thin volume
-                pool_name = blockdev.lvm.thlvpoolname(vg_name, lv_name)
+                pool_name = lvm_info.thin_pool_name(vg_name, lv_name)
                 pool_device_name = "%s-%s" % (vg_name, pool_name)
                 add_required_lv(pool_device_name, "failed to look up thin pool")
 
-                origin_name = blockdev.lvm.lvorigin(vg_name, lv_name)
+                origin_name = lvm_info.lv_origin(vg_name, lv_name)
                 if origin_name:
                     origin_device_name = "%s-%s" % (vg_name, origin_name)
                     add_required_lv(origin_device_name, "failed to locate origin lv")
@@ -345,7 +341,7 @@ class LVMFormatPopulator(FormatPopulator):
                 log.warning("Failed to determine parent LV for an internal LV '%s'", lv.name)
 
     def _add_vg_device(self):
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         if pv_info:
             vg_name = pv_info.vg_name
             vg_uuid = pv_info.vg_uuid
@@ -400,7 +396,7 @@ class LVMFormatPopulator(FormatPopulator):
         if vg_device is None:
             return
 
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         if not pv_info or not pv_info.vg_name:
             return
 
@@ -410,7 +406,7 @@ class LVMFormatPopulator(FormatPopulator):
         # TODO: update name registry
 
     def _update_pv_format(self):
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         if not pv_info:
             return
 
@@ -422,7 +418,7 @@ class LVMFormatPopulator(FormatPopulator):
     def update(self):
         self._devicetree.drop_lvm_cache()
         self._update_pv_format()
-        pv_info = pvs_info.cache.get(self.device.path, None)
+        pv_info = lvm_info.pvs.get(self.device.path, None)
         vg_device = self._get_vg_device()
         if vg_device is None:
             # The VG device isn't in the tree. The PV might have just been
@@ -20,10 +20,7 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ...libblockdev import blockdev
 
 import re
 
@@ -33,6 +30,8 @@ from ...devices import MDRaidArrayDevice, MDContainerDevice
 from ...devices import device_path_to_name
 from ...errors import DeviceError, NoSlavesError
 from ...flags import flags
+from ...static_data import probe_data
+from ...static_data.probe_data import md_examine
 from ...storage_log import log_method_call
 from .devicepopulator import DevicePopulator
 from .formatpopulator import FormatPopulator
@@ -114,7 +113,7 @@ class MDFormatPopulator(FormatPopulator):
     def run(self):
         super().run()
         try:
-            md_info = blockdev.md.examine(self.device.path)
+            md_info = probe_data.get(md_examine, self.device.path)
         except blockdev.MDRaidError as e:
             # This could just mean the member is not part of any array.
             log.debug("blockdev.md.examine error: %s", str(e))
@@ -22,9 +22,7 @@
 
 import copy
 
-import gi
-gi.require_version("BlockDev", "1.0")
-from gi.repository import BlockDev as blockdev
+from ...libblockdev import blockdev
 
 from ... import udev
 from ...devicelibs import lvm
@@ -25,10 +25,7 @@ import pprint
 import copy
 import parted
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 from ..errors import DeviceError, DeviceTreeError, NoSlavesError
 from ..devices import DMLinearDevice, DMRaidArrayDevice
@@ -44,7 +41,9 @@ from ..flags import flags
 from ..storage_log import log_method_call
 from ..threads import SynchronizedMeta
 from .helpers import get_device_helper, get_format_helper
-from ..static_data import lvs_info, pvs_info, luks_data
+from .profile import PopulateProfile, measure
+from ..static_data import lvm_info, luks_data, probe_data
+from ..static_data.probe_data import is_mpath_member, md_examine
 
 import logging
 log = logging.getLogger("blivet")
@@ -94,6 +93,11 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
 
         self._cleanup = False
 
+        self.populate_profile = None
+        """ :class:`~.populator.profile.PopulateProfile` of the last populate,
+            if :attr:`~.flags.Flags.profile_populate` was set
+        """
+
     def _udev_device_is_disk(self, info):
         """ Return True if the udev device looks like a disk.
 
@@ -153,7 +157,7 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
                 slave_dev = self.get_device_by_name(slave_name)
                 if slave_dev is None:
                     if udev.device_is_dm_lvm(info):
-                        if slave_name not in lvs_info.cache:
+                        if slave_name not in lvm_info.lvs:
                             # we do not expect hidden lvs to be in the tree
                             continue
 
@@ -170,7 +174,7 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
 
     def _add_name(self, name):
         if name not in self.names:
-            self.names.append(name)
+            self._insert_name(name)
 
     def _reason_to_skip_device(self, info):
         sysfs_path = udev.device_get_sysfs_path(info)
@@ -223,7 +227,7 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         return device
 
     def _clear_new_multipath_member(self, device):
-        if device is None or not device.is_disk or not blockdev.mpath.is_mpath_member(device.path):
+        if device is None or not device.is_disk or not probe_data.get(is_mpath_member, device.path):
             return
 
         # newly added device (eg iSCSI) could make this one a multipath member
@@ -254,6 +258,116 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
     def _get_device_helper(self, info):
         return get_device_helper(info)
 
+    def _udev_device_layers(self, devices):
+        """ Return the depth of each of a list of devices in the device stack.
+
+            :param devices: udev info for the devices
+            :type devices: list of :class:`pyudev.Device`
+            :returns: layer numbers keyed by sys_name
+            :rtype: dict
+
+            Devices with no slaves or parent disk among devices are in layer
+            0, and every other device is one layer above its highest slave.
+        """
+        parents = {}
+        for info in devices:
+            sysfs_path = udev.device_get_sysfs_path(info)
+            slave_dir = os.path.normpath("%s/slaves" % sysfs_path)
+            try:
+                parents[info.sys_name] = os.listdir(slave_dir)
+            except OSError:
+                parents[info.sys_name] = []
+
+            if udev.device_is_partition(info):
+                parents[info.sys_name].append(os.path.basename(os.path.dirname(sysfs_path)))
+
+        layers = {}
+
+        def get_layer(sys_name, seen):
+            if sys_name not in layers:
+                seen = seen | set([sys_name])
+                layers[sys_name] = 1 + max([get_layer(p, seen) for p in parents[sys_name]
+                                            if p in parents and p not in seen] or [-1])
+            return layers[sys_name]
+
+        for info in devices:
+            get_layer(info.sys_name, set())
+
+        return layers
+
+    def _udev_device_path(self, info):
+        """ Return the path the device described by info will have. """
+        name = udev.device_get_name(info)
+        if udev.device_is_dm(info):
+            path = "/dev/mapper/%s" % name
+        elif udev.device_is_md(info):
+            path = "/dev/md/%s" % name
+        else:
+            path = "/dev/%s" % name
+
+        return path
+
+    def _udev_device_probes(self, info):
+        """ Return the (probe, path) pairs handling a device is going to need. """
+        path = self._udev_device_path(info)
+        probes = []
+        if self._udev_device_is_disk(info):
+            probes.append((is_mpath_member, path))
+        if udev.device_get_format(info) == "linux_raid_member":
+            probes.append((md_examine, path))
+
+        return probes
+
+    def _udev_device_programs(self, info):
+        """ Return the programs handling a device's format is going to run.
+
+            Only the programs gathering the size information of a filesystem
+            are returned, and only for devices that are going to be added to
+            the tree. Disks are left out since they may turn out to be
+            multipath members, which are not checked.
+        """
+        if self._udev_device_is_disk(info) or \
+           self.get_device_by_name(udev.device_get_name(info)) or \
+           self._reason_to_skip_device(info):
+            return []
+
+        fmt_class = formats.get_device_format_class(udev.device_get_format(info))
+        if fmt_class is None or not issubclass(fmt_class, formats.fs.FS):
+            return []
+
+        return fmt_class.size_info_programs(self._udev_device_path(info))
+
+    def _prefetch_device_probes(self, devices):
+        """ Start probing devices in worker threads.
+
+            :param devices: udev info for the devices about to be handled
+            :type devices: list of :class:`pyudev.Device`
+
+            The probes only read information, so running them ahead of time
+            does not change the outcome of handling the devices, which is
+            still done one device at a time. Probes are started from the
+            bottom of the device stack up, since handling a device requires
+            handling its slaves first.
+
+            Besides the probes, the programs checking and measuring the
+            filesystems are started, one device's programs after another in
+            the order the filesystem's format instance runs them. The rest of
+            the format information comes from udev and the LVM and LUKS data
+            already cached for the whole pass.
+        """
+        if flags.populate_workers <= 1:
+            return
+
+        layers = self._udev_device_layers(devices)
+        probes = []
+        programs = []
+        for info in sorted(devices, key=lambda i: layers[i.sys_name]):
+            probes.extend(self._udev_device_probes(info))
+            programs.append(self._udev_device_programs(info))
+
+        probe_data.prefetch(probes, workers=flags.populate_workers)
+        probe_data.prefetch_programs(programs, workers=flags.populate_workers)
+
     def handle_device(self, info, update_orig_fmt=False):
         """
             :param :class:`pyudev.Device` info: udev info for the device
@@ -264,6 +378,10 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
             that corresponds to info is already in the tree, its original format
             will not be updated unless update_orig_fmt is True.
         """
+        with measure(self.populate_profile, "devices", udev.device_get_name(info)):
+            self._handle_device(info, update_orig_fmt=update_orig_fmt)
+
+    def _handle_device(self, info, update_orig_fmt=False):
         name = udev.device_get_name(info)
         log_method_call(self, name=name, info=pprint.pformat(dict(info)))
         sysfs_path = udev.device_get_sysfs_path(info)
@@ -289,7 +407,8 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
             helper_class = self._get_device_helper(info)
 
         if helper_class is not None:
-            device = helper_class(self, info).run()
+            with measure(self.populate_profile, "helpers", helper_class.__name__):
+                device = helper_class(self, info).run()
 
         if not device:
             log.debug("no device obtained for %s", name)
@@ -327,7 +446,8 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
 
         helper_class = self._get_format_helper(info, device=device)
         if helper_class is not None:
-            helper_class(self, info, device).run()
+            with measure(self.populate_profile, "helpers", helper_class.__name__):
+                helper_class(self, info, device).run()
 
         log.info("got format: %s", device.format)
 
@@ -431,6 +551,11 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
         if cleanup_only:
             self._cleanup = True
 
+        self.populate_profile = None
+        if flags.profile_populate:
+            self.populate_profile = PopulateProfile()
+            self.populate_profile.start()
+
         parted.register_exn_handler(parted_exn_handler)
         try:
             self._populate()
@@ -438,7 +563,12 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
             raise
         finally:
             parted.clear_exn_handler()
+            probe_data.drop_cache()
             self._hide_ignored_disks()
+            if self.populate_profile is not None:
+                self.populate_profile.stop()
+                log.info("populate took %.2f seconds and ran %d programs",
+                         self.populate_profile.time, self.populate_profile.commands)
 
         if flags.auto_dev_updates:
             self.teardown_all()
@@ -473,6 +603,9 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
                 break
 
             log.info("devices to scan: %s", [udev.device_get_name(d) for d in devices])
+            # the previous pass may have changed what the probes report
+            probe_data.drop_cache()
+            self._prefetch_device_probes(devices)
             for dev in devices:
                 self.handle_device(dev)
 
@@ -482,8 +615,7 @@ class PopulatorMixin(object, metaclass=SynchronizedMeta):
 
     def drop_lvm_cache(self):
         """ Drop cached lvm information. """
-        lvs_info.drop_cache()
-        pvs_info.drop_cache()
+        lvm_info.drop_cache()
 
     def handle_nodev_filesystems(self):
         for line in open("/proc/mounts").readlines():
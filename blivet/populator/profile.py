@@ -0,0 +1,159 @@
+# populator/profile.py
+# Timing of device tree population.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import get_ident
+import time
+
+from .. import storage_log
+from .. import util
+
+
+def _new_section():
+    return {"calls": 0, "time": 0.0, "self_time": 0.0, "commands": 0}
+
+
+class PopulateProfile(object):
+    """ Wall time and external program runs recorded during a populate.
+
+        Time is recorded per helper class and per device. For each of them
+        "time" includes everything that ran inside it, such as the handling
+        of a device's slaves, while "self_time" and "commands" only count
+        what was not inside a nested helper or device. Programs run through
+        :func:`~.util.run_program` and friends are also counted by name, and
+        so are the calls to methods traced by :mod:`~.storage_log`.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._start = None
+        self._stack = []
+        self.time = 0.0
+        self.commands = 0
+        self.helpers = defaultdict(_new_section)
+        self.devices = defaultdict(_new_section)
+        self.programs = defaultdict(lambda: {"calls": 0, "time": 0.0})
+        self.methods = {}
+
+    @property
+    def running(self):
+        return self._start is not None
+
+    def start(self):
+        self._thread = get_ident()
+        self._start = time.time()
+        util.add_program_observer(self._program_ran)
+        storage_log.start_method_stats()
+
+    def stop(self):
+        if not self.running:
+            return
+
+        util.remove_program_observer(self._program_ran)
+        stats = storage_log.stop_method_stats()
+        if stats is not None:
+            self.methods = stats.report()
+
+        self.time += time.time() - self._start
+        self._start = None
+        self._stack = []
+
+    @contextmanager
+    def measure(self, kind, name):
+        """ Record the time spent in a block of code.
+
+            :param str kind: "helpers" or "devices"
+            :param str name: helper class or device name
+        """
+        if not self.running or get_ident() != self._thread:
+            yield
+            return
+
+        section = getattr(self, kind)[name]
+        frame = [kind, section, 0.0]
+        self._stack.append(frame)
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            self._stack.remove(frame)
+            section["calls"] += 1
+            section["time"] += elapsed
+            section["self_time"] += elapsed - frame[2]
+            # take this section's time out of the enclosing one of its kind
+            for outer in reversed(self._stack):
+                if outer[0] == kind:
+                    outer[2] += elapsed
+                    break
+
+    def _program_ran(self, argv, elapsed):
+        program = self.programs[argv[0]]
+        program["calls"] += 1
+        program["time"] += elapsed
+        self.commands += 1
+        if get_ident() != self._thread:
+            return
+
+        # count it against the innermost helper and the innermost device
+        kinds = set()
+        for (kind, section, _nested) in reversed(self._stack):
+            if kind not in kinds:
+                kinds.add(kind)
+                section["commands"] += 1
+
+    def report(self):
+        """ Return the recorded information.
+
+            :rtype: dict with "time", "commands", "helpers", "devices",
+                    "programs" and "methods" keys, suitable for JSON
+                    serialization
+        """
+        return {"time": self.time,
+                "commands": self.commands,
+                "helpers": dict((k, dict(v)) for (k, v) in self.helpers.items()),
+                "devices": dict((k, dict(v)) for (k, v) in self.devices.items()),
+                "programs": dict((k, dict(v)) for (k, v) in self.programs.items()),
+                "methods": self.methods}
+
+
+class _NullSection(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_section = _NullSection()
+
+
+def measure(profile, kind, name):
+    """ Return a context manager that records a section of profile.
+
+        :param profile: the profile to record into, or None to record nothing
+        :type profile: :class:`PopulateProfile` or NoneType
+        :param str kind: "helpers" or "devices"
+        :param str name: helper class or device name
+    """
+    if profile is None:
+        return _null_section
+
+    return profile.measure(kind, name)
@@ -0,0 +1,166 @@
+# snapshot.py
+# Copy-on-write snapshots of the storage model.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+import copy
+
+from .util import ObjectID
+
+import logging
+log = logging.getLogger("blivet")
+
+# snapshots that are recording changes
+_snapshots = []
+
+
+def record(obj):
+    """ Save the state of obj in every active snapshot that lacks it.
+
+        This has to be called before changing an object in a way that does
+        not go through attribute assignment, eg: appending to a list held
+        in one of its attributes.
+    """
+    for snapshot in _snapshots:
+        snapshot.save(obj)
+
+
+def journal(undo, *args):
+    """ Add a step that undoes a change to every active snapshot.
+
+        :param callable undo: function that undoes the change
+        :param args: arguments to call undo with
+
+        This is how containers like the device tree and the action list,
+        whose state is too large to save on every change, keep track of
+        their changes. Restoring a snapshot runs the steps in reverse order,
+        after restoring the saved objects.
+    """
+    for snapshot in _snapshots:
+        snapshot._journal.append((undo, args))
+
+
+class SnapshotMixin(object):
+    """ Mixin for objects whose state is kept by snapshots.
+
+        The state of an object is saved in each active snapshot the first
+        time one of its attributes is assigned after the snapshot was taken.
+    """
+
+    def __setattr__(self, name, value):
+        if _snapshots:
+            record(self)
+
+        super().__setattr__(name, value)
+
+    def _snapshot_state(self):
+        """ Return a copy of this object's state.
+
+            Lists, dicts and sets are copied so that they can be changed in
+            place afterwards. Everything else is shared.
+        """
+        return dict((attr, copy.copy(value) if isinstance(value, (list, dict, set)) else value)
+                    for (attr, value) in self.__dict__.items())
+
+    def _restore_snapshot_state(self, state):
+        """ Return this object to a state from :meth:`_snapshot_state`. """
+        self.__dict__.clear()
+        self.__dict__.update(state)
+
+
+class Snapshot(object):
+    """ Saved state of the storage model that can be restored later.
+
+        Taking a snapshot does not copy anything. Objects save their state
+        in the snapshot the first time they change afterwards and containers
+        add steps to its undo journal, so restoring it only touches what
+        changed. Objects created after the snapshot was taken are not saved.
+
+        A snapshot records changes until it is restored or discarded. Any
+        number of snapshots can record at the same time, so a snapshot can
+        serve as a savepoint within the scope of another one.
+    """
+
+    def __init__(self):
+        # ids of objects created from here on are greater than this one
+        self._first_new_id = ObjectID._newid_gen()
+        self._states = {}   # id(obj) -> (obj, state or None for new objects)
+        self._attrs = []
+        self._journal = []
+        _snapshots.append(self)
+
+    @property
+    def active(self):
+        """ True if this snapshot is recording changes. """
+        return self in _snapshots
+
+    @property
+    def changed(self):
+        """ The objects whose state has been saved. """
+        return [obj for (obj, state) in self._states.values() if state is not None]
+
+    def save(self, obj):
+        """ Save the state of obj unless it is already saved or new. """
+        if id(obj) in self._states:
+            return
+
+        state = None
+        if not isinstance(obj, ObjectID) or obj.__dict__.get("id", self._first_new_id) < self._first_new_id:
+            state = obj._snapshot_state()
+
+        # keep a reference to the object so its id() cannot be reused
+        self._states[id(obj)] = (obj, state)
+
+    def save_attrs(self, obj, *attrs):
+        """ Save copies of attributes of an object that is not tracked.
+
+            :param obj: the object
+            :param attrs: names of attributes to save a shallow copy of
+        """
+        self._attrs.append((obj, dict((attr, copy.copy(getattr(obj, attr))) for attr in attrs)))
+
+    def restore(self):
+        """ Return everything to its state when the snapshot was taken.
+
+            :returns: the objects whose state was restored
+            :rtype: list
+
+            The snapshot is discarded.
+        """
+        self.discard()
+        restored = self.changed
+        log.debug("restoring %d objects from snapshot", len(restored))
+        for obj in restored:
+            # restoring an object is a change as far as other snapshots go
+            record(obj)
+            obj._restore_snapshot_state(self._states[id(obj)][1])
+
+        for (obj, attrs) in self._attrs:
+            for (attr, value) in attrs.items():
+                setattr(obj, attr, value)
+
+        log.debug("undoing %d journaled changes", len(self._journal))
+        for (undo, args) in reversed(self._journal):
+            undo(*args)
+
+        return restored
+
+    def discard(self):
+        """ Stop recording changes. """
+        if self in _snapshots:
+            _snapshots.remove(self)
@@ -1,2 +1,3 @@
-from .lvm_info import lvs_info, pvs_info
+from .lvm_info import lvm_info
 from .luks_data import luks_data
+from .probe_data import probe_data
@@ -20,48 +20,109 @@
 # Red Hat Author(s): Jan Pokorny <japokorn@redhat.com>
 #
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 import logging
 log = logging.getLogger("blivet")
 
 
-class LVsInfo(object):
+class LVMInfo(object):
     """ Class to be used as a singleton.
-        Maintains the LVs cache.
+        Maintains a snapshot of the LVM metadata.
+
+        The LVs and PVs are both listed the first time either of them is
+        needed and kept until :meth:`drop_cache` is called. The PV listing
+        includes the data of each PV's VG, so VGs are not listed separately.
+        Information that
+        is not part of those listings, like the origin of a snapshot or the
+        pool of a cached LV, is looked up on demand and kept in the same
+        snapshot, including lookups that failed. Information that changes on
+        its own, like the statistics of a cache, is not kept.
     """
 
+    def __init__(self):
+        self._lvs = None
+        self._pvs = None
+        self._lv_data = {}
+
+    def _populate(self):
+        self._lvs = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in blockdev.lvm.lvs())
+        self._pvs = dict((pv.pv_name, pv) for pv in blockdev.lvm.pvs())
+
     @property
-    def cache(self):
-        if self._lvs_cache is None:
-            lvs = blockdev.lvm.lvs()
-            self._lvs_cache = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs)  # pylint: disable=attribute-defined-outside-init
+    def lvs(self):
+        """ LV data keyed by full ("vgname-lvname") LV name """
+        if self._lvs is None:
+            self._populate()
 
-        return self._lvs_cache
+        return self._lvs
 
-    def drop_cache(self):
-        self._lvs_cache = None  # pylint: disable=attribute-defined-outside-init
+    @property
+    def pvs(self):
+        """ PV data keyed by PV path """
+        if self._pvs is None:
+            self._populate()
 
-lvs_info = LVsInfo()
+        return self._pvs
 
+    def pv_info(self, pv_path):
+        """ Return the data of one PV.
 
-class PVsInfo(object):
-    """ Class to be used as a singleton.
-        Maintains the PVs cache.
-    """
+            The PV listing is used if it is loaded. Otherwise only this PV is
+            looked up, so a query after the cache was dropped does not list
+            all of the LVM metadata again.
+        """
+        pv = self._pvs.get(pv_path) if self._pvs is not None else None
+        return pv or blockdev.lvm.pvinfo(pv_path)
 
-    @property
-    def cache(self):
-        if self._pvs_cache is None:
-            pvs = blockdev.lvm.pvs()
-            self._pvs_cache = dict((pv.pv_name, pv) for pv in pvs)  # pylint: disable=attribute-defined-outside-init
+    def _get_lv_data(self, func_name, vg_name, lv_name, field=None):
+        """ Return the result of a blockdev.lvm function, looking it up once.
+
+            :param str func_name: name of the blockdev.lvm function to call
+                                  with vg_name and lv_name
+            :param str field: name of the LV data field holding the same
+                              information, if the LV listing provides it
+        """
+        key = (func_name, vg_name, lv_name)
+        if key not in self._lv_data:
+            lv = self.lvs.get("%s-%s" % (vg_name, lv_name))
+            if field is not None and lv is not None and hasattr(lv, field):
+                self._lv_data[key] = (getattr(lv, field), None)
+            else:
+                try:
+                    self._lv_data[key] = (getattr(blockdev.lvm, func_name)(vg_name, lv_name), None)
+                except blockdev.LVMError as e:
+                    self._lv_data[key] = (None, e)
+
+        (result, error) = self._lv_data[key]
+        if error is not None:
+            raise error
+
+        return result
+
+    def lv_origin(self, vg_name, lv_name):
+        """ Return the name of the origin of an LV. """
+        return self._get_lv_data("lvorigin", vg_name, lv_name, field="origin")
+
+    def thin_pool_name(self, vg_name, lv_name):
+        """ Return the name of the thin pool of a thin LV. """
+        return self._get_lv_data("thlvpoolname", vg_name, lv_name, field="pool_lv")
+
+    def data_lv_name(self, vg_name, lv_name):
+        """ Return the name of the data LV of a pool. """
+        return self._get_lv_data("data_lv_name", vg_name, lv_name, field="data_lv")
+
+    def metadata_lv_name(self, vg_name, lv_name):
+        """ Return the name of the metadata LV of a pool. """
+        return self._get_lv_data("metadata_lv_name", vg_name, lv_name, field="metadata_lv")
 
-        return self._pvs_cache
+    def cache_pool_name(self, vg_name, lv_name):
+        """ Return the name of the cache pool of a cached LV. """
+        return self._get_lv_data("cache_pool_name", vg_name, lv_name)
 
     def drop_cache(self):
-        self._pvs_cache = None  # pylint: disable=attribute-defined-outside-init
+        self._lvs = None
+        self._pvs = None
+        self._lv_data = {}
 
-pvs_info = PVsInfo()
+lvm_info = LVMInfo()
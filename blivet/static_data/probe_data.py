@@ -0,0 +1,166 @@
+# probe_data.py
+# Backend code for probing devices while populating a DeviceTree.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from .. import util
+from ..libblockdev import blockdev
+
+import logging
+log = logging.getLogger("blivet")
+
+
+#
+# Probes. These only read information about a device and do not need the
+# global lock, so they can run in worker threads.
+#
+def is_mpath_member(path):
+    """ Return True if the device at path is a multipath member. """
+    return blockdev.mpath_is_mpath_member(path)
+
+
+def md_examine(path):
+    """ Return the md superblock information of the device at path. """
+    return blockdev.md.examine(path)
+
+
+def _run_programs(argvs):
+    """ Run programs one after another.
+
+        :returns: (rc, output) for each program, or the OSError raised when
+                  running it
+        :rtype: list
+    """
+    results = []
+    for argv in argvs:
+        try:
+            results.append(util.run_program_and_capture_output(argv))
+        except OSError as e:
+            results.append(e)
+
+    return results
+
+
+class ProbeData(object):
+    """ Class to be used as a singleton.
+        Maintains the results of device probes started ahead of time.
+
+        :meth:`prefetch` runs probes in a pool of worker threads. :meth:`get`
+        returns the result of a prefetched probe, waiting for it if it is
+        still running, and runs any other probe directly. Exceptions raised
+        by a probe are raised by :meth:`get`.
+
+        :meth:`prefetch_programs` and :meth:`run_program` do the same for
+        external programs, like the ones checking and measuring a filesystem.
+        A prefetched program run is only used once, since running a program
+        again may give a different result.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._results = {}
+        self._programs = {}
+        self._executor = None
+
+    def _start_executor(self, workers):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def prefetch(self, probes, workers):
+        """ Start running probes in worker threads.
+
+            :param probes: (probe, path) pairs, in the order to start them
+            :type probes: list of tuple
+            :param int workers: maximum number of worker threads
+        """
+        with self._lock:
+            self._start_executor(workers)
+            for (probe, path) in probes:
+                if (probe, path) not in self._results:
+                    self._results[(probe, path)] = self._executor.submit(probe, path)
+
+    def prefetch_programs(self, programs, workers):
+        """ Start running external programs in worker threads.
+
+            :param programs: lists of programs (argv lists) to run one after
+                             another in a single worker thread, in the order
+                             to start them
+            :type programs: list of list
+            :param int workers: maximum number of worker threads
+        """
+        with self._lock:
+            self._start_executor(workers)
+            for argvs in programs:
+                argvs = [argv for argv in argvs if tuple(argv) not in self._programs]
+                if not argvs:
+                    continue
+
+                future = self._executor.submit(_run_programs, argvs)
+                for (i, argv) in enumerate(argvs):
+                    self._programs[tuple(argv)] = (future, i)
+
+    def get(self, probe, path):
+        """ Return the result of running probe on path. """
+        with self._lock:
+            future = self._results.get((probe, path))
+
+        if future is None:
+            return probe(path)
+
+        return future.result()
+
+    def run_program(self, argv):
+        """ Run a program and return its exit code and output.
+
+            This works like :func:`~.util.run_program_and_capture_output`,
+            but uses a prefetched run of the program if there is one.
+
+            :param argv: the program and its arguments
+            :type argv: list of str
+            :returns: the exit code and the output of the program
+            :rtype: tuple of (int, str)
+            :raises OSError: if the program could not be run
+        """
+        with self._lock:
+            prefetched = self._programs.pop(tuple(argv), None)
+
+        if prefetched is None:
+            return util.run_program_and_capture_output(argv)
+
+        (future, i) = prefetched
+        result = future.result()[i]
+        if isinstance(result, OSError):
+            raise result
+
+        return result
+
+    def drop_cache(self):
+        """ Discard prefetched results and stop the worker threads. """
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+            self._results = {}
+            self._programs = {}
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+probe_data = ProbeData()
@@ -1,29 +1,135 @@
-import inspect
+from collections import defaultdict
 import logging
 import sys
+import threading
+import time
 import traceback
 
+from .flags import flags
+
 log = logging.getLogger("blivet")
 log.addHandler(logging.NullHandler())
 
+IGNORED_FUNCS = ["function_name_and_depth",
+                 "_caller_and_depth",
+                 "log_method_call",
+                 "log_method_return"]
 
-def function_name_and_depth():
-    IGNORED_FUNCS = ["function_name_and_depth",
-                     "log_method_call",
-                     "log_method_return"]
-    stack = inspect.stack()
 
-    for i, frame in enumerate(stack):
-        methodname = frame[3]
-        if methodname not in IGNORED_FUNCS:
-            return (methodname, len(stack) - i)
+class MethodStats(object):
+    """ Calls to traced methods, by class and method name.
+
+        Every :func:`log_method_call` counts as a call. The time spent in a
+        method is only known for methods that also report their return value
+        through :func:`log_method_return`.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self.methods = defaultdict(lambda: {"calls": 0, "timed_calls": 0, "time": 0.0})
+
+    def _pending(self):
+        # (frame, depth, start time) of the methods called in this thread
+        # that might still return
+        if not hasattr(self._local, "pending"):
+            self._local.pending = []
+
+        return self._local.pending
+
+    def called(self, name, frame, depth):
+        self.methods[name]["calls"] += 1
+        pending = self._pending()
+        while pending and pending[-1][1] >= depth:
+            pending.pop()
+
+        pending.append((frame, depth, time.time()))
+
+    def returned(self, name, frame, depth):
+        pending = self._pending()
+        while pending and pending[-1][1] > depth:
+            pending.pop()
 
-    return ("unknown function?", 0)
+        if pending and pending[-1][0] is frame:
+            (_frame, _depth, start) = pending.pop()
+            method = self.methods[name]
+            method["timed_calls"] += 1
+            method["time"] += time.time() - start
+
+    def report(self):
+        """ Return the recorded information.
+
+            :rtype: dict of "calls", "timed_calls" and "time" by method name,
+                    suitable for JSON serialization
+        """
+        return dict((k, dict(v)) for (k, v) in self.methods.items())
+
+_method_stats = None
+
+
+def start_method_stats():
+    """ Start counting traced method calls.
+
+        :returns: the statistics that will be recorded
+        :rtype: :class:`MethodStats`
+    """
+    global _method_stats
+    _method_stats = MethodStats()
+    return _method_stats
+
+
+def stop_method_stats():
+    """ Stop counting traced method calls.
+
+        :returns: the statistics recorded since :func:`start_method_stats`
+        :rtype: :class:`MethodStats` or NoneType
+    """
+    global _method_stats
+    stats = _method_stats
+    _method_stats = None
+    return stats
+
+
+def _caller_and_depth():
+    """ Return the frame of the traced function and its depth in the stack. """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_name in IGNORED_FUNCS:
+        frame = frame.f_back
+
+    depth = 0
+    caller = frame
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+
+    return (caller, depth)
+
+
+def function_name_and_depth():
+    (caller, depth) = _caller_and_depth()
+    if caller is None:
+        return ("unknown function?", 0)
+
+    return (caller.f_code.co_name, depth)
 
 
 def log_method_call(d, *args, **kwargs):
+    if not flags.trace_method_calls:
+        return
+
+    stats = _method_stats
+    debug = log.isEnabledFor(logging.DEBUG)
+    if not debug and stats is None:
+        return
+
     classname = d.__class__.__name__
-    (methodname, depth) = function_name_and_depth()
+    (caller, depth) = _caller_and_depth()
+    methodname = caller.f_code.co_name if caller else "unknown function?"
+    if stats is not None:
+        stats.called("%s.%s" % (classname, methodname), caller, depth)
+
+    if not debug:
+        return
+
     spaces = depth * ' '
     fmt = "%s%s.%s:"
     fmt_args = [spaces, classname, methodname]
@@ -42,8 +148,23 @@ def log_method_call(d, *args, **kwargs):
 
 
 def log_method_return(d, retval):
+    if not flags.trace_method_calls:
+        return
+
+    stats = _method_stats
+    debug = log.isEnabledFor(logging.DEBUG)
+    if not debug and stats is None:
+        return
+
     classname = d.__class__.__name__
-    (methodname, depth) = function_name_and_depth()
+    (caller, depth) = _caller_and_depth()
+    methodname = caller.f_code.co_name if caller else "unknown function?"
+    if stats is not None:
+        stats.returned("%s.%s" % (classname, methodname), caller, depth)
+
+    if not debug:
+        return
+
     spaces = depth * ' '
     fmt = "%s%s.%s returned %s"
     fmt_args = (spaces, classname, methodname, retval)
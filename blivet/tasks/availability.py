@@ -20,15 +20,15 @@
 # Red Hat Author(s): Anne Mulhern <amulhern@redhat.com>
 
 import abc
+from concurrent.futures import ThreadPoolExecutor
 from distutils.version import LooseVersion
-import hawkey
+import json
+import os
+import weakref
 
 from six import add_metaclass
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import load_plugins
 
 from .. import util
 from ..errors import AvailabilityError
@@ -38,6 +38,12 @@ log = logging.getLogger("blivet")
 
 CACHE_AVAILABILITY = True
 
+# all external resources, for checking them in one pass
+_resources = weakref.WeakSet()
+
+# directories whose contents change with the installed packages
+RPMDB_DIRS = ["/var/lib/rpm", "/usr/lib/sysimage/rpm"]
+
 
 class ExternalResource(object):
 
@@ -53,6 +59,7 @@ class ExternalResource(object):
         self._method = method
         self.name = name
         self._availability_errors = None
+        _resources.add(self)
 
     def __str__(self):
         return self.name
@@ -95,25 +102,46 @@ class Method(object):
         """
         raise NotImplementedError()
 
+    def cache_key(self, resource):
+        """ Returns the key for a resource in a persistent cache.
+
+            :param resource: any external resource
+            :type resource: :class:`ExternalResource`
+
+            :returns: the key, or None if the result is not worth saving
+            :rtype: str or NoneType
+        """
+        return None
+
 
 class Path(Method):
 
     """ Methods for when application is found in  PATH. """
 
-    def availability_errors(self, resource):
+    def availability_errors(self, resource, programs=None):
         """ Returns [] if the name of the application is in the path.
 
             :param resource: any application
             :type resource: :class:`ExternalResource`
+            :param programs: the names of all programs in $PATH, if known
+            :type programs: set of str or NoneType
 
             :returns: [] if the name of the application is in the path
             :rtype: list of str
         """
-        if not util.find_program_in_path(resource.name):
+        if programs is not None:
+            found = resource.name in programs
+        else:
+            found = util.find_program_in_path(resource.name)
+
+        if not found:
             return ["application %s is not in $PATH" % resource.name]
         else:
             return []
 
+    def cache_key(self, resource):
+        return "path:%s" % resource.name
+
 Path = Path()
 
 
@@ -143,7 +171,7 @@ class PackageMethod(Method):
             :param :class:`PackageInfo` package:
         """
         self.package = package
-        self._availability_errors = None
+        self._version_errors = None
 
     @property
     def package_version(self):
@@ -153,6 +181,9 @@ class PackageMethod(Method):
             :rtype: LooseVersion
             :raises AvailabilityError: on failure to obtain package version
         """
+        # loading hawkey takes a while and it is rarely needed
+        import hawkey
+
         sack = hawkey.Sack()
 
         try:
@@ -170,40 +201,57 @@ class PackageMethod(Method):
 
         return LooseVersion(packages[0].version)
 
-    def availability_errors(self, resource):
-        if self._availability_errors is not None and CACHE_AVAILABILITY:
-            return self._availability_errors[:]
+    def version_errors(self):
+        """ Returns [] if the installed package is recent enough.
 
-        self._availability_errors = Path.availability_errors(resource)
+            :rtype: list of str
+        """
+        if self._version_errors is not None and CACHE_AVAILABILITY:
+            return self._version_errors[:]
 
-        if self.package.required_version is None:
-            return self._availability_errors[:]
+        errors = []
+        if self.package.required_version is not None:
+            try:
+                package_version = self.package_version
+                if package_version < self.package.required_version:
+                    errors.append("installed version %s for package %s is less than required version %s" % (package_version, self.package.package_name, self.package.required_version))
+            except AvailabilityError as e:
+                # In contexts like the installer, a package may not be available,
+                # but the version of the tools is likely to be correct.
+                log.warning(str(e))
 
-        try:
-            if self.package_version < self.package.required_version:
-                self._availability_errors.append("installed version %s for package %s is less than required version %s" % (self.package_version, self.package.package_name, self.package.required_version))
-        except AvailabilityError as e:
-            # In contexts like the installer, a package may not be available,
-            # but the version of the tools is likely to be correct.
-            log.warning(str(e))
+        self._version_errors = errors
+        return errors[:]
 
-        return self._availability_errors[:]
+    def availability_errors(self, resource, programs=None):
+        errors = Path.availability_errors(resource, programs=programs)
+        return errors + self.version_errors()
+
+    def cache_key(self, resource):
+        return "package:%s:%s" % (self.package, resource.name)
 
 
 class BlockDevMethod(Method):
 
     """ Methods for when application is actually a libblockdev plugin. """
 
-    def availability_errors(self, resource):
+    def availability_errors(self, resource, plugins=None):
         """ Returns [] if the plugin is loaded.
 
             :param resource: a libblockdev plugin
             :type resource: :class:`ExternalResource`
+            :param plugins: the names of the loaded plugins, if known
+            :type plugins: set of str or NoneType
 
             :returns: [] if the name of the plugin is loaded
             :rtype: list of str
+
+            The plugin is loaded first if that has not been tried yet.
         """
-        if resource.name in blockdev.get_available_plugin_names():
+        if plugins is None:
+            plugins = load_plugins([resource.name])
+
+        if resource.name in plugins:
             return []
         else:
             return ["libblockdev plugin %s not loaded" % resource.name]
@@ -264,6 +312,167 @@ def available_resource(name):
     """ Construct an external resource that is always available. """
     return ExternalResource(AvailableMethod, name)
 
+
+def _find_programs(names):
+    """ Return the names that are programs in $PATH.
+
+        This lists each directory in $PATH once instead of looking for each
+        program in each directory.
+    """
+    names = set(names)
+    found = set()
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+
+        for entry in entries:
+            if entry.name in names and entry.name not in found and \
+               os.access(entry.path, os.X_OK):
+                found.add(entry.name)
+
+    return found
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _fingerprint():
+    """ Return a summary of whatever the saved results depend on.
+
+        Installing or removing a program changes the modification time of
+        its directory, and installing a package changes the rpm database.
+    """
+    path = os.environ.get("PATH", "")
+    rpmdb = []
+    for directory in RPMDB_DIRS:
+        try:
+            rpmdb.append(max((_mtime(e.path) or 0 for e in os.scandir(directory)), default=0))
+        except OSError:
+            rpmdb.append(None)
+
+    return {"path": path,
+            "mtimes": [_mtime(d) for d in path.split(os.pathsep)],
+            "rpmdb": rpmdb}
+
+
+def load_cache(filename):
+    """ Use saved availability results, if they are still valid.
+
+        :param str filename: the file the results were saved to
+        :returns: whether the saved results were used
+        :rtype: bool
+    """
+    if not CACHE_AVAILABILITY:
+        return False
+
+    try:
+        with open(filename) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        log.debug("failed to read availability cache %s: %s", filename, e)
+        return False
+
+    if data.get("fingerprint") != _fingerprint():
+        log.debug("availability cache %s is out of date", filename)
+        return False
+
+    results = data.get("resources", {})
+    for resource in list(_resources):
+        key = resource._method.cache_key(resource)
+        if resource._availability_errors is None and key in results:
+            resource._availability_errors = list(results[key])
+
+    return True
+
+
+def save_cache(filename):
+    """ Save the availability results that are worth keeping.
+
+        :param str filename: the file to save the results to
+    """
+    results = {}
+    for resource in list(_resources):
+        key = resource._method.cache_key(resource)
+        if key is not None and resource._availability_errors is not None:
+            results[key] = resource._availability_errors
+
+    data = {"fingerprint": _fingerprint(), "resources": results}
+    try:
+        with open(filename + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(filename + ".tmp", filename)
+    except OSError as e:
+        log.warning("failed to save availability cache %s: %s", filename, e)
+
+
+def resolve(resources=None, programs=None):
+    """ Check the availability of resources that have not been checked yet.
+
+        :param resources: the resources to check, by default all of them
+        :type resources: list of :class:`ExternalResource` or NoneType
+        :param programs: the names of the programs in $PATH, if known
+        :type programs: set of str or NoneType
+
+        $PATH and the libblockdev plugins are only looked at once for all
+        of the resources.
+    """
+    if resources is None:
+        resources = list(_resources)
+
+    resources = [r for r in resources if r._availability_errors is None or not CACHE_AVAILABILITY]
+    if programs is None:
+        programs = _find_programs(r.name for r in resources)
+
+    plugins = load_plugins([r.name for r in resources if r._method is BlockDevMethod])
+    for resource in resources:
+        method = resource._method
+        if method is Path or isinstance(method, PackageMethod):
+            errors = method.availability_errors(resource, programs=programs)
+        elif method is BlockDevMethod:
+            errors = method.availability_errors(resource, plugins=plugins)
+        else:
+            errors = method.availability_errors(resource)
+
+        resource._availability_errors = errors
+
+
+def prefetch(resources=None, cache_file=None):
+    """ Check the availability of resources ahead of time.
+
+        :param resources: the resources to check, by default all of them
+        :type resources: list of :class:`ExternalResource` or NoneType
+        :keyword str cache_file: file to load results from and save them to
+
+        The search of $PATH and the package version queries run
+        concurrently.
+    """
+    if cache_file is not None:
+        load_cache(cache_file)
+
+    if resources is None:
+        resources = list(_resources)
+
+    resources = [r for r in resources if r._availability_errors is None or not CACHE_AVAILABILITY]
+    packages = set(r._method for r in resources if isinstance(r._method, PackageMethod))
+    with ThreadPoolExecutor(max_workers=len(packages) + 1) as executor:
+        programs = executor.submit(_find_programs, [r.name for r in resources])
+        versions = [executor.submit(package.version_errors) for package in packages]
+
+        programs = programs.result()
+        for version in versions:
+            version.result()
+
+    resolve(resources, programs=programs)
+
+    if cache_file is not None:
+        save_cache(cache_file)
+
 # blockdev plugins
 BLOCKDEV_BTRFS_PLUGIN = blockdev_plugin("btrfs")
 BLOCKDEV_CRYPTO_PLUGIN = blockdev_plugin("crypto")
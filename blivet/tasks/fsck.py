@@ -24,7 +24,7 @@ import abc
 from six import add_metaclass
 
 from ..errors import FSError
-from .. import util
+from ..static_data import probe_data
 
 from . import availability
 from . import fstask
@@ -77,7 +77,7 @@ class FSCK(task.BasicApplication, fstask.FSTask):
             raise FSError("\n".join(error_msgs))
 
         try:
-            rc = util.run_program(self._fsck_command)
+            (rc, _out) = probe_data.run_program(self._fsck_command)
         except OSError as e:
             raise FSError("filesystem check failed: %s" % e)
 
@@ -24,7 +24,7 @@ import abc
 from six import add_metaclass
 
 from ..errors import FSError
-from .. import util
+from ..static_data import probe_data
 
 from . import availability
 from . import fstask
@@ -63,7 +63,7 @@ class FSInfo(task.BasicApplication, fstask.FSTask):
 
         error_msg = None
         try:
-            (rc, out) = util.run_program_and_capture_output(self._info_command)
+            (rc, out) = probe_data.run_program(self._info_command)
             if rc:
                 error_msg = "failed to gather fs info: %s" % rc
         except OSError as e:
@@ -24,7 +24,7 @@ import abc
 from six import add_metaclass
 
 from ..errors import FSError
-from .. import util
+from ..static_data import probe_data
 from ..size import Size
 
 from . import availability
@@ -52,7 +52,7 @@ class FSMinSize(task.BasicApplication, fstask.FSTask):
         """
         error_msg = None
         try:
-            (rc, out) = util.run_program_and_capture_output(self._resize_command())
+            (rc, out) = probe_data.run_program(self._resize_command())
             if rc:
                 error_msg = "failed to gather info from resize program: %d" % rc
         except OSError as e:
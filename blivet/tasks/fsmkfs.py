@@ -115,18 +115,35 @@ class FSMkfs(task.BasicApplication, FSMkfsTask):
            :param bool label: whether to label while creating, default is False
         """
         # pylint: disable=arguments-differ
+        self.prepare_task(options=options, label=label)()
+
+    def prepare_task(self, options=None, label=False):
+        """Return a callable running the mkfs command.
+
+           :param options: any special options, may be None
+           :type options: list of str or NoneType
+           :param bool label: whether to label while creating, default is False
+           :rtype: callable
+
+           The command is checked and built right away, the callable only
+           runs it and does not use the filesystem.
+        """
         error_msgs = self.availability_errors
         if error_msgs:
             raise FSError("\n".join(error_msgs))
 
-        options = options or []
-        try:
-            ret = util.run_program(self._mkfs_command(options, label))
-        except OSError as e:
-            raise FSError(e)
+        argv = self._mkfs_command(options or [], label)
+
+        def run_mkfs():
+            try:
+                ret = util.run_program(argv)
+            except OSError as e:
+                raise FSError(e)
+
+            if ret:
+                raise FSError("format failed: %s" % ret)
 
-        if ret:
-            raise FSError("format failed: %s" % ret)
+        return run_mkfs
 
 
 class BTRFSMkfs(FSMkfs):
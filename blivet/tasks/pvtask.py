@@ -20,13 +20,11 @@
 #
 # Red Hat Author(s): Vojtěch Trefný <vtrefny@redhat.com>
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from ..libblockdev import blockdev
 
 from ..errors import PhysicalVolumeError
 from ..size import Size
+from ..static_data import lvm_info
 
 from . import availability
 from . import task
@@ -55,7 +53,7 @@ class PVSize(task.BasicApplication):
         """
 
         try:
-            pv_info = blockdev.lvm.pvinfo(self.pv.device)
+            pv_info = lvm_info.pv_info(self.pv.device)
             pv_size = pv_info.pv_size
         except blockdev.LVMError as e:
             raise PhysicalVolumeError(e)
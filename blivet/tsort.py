@@ -20,40 +20,48 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+from collections import deque
+
 
 class CyclicGraphError(Exception):
     pass
 
 
 def tsort(graph):
+    """ Return the items of graph in topological order.
+
+        This is Kahn's algorithm using adjacency lists, so it runs in time
+        linear in the number of items and edges. Roots are taken from the
+        end of the queue, which keeps the order of the result the same as
+        it has always been for a given graph. The graph is not modified.
+    """
     order = []  # sorted list of items
 
     if not graph or not graph['items']:
         return order
 
+    incoming = dict(graph['incoming'])
+    children = dict((n, []) for n in graph['items'])
+    for (parent, child) in graph['edges']:
+        children[parent].append(child)
+
     # determine which nodes have no incoming edges
-    roots = [n for n in graph['items'] if graph['incoming'][n] == 0]
+    roots = deque(n for n in graph['items'] if incoming[n] == 0)
     if not roots:
         raise CyclicGraphError("no root nodes")
 
-    visited = []    # list of nodes visited, for cycle detection
     while roots:
         # remove a root, add it to the order
         root = roots.pop()
-        if root in visited:
-            raise CyclicGraphError("graph contains cycles")
-
-        visited.append(root)
         order.append(root)
         # remove each edge from the root to another node
-        for (parent, child) in [e for e in graph['edges'] if e[0] == root]:
-            graph['incoming'][child] -= 1
-            graph['edges'].remove((parent, child))
+        for child in children[root]:
+            incoming[child] -= 1
             # if destination node is now a root, add it to roots
-            if graph['incoming'][child] == 0:
+            if incoming[child] == 0:
                 roots.append(child)
 
-    if len(graph['items']) != len(visited):
+    if len(graph['items']) != len(order):
         raise CyclicGraphError("graph contains cycles")
 
     return order
@@ -51,16 +51,150 @@ def get_device(sysfs_path):
 
 def get_devices(subsystem="block"):
     if not flags.uevents:
-        settle()
+        settle(coalesce=True)
+    return _list_devices(subsystem=subsystem)
+
+
+def _list_devices(subsystem="block"):
     return [d for d in global_udev.list_devices(subsystem=subsystem)
             if not __is_blacklisted_blockdev(d.sys_name)]
 
 
-def settle(quiet=False):
+class DeviceSnapshot(object):
+
+    """ The block devices in the udev database, indexed for lookups.
+
+        Lookups by name return the first matching device in udev's order,
+        the same as a scan of :func:`get_devices` would. A symlink resolves
+        to the last device that has it.
+    """
+
+    def __init__(self, devices, generation=None):
+        """
+            :param devices: udev info for the block devices
+            :type devices: list of :class:`pyudev.Device`
+            :keyword int generation: value of the snapshot generation counter
+                                     when the device list was obtained
+        """
+        self.devices = devices
+        self.generation = generation
+        self.names = {}
+        self.labels = {}
+        self.uuids = {}
+        self.symlinks = {}
+        for dev in devices:
+            self.names.setdefault(device_get_name(dev), dev)
+            self.names.setdefault(dev.sys_name, dev)
+            self.labels.setdefault(device_get_label(dev), dev)
+            self.uuids.setdefault(device_get_uuid(dev), dev)
+            for link in device_get_symlinks(dev):
+                self.symlinks[link] = dev
+
+    def resolve(self, devspec, devname):
+        """ Return udev info for the device devspec refers to, or None.
+
+            :param str devspec: LABEL=, UUID=, device name, path or symlink
+            :param str devname: device name devspec's path corresponds to
+        """
+        if devspec.startswith("LABEL="):
+            return self.labels.get(devspec[6:])
+        elif devspec.startswith("UUID="):
+            return self.uuids.get(devspec[5:])
+
+        dev = self.names.get(devname)
+        if dev is None:
+            spec = devspec
+            if not spec.startswith("/dev/"):
+                spec = os.path.normpath("/dev/" + spec)
+
+            dev = self.symlinks.get(spec)
+
+        return dev
+
+
+_snapshot = None
+_snapshot_generation = 0
+
+
+def invalidate_device_snapshot():
+    """ Discard the cached snapshot of the udev database.
+
+        This happens whenever :func:`settle` runs udevadm and, while uevents
+        are being handled, on every uevent. Call it explicitly after changing
+        the system in some other way that udev will reflect.
+    """
+    global _snapshot_generation
+    _snapshot_generation += 1
+
+
+def get_device_snapshot():
+    """ Return an indexed snapshot of the block devices known to udev.
+
+        :rtype: :class:`DeviceSnapshot`
+
+        The snapshot is reused until :func:`invalidate_device_snapshot` is
+        called.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot.generation != _snapshot_generation:
+        if not flags.uevents:
+            settle(coalesce=True)
+
+        generation = _snapshot_generation
+        snapshot = DeviceSnapshot(_list_devices(), generation=generation)
+        _snapshot = snapshot
+
+    return snapshot
+
+
+class SettleStats(object):
+
+    """ Counts of the :func:`settle` calls that ran and did not run udevadm. """
+
+    def __init__(self):
+        self.executed = 0
+        self.skipped = 0
+        self.seqnum = None
+        """ kernel uevent sequence number as of the last udevadm settle """
+
+    def __repr__(self):
+        return "<SettleStats executed=%d skipped=%d>" % (self.executed, self.skipped)
+
+settle_stats = SettleStats()
+
+_UEVENT_SEQNUM = "/sys/kernel/uevent_seqnum"
+_UDEV_QUEUE = "/run/udev/queue"
+
+
+def _get_uevent_seqnum():
+    """ Return the sequence number of the last uevent the kernel sent. """
+    try:
+        with open(_UEVENT_SEQNUM) as f:
+            return int(f.read().strip())
+    except (IOError, ValueError):
+        return None
+
+
+def settle(quiet=False, coalesce=False):
     """ Wait for the udev queue to settle.
 
         :keyword bool quiet: bypass :meth:`blivet.util.run_program`
+        :keyword bool coalesce: skip udevadm if nothing changed since it last ran
+
+        With coalesce, udevadm is not run if the kernel has not sent any
+        uevents since the last time it was run and udev's event queue is
+        empty. This is only meant for looking devices up: after changing a
+        device, udev synthesizes change events from inotify that may not
+        have been sent yet, so udevadm has to wait for them.
     """
+    seqnum = _get_uevent_seqnum()
+    if coalesce and seqnum is not None and seqnum == settle_stats.seqnum and \
+       not os.path.exists(_UDEV_QUEUE):
+        settle_stats.skipped += 1
+        return
+
+    invalidate_device_snapshot()
     # wait maximal 300 seconds for udev to be done running blkid, lvm,
     # mdadm etc. This large timeout is needed when running on machines with
     # lots of disks, or with slow disks
@@ -70,6 +204,9 @@ def settle(quiet=False):
     else:
         util.run_program(argv)
 
+    settle_stats.executed += 1
+    settle_stats.seqnum = seqnum
+
 
 def trigger(subsystem=None, action="add", name=None):
     argv = ["trigger", "--action=%s" % action]
@@ -91,29 +228,7 @@ def resolve_devspec(devspec, sysname=False):
 
     devname = devices.device_path_to_name(devspec)
 
-    ret = None
-    for dev in get_devices():
-        if devspec.startswith("LABEL="):
-            if device_get_label(dev) == devspec[6:]:
-                ret = dev
-                break
-        elif devspec.startswith("UUID="):
-            if device_get_uuid(dev) == devspec[5:]:
-                ret = dev
-                break
-        elif device_get_name(dev) == devname or dev.sys_name == devname:
-            ret = dev
-            break
-        else:
-            spec = devspec
-            if not spec.startswith("/dev/"):
-                spec = os.path.normpath("/dev/" + spec)
-
-            for link in device_get_symlinks(dev):
-                if spec == link:
-                    ret = dev
-                    break
-
+    ret = get_device_snapshot().resolve(devspec, devname)
     if ret:
         return ret.sys_name if sysname else device_get_name(ret)
 
@@ -132,7 +247,7 @@ def resolve_glob(glob):
     if not glob:
         return ret
 
-    for dev in get_devices():
+    for dev in get_device_snapshot().devices:
         name = device_get_name(dev)
 
         if fnmatch.fnmatch(name, glob):
@@ -8,6 +8,7 @@ import subprocess
 import re
 import sys
 import tempfile
+import time
 import uuid
 import hashlib
 import warnings
@@ -20,10 +21,7 @@ from enum import Enum
 
 from .errors import DependencyError
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from .libblockdev import blockdev
 
 import six
 
@@ -158,10 +156,29 @@ class Path(str):
         return self._path.__hash__()
 
 
+_program_observers = []
+
+
+def add_program_observer(observer):
+    """ Register a callable to run after each external program finishes.
+
+        :param observer: callable taking the program's argv and the wall
+                         time it took in seconds
+    """
+    _program_observers.append(observer)
+
+
+def remove_program_observer(observer):
+    """ Unregister a callable added by :func:`add_program_observer`. """
+    _program_observers.remove(observer)
+
+
 def _run_program(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=False, binary_output=False):
     if env_prune is None:
         env_prune = []
 
+    start = time.time()
+
     def chroot():
         if root and root != '/':
             os.chroot(root)
@@ -169,44 +186,51 @@ def _run_program(argv, root='/', stdin=None, env_prune=None, stderr_to_stdout=Fa
     with program_log_lock:
         program_log.info("Running... %s", " ".join(argv))
 
-        env = os.environ.copy()
-        env.update({"LC_ALL": "C",
-                    "INSTALL_PATH": root})
-        for var in env_prune:
-            env.pop(var, None)
+    env = os.environ.copy()
+    env.update({"LC_ALL": "C",
+                "INSTALL_PATH": root})
+    for var in env_prune:
+        env.pop(var, None)
 
-        if stderr_to_stdout:
-            stderr_dir = subprocess.STDOUT
-        else:
-            stderr_dir = subprocess.PIPE
-        try:
-            proc = subprocess.Popen(argv,
-                                    stdin=stdin,
-                                    stdout=subprocess.PIPE,
-                                    stderr=stderr_dir,
-                                    close_fds=True,
-                                    preexec_fn=chroot, cwd=root, env=env)
-
-            out, err = proc.communicate()
-            if not binary_output and six.PY3:
-                out = out.decode("utf-8")
-            if out:
-                if not stderr_to_stdout:
-                    program_log.info("stdout:")
-                for line in out.splitlines():
-                    program_log.info("%s", line)
-
-            if not stderr_to_stdout and err:
-                program_log.info("stderr:")
-                for line in err.splitlines():
-                    program_log.info("%s", line)
-
-        except OSError as e:
+    if stderr_to_stdout:
+        stderr_dir = subprocess.STDOUT
+    else:
+        stderr_dir = subprocess.PIPE
+    try:
+        proc = subprocess.Popen(argv,
+                                stdin=stdin,
+                                stdout=subprocess.PIPE,
+                                stderr=stderr_dir,
+                                close_fds=True,
+                                preexec_fn=chroot, cwd=root, env=env)
+
+        # programs run by different threads may overlap, only their logs
+        # must not
+        out, err = proc.communicate()
+        if not binary_output and six.PY3:
+            out = out.decode("utf-8")
+    except OSError as e:
+        with program_log_lock:
             program_log.error("Error running %s: %s", argv[0], e.strerror)
-            raise
+        raise
+
+    with program_log_lock:
+        if out:
+            if not stderr_to_stdout:
+                program_log.info("stdout:")
+            for line in out.splitlines():
+                program_log.info("%s", line)
+
+        if not stderr_to_stdout and err:
+            program_log.info("stderr:")
+            for line in err.splitlines():
+                program_log.info("%s", line)
 
         program_log.debug("Return code: %d", proc.returncode)
 
+    for observer in _program_observers[:]:
+        observer(argv, time.time() - start)
+
     return (proc.returncode, out)
 
 
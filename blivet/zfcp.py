@@ -25,10 +25,7 @@ from . import util
 from .i18n import _
 from .util import stringize, unicodeize
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
+from .libblockdev import blockdev
 
 import logging
 log = logging.getLogger("blivet")
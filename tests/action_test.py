@@ -1,5 +1,7 @@
 
+import threading
 import unittest
+from unittest.mock import Mock, patch
 
 from tests.storagetestcase import StorageTestCase
 import blivet
@@ -12,6 +14,11 @@ from blivet.devices import PartitionDevice
 from blivet.devices import MDRaidArrayDevice
 from blivet.devices import LVMVolumeGroupDevice
 from blivet.devices import LVMLogicalVolumeDevice
+from blivet.devices import StorageDevice
+
+from blivet.actionlist import ActionList
+from blivet.errors import DiskLabelCommitError
+from blivet.threads import blivet_lock
 
 # action classes
 from blivet.deviceaction import ActionCreateDevice
@@ -1146,3 +1153,273 @@ class DeviceActionTestCase(StorageTestCase):
     def test_action_sorting(self, *args, **kwargs):
         """ Verify correct functioning of action sorting. """
         pass
+
+    def test_snapshot_destroy_sorting(self):
+        """ Verify that a snapshot is destroyed before its origin. """
+        lv_root = self.storage.devicetree.get_device_by_name("VolGroup-lv_root")
+        snap = self.new_device(device_class=LVMLogicalVolumeDevice, name="snap",
+                               parents=[lv_root.vg], origin=lv_root,
+                               size=Size("1 GiB"), exists=True)
+        self.storage.devicetree._add_device(snap)
+
+        self.storage.recursive_remove(lv_root)
+        actions = self.storage.devicetree.actions
+        destroy_snap = actions.find(device=snap, action_type="destroy", object_type="device")[0]
+        destroy_root = actions.find(device=lv_root, action_type="destroy", object_type="device")[0]
+
+        actions.sort()
+        self.assertIn(destroy_snap.id, actions._requirements[destroy_root.id])
+        sorted_actions = list(actions)
+        self.assertLess(sorted_actions.index(destroy_snap), sorted_actions.index(destroy_root))
+
+
+class ActionListTestCase(unittest.TestCase):
+
+    def test_find_and_prune(self):
+        """ Verify the indexed lookup and pruning of an action list. """
+        disk = StorageDevice("disk", size=Size("10 GiB"), exists=True)
+        dev1 = StorageDevice("dev1", size=Size("1 MiB"), parents=[disk])
+        dev2 = StorageDevice("dev2", size=Size("1 MiB"), parents=[disk])
+
+        actions = ActionList()
+        create_dev1 = ActionCreateDevice(dev1)
+        create_dev2 = ActionCreateDevice(dev2)
+        create_fmt1 = ActionCreateFormat(dev1, get_format("biosboot"))
+        create_fmt2 = ActionCreateFormat(dev1, get_format("biosboot"))
+        for action in (create_dev1, create_dev2, create_fmt1, create_fmt2):
+            actions.add(action)
+
+        self.assertEqual(actions.find(device=dev1),
+                         [create_dev1, create_fmt1, create_fmt2])
+        self.assertEqual(actions.find(devid=dev2.id), [create_dev2])
+        self.assertEqual(actions.find(action_type="create", object_type="device"),
+                         [create_dev1, create_dev2])
+        self.assertEqual(actions.find(device=dev1, object_type="format"),
+                         [create_fmt1, create_fmt2])
+        self.assertEqual(actions.find(path=dev2.path), [create_dev2])
+        self.assertEqual(actions.find(action_type="destroy"), [])
+
+        # the second format create obsoletes the first one
+        actions.prune()
+        self.assertEqual(list(actions), [create_dev1, create_dev2, create_fmt2])
+        self.assertEqual(actions.find(object_type="format"), [create_fmt2])
+
+        # destroying a device that does not exist obsoletes all of its actions
+        destroy_dev1 = ActionDestroyDevice(dev1)
+        actions.add(destroy_dev1)
+        actions.prune()
+        self.assertEqual(list(actions), [create_dev2])
+        self.assertEqual(actions.find(device=dev1), [])
+
+    def test_concurrent_process(self):
+        """ Verify that the programs of independent actions run concurrently. """
+        disk = StorageDevice("disk", size=Size("10 GiB"), exists=True)
+        dev1 = StorageDevice("dev1", size=Size("1 MiB"), parents=[disk])
+        dev2 = StorageDevice("dev2", size=Size("1 MiB"), parents=[disk])
+
+        actions = ActionList()
+        create_dev1 = ActionCreateDevice(dev1)
+        create_dev2 = ActionCreateDevice(dev2)
+        create_fmt1 = ActionCreateFormat(dev1, get_format("biosboot"))
+        create_fmt2 = ActionCreateFormat(dev2, get_format("biosboot"))
+        for action in (create_dev1, create_dev2, create_fmt1, create_fmt2):
+            actions.add(action)
+
+        # both formats are only created if their programs run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        caller = threading.current_thread()
+        executed = []
+        locked = []
+
+        def execute(action, callbacks=None):
+            self.assertIs(threading.current_thread(), caller)
+            executed.append(action)
+
+        def prepare(action, callbacks=None):
+            self.assertIs(threading.current_thread(), caller)
+
+            def program():
+                # the calling thread keeps the lock while the programs run
+                acquired = blivet_lock.acquire(blocking=False)
+                if acquired:
+                    blivet_lock.release()
+                locked.append(not acquired)
+                barrier.wait()
+
+            return program
+
+        completed = []
+        with patch.object(ActionCreateDevice, "execute", new=execute), \
+                patch.object(ActionCreateFormat, "prepare", new=prepare), \
+                patch.object(ActionCreateFormat, "finish", new=execute), \
+                patch("blivet.actionlist._callbacks.action_executed",
+                      side_effect=lambda action: completed.append(action)):
+            actions.process(devices=[disk, dev1, dev2], workers=2)
+
+        self.assertEqual(list(actions), [])
+        self.assertEqual(locked, [True, True])
+        self.assertEqual(set(executed), set([create_dev1, create_dev2, create_fmt1, create_fmt2]))
+        self.assertEqual(set(executed), set(completed))
+        self.assertLess(completed.index(create_dev1), completed.index(create_fmt1))
+        self.assertLess(completed.index(create_dev2), completed.index(create_fmt2))
+
+    def test_concurrent_process_error(self):
+        """ Verify that an error stops the execution once the running programs are done. """
+        dev1 = StorageDevice("dev1", size=Size("1 MiB"), exists=True)
+        dev2 = StorageDevice("dev2", size=Size("1 MiB"), exists=True)
+        dev3 = StorageDevice("dev3", size=Size("1 MiB"), exists=True)
+
+        actions = ActionList()
+        create_fmt1 = ActionCreateFormat(dev1, get_format("biosboot"))
+        create_fmt2 = ActionCreateFormat(dev2, get_format("biosboot"))
+        create_fmt3 = ActionCreateFormat(dev3, get_format("biosboot"))
+        for action in (create_fmt1, create_fmt2, create_fmt3):
+            actions.add(action)
+
+        failing = threading.Event()
+        prepared = []
+
+        def prepare(action, callbacks=None):
+            prepared.append(action)
+            if len(prepared) == 2:
+                failing.set()
+                raise RuntimeError("prepare failed")
+
+            # the program runs until the other action has failed
+            return lambda: failing.wait(5)
+
+        finished = []
+        with patch.object(ActionCreateFormat, "prepare", new=prepare), \
+                patch.object(ActionCreateFormat, "finish",
+                             new=lambda action, callbacks=None: finished.append(action)), \
+                patch("blivet.actionlist._callbacks.action_executed"):
+            with self.assertRaisesRegex(RuntimeError, "prepare failed"):
+                actions.process(devices=[dev1, dev2, dev3], workers=2)
+
+        # the running program was completed, nothing else was started
+        self.assertEqual(len(prepared), 2)
+        self.assertEqual(finished, prepared[:1])
+        self.assertEqual(set(actions), set([create_fmt1, create_fmt2, create_fmt3]) - set(finished))
+
+    def test_concurrent_process_disklabel(self):
+        """ Verify that actions changing the same disklabel are executed one at a time. """
+        (disk, partitions, actions) = self._partition_actions()
+        registered = list(actions)
+
+        running = []
+        overlapping = []
+        commit_errors = []
+
+        def execute(action, callbacks=None):
+            overlapping.append(bool(running))
+            if not commit_errors:
+                # the first disklabel commit fails once and is retried
+                commit_errors.append(action)
+                raise DiskLabelCommitError("commit failed")
+
+        def prepare(action, callbacks=None):
+            overlapping.append(bool(running))
+
+            def program():
+                running.append(action)
+                threading.Event().wait(0.05)
+                running.remove(action)
+
+            return program
+
+        completed = []
+        with patch.object(ActionCreateDevice, "execute", new=execute), \
+                patch.object(ActionCreateFormat, "prepare", new=prepare), \
+                patch.object(ActionCreateFormat, "finish"), \
+                patch("blivet.actionlist._callbacks.action_executed",
+                      side_effect=lambda action: completed.append(action)):
+            actions.process(devices=[disk] + partitions, workers=2)
+
+        self.assertEqual(list(actions), [])
+        self.assertEqual(len(overlapping), 5)
+        self.assertFalse(any(overlapping))
+        self.assertEqual(set(completed), set(registered))
+        self.assertEqual(len(completed), 4)
+        self.assertIn(commit_errors[0], completed)
+
+    def test_dry_run_plan(self):
+        """ Verify the execution plan returned by a dry run. """
+        disk = StorageDevice("disk", size=Size("10 GiB"), exists=True)
+        dev1 = StorageDevice("dev1", size=Size("1 GiB"), parents=[disk])
+        dev2 = StorageDevice("dev2", size=Size("1 MiB"), parents=[disk])
+
+        actions = ActionList()
+        create_dev1 = ActionCreateDevice(dev1)
+        create_dev2 = ActionCreateDevice(dev2)
+        create_fmt1 = ActionCreateFormat(dev1, get_format("ext4"))
+        create_fmt2 = ActionCreateFormat(dev2, get_format("biosboot"))
+        for action in (create_dev1, create_dev2, create_fmt1, create_fmt2):
+            actions.add(action)
+
+        plan = actions.process(devices=[disk, dev1, dev2], dry_run=True)
+        self.assertEqual(len(list(actions)), 4)
+
+        steps = dict((step.action, step) for step in plan.steps)
+        self.assertEqual(steps[create_fmt1].requires, set([create_dev1.id]))
+        self.assertEqual(steps[create_fmt1].commands[0][0], "mke2fs")
+        self.assertIn(dev1.path, steps[create_fmt1].commands[0])
+        self.assertGreater(steps[create_fmt1].bytes_written, Size("128 MiB"))
+        self.assertLess(steps[create_fmt1].bytes_written, dev1.size)
+
+        # the two devices are independent, the ext4 one takes longer
+        self.assertEqual(plan.critical_path, [create_dev1, create_fmt1])
+        self.assertEqual(plan.duration, steps[create_fmt1].finish)
+        self.assertEqual(plan.max_parallelism, 2)
+        self.assertGreater(plan.parallelism, 1)
+        self.assertEqual(plan.to_dict()["critical_path"], [create_dev1.id, create_fmt1.id])
+
+    def _partition_actions(self):
+        """ Return a disk, two new partitions on it and the actions creating them. """
+        disk = DiskDevice("sdc", size=Size("10 GiB"), exists=True,
+                          fmt=get_format("disklabel", exists=True))
+        disk.format._parted_device = Mock()
+        disk.format._parted_disk = Mock(partitions=[])
+        # the disklabel on the disk has none of the new partitions
+        disk.format._parted_disk.getPartitionByPath.return_value = None
+        disk.format._orig_parted_disk = disk.format._parted_disk
+
+        actions = ActionList()
+        partitions = []
+        for number in (1, 2):
+            partition = PartitionDevice("sdc%d" % number, parents=[disk], size=Size("1 GiB"))
+            partition.parents = [disk]
+            partition._parted_partition = Mock(number=number, path=partition.path, type=0)
+            partition._parted_partition.getLength.return_value = int(Size("1 GiB"))
+            partitions.append(partition)
+            actions.add(ActionCreateDevice(partition))
+            actions.add(ActionCreateFormat(partition, get_format("ext4")))
+
+        return (disk, partitions, actions)
+
+    def test_dry_run_then_process(self):
+        """ Verify that a dry run leaves the actions and devices ready for processing. """
+        (disk, partitions, actions) = self._partition_actions()
+        parted_partitions = [p.parted_partition for p in partitions]
+        registered = list(actions)
+        devices = [disk] + partitions
+        with patch.object(disk.format, "reset_parted_disk") as reset_parted_disk:
+            plan = actions.process(devices=devices, dry_run=True)
+            self.assertFalse(reset_parted_disk.called)
+
+        self.assertEqual(len(plan.steps), 4)
+        self.assertEqual(list(actions), registered)
+        self.assertEqual([p.parted_partition for p in partitions], parted_partitions)
+
+        executed = []
+
+        def execute(action, callbacks=None):
+            # creating a partition needs its parted partition
+            self.assertIsNotNone(action.device.parted_partition)
+            executed.append(action)
+
+        with patch.object(ActionCreateDevice, "execute", new=execute), \
+                patch.object(ActionCreateFormat, "execute", new=execute):
+            actions.process(devices=devices)
+
+        self.assertEqual(set(executed), set(registered))
+        self.assertEqual(list(actions), [])
@@ -1,15 +1,19 @@
 import random
-from unittest import TestCase
-from unittest.mock import Mock, patch
+import subprocess
+from unittest import TestCase, skipUnless
+from unittest.mock import MagicMock, Mock, patch
 
 import dbus
 
+from blivet import util
+
 from blivet.dbus.action import DBusAction
 from blivet.dbus.blivet import DBusBlivet
 from blivet.dbus.device import DBusDevice
 from blivet.dbus.format import DBusFormat
+from blivet.dbus.manager import ObjectManager
 from blivet.dbus.object import DBusObject
-from blivet.dbus.constants import ACTION_INTERFACE, BLIVET_INTERFACE, DEVICE_INTERFACE, FORMAT_INTERFACE
+from blivet.dbus.constants import ACTION_INTERFACE, BLIVET_INTERFACE, BUS_NAME, DEVICE_INTERFACE, FORMAT_INTERFACE
 from blivet.dbus.constants import ACTION_OBJECT_PATH_BASE
 from blivet.dbus.constants import DEVICE_OBJECT_PATH_BASE, DEVICE_REMOVED_OBJECT_PATH_BASE
 from blivet.dbus.constants import FORMAT_OBJECT_PATH_BASE, FORMAT_REMOVED_OBJECT_PATH_BASE
@@ -27,7 +31,7 @@ class DBusBlivetTestCase(TestCase):
     @patch.object(DBusObject, "_init_dbus_object")
     @patch("blivet.dbus.blivet.callbacks")
     def setUp(self, *args):  # pylint: disable=unused-argument
-        self.dbus_object = DBusBlivet(Mock(name="ObjectManager"))
+        self.dbus_object = DBusBlivet(MagicMock(name="ObjectManager"))
         self.dbus_object._blivet = Mock()
 
     def test_ListDevices(self):
@@ -98,6 +102,44 @@ class DBusBlivetTestCase(TestCase):
         self.dbus_object._blivet.factory_device.assert_called_once_with(device_type, size, **kwargs)
         self.dbus_object._blivet.reset_mock()
 
+    def test_device_path_changed(self):
+        """ Verify that only the objects referring to a device rebuild their properties. """
+        parent = Mock(name="parent", id=1)
+        child = Mock(name="child", id=3)
+        device = Mock(name="device", id=2, parents=[parent], children=[child], format=Mock(id=7))
+        other = Mock(name="other", id=4)
+        objects = dict((i, Mock(name="DBusObject %d" % i)) for i in (1, 2, 3, 4, 5, 6, 7))
+
+        action = Mock(name="action", id=5, device=device, format=device.format)
+        other_action = Mock(name="other action", id=6, device=other, format=other.format)
+        dbus_actions = [Mock(spec=DBusAction, _action=a) for a in (action, other_action)]
+
+        manager = self.dbus_object._manager
+        manager.get_object_by_id.side_effect = objects.get
+        manager.objects = dbus_actions
+        with patch.object(self.dbus_object, "invalidate_properties") as invalidate_properties:
+            self.dbus_object._device_added(device)
+
+        # the device list changed
+        invalidate_properties.assert_called_once_with()
+        manager.add_object.assert_called_with(objects[2])
+        for i in (1, 3, 5):
+            objects[i].invalidate_properties.assert_called_once_with()
+        for i in (4, 6):
+            self.assertFalse(objects[i].invalidate_properties.called)
+
+        # the format's device and actions refer to the format
+        for obj in objects.values():
+            obj.reset_mock()
+        with patch.object(self.dbus_object, "invalidate_properties") as invalidate_properties:
+            self.dbus_object._format_removed(device, device.format, keep=True)
+
+        self.assertFalse(invalidate_properties.called)
+        for i in (2, 5):
+            objects[i].invalidate_properties.assert_called_once_with()
+        for i in (1, 3, 4, 6):
+            self.assertFalse(objects[i].invalidate_properties.called)
+
 
 @patch.object(DBusObject, 'connection')
 class DBusObjectTestCase(TestCase):
@@ -111,6 +153,9 @@ class DBusObjectTestCase(TestCase):
         with self.assertRaises(NotImplementedError):
             _x = self.obj.properties
 
+        with self.assertRaises(NotImplementedError):
+            _x = self.obj._get_properties()
+
         with self.assertRaises(NotImplementedError):
             _x = self.obj.interface
 
@@ -142,6 +187,26 @@ class DBusDeviceTestCase(DBusObjectTestCase):
         self.obj.present = True
         self.assertEqual(self.obj.object_path, "%s/%d" % (DEVICE_OBJECT_PATH_BASE, self._device_id))
 
+    @patch('dbus.UInt64')
+    def test_properties_cached(self, *args):  # pylint: disable=unused-argument
+        props = self.obj.properties
+        self.obj._device.name = "newname"
+        self.assertIs(self.obj.properties, props)
+
+        # the properties are rebuilt when the device changes
+        self.obj.invalidate_properties()
+        self.assertEqual(self.obj.properties["Name"], "newname")
+
+    def test_setup_teardown(self, *args):  # pylint: disable=unused-argument
+        # the status of the device and its parents changes
+        self.obj.Setup()
+        self.obj._device.setup.assert_called_once_with()
+        self.assertEqual(self.obj._manager.invalidate_properties.call_count, 1)
+
+        self.obj.Teardown()
+        self.obj._device.teardown.assert_called_once_with()
+        self.assertEqual(self.obj._manager.invalidate_properties.call_count, 2)
+
 
 @patch.object(DBusObject, 'connection')
 @patch.object(DBusObject, 'add_to_connection')
@@ -164,6 +229,15 @@ class DBusFormatTestCase(DBusObjectTestCase):
         self.obj.present = True
         self.assertEqual(self.obj.object_path, "%s/%d" % (FORMAT_OBJECT_PATH_BASE, self._format_id))
 
+    def test_setup_teardown(self, *args):  # pylint: disable=unused-argument
+        self.obj.Setup({"mountpoint": "/mnt"})
+        self.obj._format.setup.assert_called_once_with(mountpoint="/mnt")
+        self.assertEqual(self.obj._manager.invalidate_properties.call_count, 1)
+
+        self.obj.Teardown()
+        self.obj._format.teardown.assert_called_once_with()
+        self.assertEqual(self.obj._manager.invalidate_properties.call_count, 2)
+
 
 @patch("blivet.dbus.blivet.callbacks")
 class DBusActionTestCase(DBusObjectTestCase):
@@ -177,3 +251,120 @@ class DBusActionTestCase(DBusObjectTestCase):
         self.assertTrue(isinstance(self.obj.properties, dict))
         self.assertEqual(self.obj.interface, ACTION_INTERFACE)
         self.assertEqual(self.obj.object_path, "%s/%d" % (ACTION_OBJECT_PATH_BASE, self._id))
+
+
+@patch.object(DBusObject, 'remove_from_connection')
+class ObjectManagerTestCase(TestCase):
+    @patch.object(dbus.service.Object, "__init__", return_value=None)
+    @patch("dbus.service.BusName")
+    def setUp(self, *args):  # pylint: disable=unused-argument
+        self.manager = ObjectManager(bus=Mock(name="Bus"))
+        self.signals = []
+        for signal in ("InterfacesAdded", "InterfacesRemoved"):
+            patcher = patch.object(self.manager, signal,
+                                   side_effect=lambda *args, signal=signal: self.signals.append((signal,) + args))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch.object(DBusObject, "_init_dbus_object")
+    def _new_object(self, obj_id, *args):  # pylint: disable=unused-argument
+        obj = DBusFormat(Mock(name="DeviceFormat", id=obj_id), self.manager)
+        obj._get_properties = Mock(return_value={"ID": obj_id})
+        return obj
+
+    def test_add_remove(self, *args):  # pylint: disable=unused-argument
+        objs = [self._new_object(i) for i in range(3)]
+        for obj in objs:
+            self.manager.add_object(obj)
+
+        self.assertEqual(len(self.signals), 3)
+        self.assertEqual(self.manager.objects, objs)
+
+        self.manager.remove_object(objs[1])
+        self.assertEqual(self.manager.objects, [objs[0], objs[2]])
+        self.assertIsNone(self.manager.get_object_by_id(1))
+        self.assertIsNone(self.manager.get_object_by_path(objs[1].object_path))
+        self.assertEqual(self.signals[-1], ("InterfacesRemoved", objs[1].object_path, [FORMAT_INTERFACE]))
+
+        objs[0]._get_properties.reset_mock()
+        managed = self.manager.GetManagedObjects()
+        self.assertEqual(managed, {objs[0].object_path: {FORMAT_INTERFACE: {"ID": 0}},
+                                   objs[2].object_path: {FORMAT_INTERFACE: {"ID": 2}}})
+
+        # the properties built for the signals are reused, even when other
+        # objects are added or removed
+        self.manager.add_object(self._new_object(3))
+        self.manager.remove_object(objs[2])
+        self.manager.GetManagedObjects()
+        self.assertEqual(objs[0]._get_properties.call_count, 0)
+
+        self.manager.invalidate_properties()
+        self.manager.GetManagedObjects()
+        self.manager.GetManagedObjects()
+        self.assertEqual(objs[0]._get_properties.call_count, 1)
+
+    def test_batch(self, *args):  # pylint: disable=unused-argument
+        (kept, removed, replaced) = [self._new_object(i) for i in range(3)]
+        for obj in (kept, removed, replaced):
+            self.manager.add_object(obj)
+
+        self.signals = []
+        with self.manager.batch():
+            # a new object that is removed again is not signalled at all
+            transient = self._new_object(3)
+            self.manager.add_object(transient)
+            self.manager.remove_object(transient)
+
+            self.manager.remove_object(removed)
+
+            # neither is a removed object that comes back under another path
+            self.manager.remove_object(replaced)
+            replaced.present = False
+            self.manager.add_object(replaced)
+            self.manager.remove_object(replaced)
+            replaced.present = True
+            self.manager.add_object(replaced)
+
+            with self.manager.batch():
+                added = self._new_object(4)
+                self.manager.add_object(added)
+
+            self.assertEqual(self.signals, [])
+
+        self.assertEqual(self.signals,
+                         [("InterfacesRemoved", removed.object_path, [FORMAT_INTERFACE]),
+                          ("InterfacesRemoved", replaced.object_path, [FORMAT_INTERFACE]),
+                          ("InterfacesAdded", replaced.object_path, {FORMAT_INTERFACE: {"ID": 2}}),
+                          ("InterfacesAdded", added.object_path, {FORMAT_INTERFACE: {"ID": 4}})])
+        self.assertEqual(self.manager.objects, [kept, replaced, added])
+        self.assertEqual(transient._get_properties.call_count, 0)
+        self.assertEqual(added._get_properties.call_count, 1)
+
+
+@skipUnless(hasattr(dbus, "bus") and util.find_program_in_path("dbus-daemon"),
+            "dbus-python's bus connections or dbus-daemon are not available")
+class ObjectManagerBusTestCase(TestCase):
+    def setUp(self):
+        # a private bus, so the test needs neither the system bus nor root
+        daemon = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address"],
+                                  stdout=subprocess.PIPE, universal_newlines=True)
+        self.addCleanup(daemon.wait)
+        self.addCleanup(daemon.terminate)
+        self.addCleanup(daemon.stdout.close)
+        self.bus = dbus.bus.BusConnection(daemon.stdout.readline().strip())
+        self.addCleanup(self.bus.close)
+
+    @patch("dbus.SystemBus", side_effect=AssertionError("the system bus was used"))
+    def test_bus(self, *args):  # pylint: disable=unused-argument
+        manager = ObjectManager(bus=self.bus)
+        self.assertIs(manager.bus, self.bus)
+        self.assertTrue(self.bus.name_has_owner(BUS_NAME))
+
+        obj = DBusFormat(Mock(name="DeviceFormat", id=1), manager)
+        obj._get_properties = Mock(return_value={"ID": 1})
+        manager.add_object(obj)
+        self.assertIs(obj.connection, self.bus)
+        self.assertEqual(manager.get_object_by_path(obj.object_path), obj)
+
+        manager.remove_object(obj)
+        self.assertIsNone(manager.get_object_by_path(obj.object_path))
@@ -304,6 +304,54 @@ class LVMDeviceTest(unittest.TestCase):
         self.assertEqual(pv.format.free, Size("264 MiB"))
         self.assertEqual(pv2.format.free, Size("256 MiB"))
 
+    def test_vg_space_cached(self):
+        pv = StorageDevice("pv1", fmt=blivet.formats.get_format("lvmpv"),
+                           size=Size("1025 MiB"))
+        pv2 = StorageDevice("pv2", fmt=blivet.formats.get_format("lvmpv"),
+                            size=Size("513 MiB"))
+        vg = LVMVolumeGroupDevice("testvg", parents=[pv, pv2])
+        lv = LVMLogicalVolumeDevice("testlv", parents=[vg], size=Size("512 MiB"),
+                                    fmt=blivet.formats.get_format("xfs"),
+                                    exists=False)
+        self.assertEqual(vg.size, Size("1536 MiB"))
+        self.assertEqual(vg.free_space, Size("1024 MiB"))
+
+        # repeated queries do not recompute anything
+        lv_space = vg._lv_space
+        pv_space = vg._pv_space
+        self.assertEqual(vg.free_space, Size("1024 MiB"))
+        self.assertEqual(vg.size, Size("1536 MiB"))
+        self.assertIs(vg._lv_space, lv_space)
+        self.assertIs(vg._pv_space, pv_space)
+
+        # resizing an LV or a PV is noticed
+        lv.size = Size("256 MiB")
+        self.assertEqual(vg.free_space, Size("1280 MiB"))
+        pv2.size = Size("1025 MiB")
+        self.assertEqual(vg.size, Size("2048 MiB"))
+        self.assertEqual(vg.free_space, Size("1792 MiB"))
+
+        # and so is adding and removing LVs
+        lv2 = LVMLogicalVolumeDevice("testlv2", parents=[vg], size=Size("512 MiB"),
+                                     fmt=blivet.formats.get_format("xfs"),
+                                     exists=False)
+        self.assertEqual(vg.free_space, Size("1280 MiB"))
+        vg._remove_log_vol(lv2)
+        self.assertEqual(vg.free_space, Size("1792 MiB"))
+
+        # changes of LVs in other VGs are not
+        pv3 = StorageDevice("pv3", fmt=blivet.formats.get_format("lvmpv"),
+                            size=Size("1025 MiB"))
+        vg2 = LVMVolumeGroupDevice("testvg2", parents=[pv3])
+        lv3 = LVMLogicalVolumeDevice("testlv3", parents=[vg2], size=Size("512 MiB"),
+                                     fmt=blivet.formats.get_format("xfs"),
+                                     exists=False)
+        lv_space = vg._lv_space
+        lv3.size = Size("256 MiB")
+        lv3.name = "testlv4"
+        self.assertEqual(vg2.free_space, Size("768 MiB"))
+        self.assertIs(vg._lv_space, lv_space)
+
     def test_target_size(self):
         pv = StorageDevice("pv1", fmt=blivet.formats.get_format("lvmpv"),
                            size=Size("1 GiB"))
@@ -1,4 +1,6 @@
+import copy
 import unittest
+from unittest.mock import patch
 
 from tests.imagebackedtestcase import ImageBackedTestCase
 
@@ -7,6 +9,7 @@ from blivet import devicelibs
 from blivet import devicefactory
 from blivet import util
 from blivet.udev import trigger
+from blivet.deviceaction import ActionCreateDevice, ActionCreateFormat
 from blivet.devices import StorageDevice
 from blivet.devices.lvm import LVMLogicalVolumeDevice
 from blivet.devicetree import DeviceTree
@@ -55,6 +58,304 @@ class DeviceTreeTestCase(unittest.TestCase):
 
         self.assertEqual(dt.resolve_device(dev3.name), dev3)
 
+    def test_device_lookup(self):
+        dt = DeviceTree()
+
+        fmt1 = get_format("ext4", label="dev1_label", uuid="1234-56-7890")
+        dev1 = StorageDevice("dev1", exists=True, fmt=fmt1, uuid="dev1-uuid")
+        dt._add_device(dev1)
+
+        dev2 = StorageDevice("dev2", exists=True, parents=[dev1])
+        dt._add_device(dev2)
+
+        self.assertEqual(dt.get_device_by_name("dev1"), dev1)
+        self.assertEqual(dt.get_device_by_name("dev3"), None)
+        self.assertEqual(dt.get_device_by_uuid("dev1-uuid"), dev1)
+        self.assertEqual(dt.get_device_by_uuid("1234-56-7890"), dev1)
+        self.assertEqual(dt.get_device_by_label("dev1_label"), dev1)
+        self.assertEqual(dt.get_device_by_path("/dev/dev2"), dev2)
+        self.assertEqual(dt.get_device_by_id(dev2.id), dev2)
+
+        # the indexes follow name and format changes
+        dev2.name = "dev3"
+        self.assertEqual(dt.get_device_by_name("dev2"), None)
+        self.assertEqual(dt.get_device_by_name("dev3"), dev2)
+        self.assertEqual(dt.get_device_by_path("/dev/dev3"), dev2)
+
+        dev2.format = get_format("xfs", label="dev2_label")
+        self.assertEqual(dt.get_device_by_label("dev2_label"), dev2)
+
+        # hidden devices are only found on request
+        dt.hide(dev2)
+        self.assertEqual(dt.get_device_by_name("dev3"), None)
+        self.assertEqual(dt.get_device_by_name("dev3", hidden=True), dev2)
+        self.assertEqual(dt.get_device_by_id(dev2.id), None)
+        self.assertEqual(dt.get_device_by_id(dev2.id, hidden=True), dev2)
+
+        dt.unhide(dev2)
+        self.assertEqual(dt.get_device_by_name("dev3"), dev2)
+
+        dt._remove_device(dev2)
+        self.assertEqual(dt.get_device_by_name("dev3"), None)
+        self.assertEqual(dt.get_device_by_label("dev2_label"), None)
+        self.assertEqual(dt.get_device_by_id(dev2.id), None)
+
+    def test_device_lookup_order(self):
+        dt = DeviceTree()
+
+        # a whole-disk md member and its array share a uuid
+        dev1 = StorageDevice("dev1", exists=True,
+                             fmt=get_format("mdmember", uuid="md-uuid"))
+        dt._add_device(dev1)
+        dev2 = StorageDevice("dev2", exists=True, parents=[dev1], uuid="md-uuid")
+        dt._add_device(dev2)
+
+        # the first device in the tree wins, just as with a linear search
+        self.assertEqual(dt.get_device_by_uuid("md-uuid"), dev1)
+
+        # lookup by path prefers the device added last
+        dev3 = StorageDevice("dev3", exists=True, parents=[dev2])
+        dt._add_device(dev3)
+        dev2.name = "dev4"
+        dev3.name = "dev4"
+        self.assertEqual(dt.get_device_by_path("/dev/dev4"), dev3)
+        self.assertEqual(dt.get_device_by_name("dev4"), dev2)
+
+    def test_device_lookup_created_format(self):
+        dt = DeviceTree()
+
+        dev1 = StorageDevice("dev1", size=Size("1 MiB"), exists=True)
+        dt._add_device(dev1)
+        fmt = get_format("biosboot", uuid="old-uuid")
+        action = ActionCreateFormat(dev1, fmt)
+        action.apply()
+        self.assertEqual(dt.get_device_by_uuid("old-uuid"), dev1)
+
+        def create(**kwargs):  # pylint: disable=unused-argument
+            # like LUKS, the format sets its new uuid itself
+            fmt.uuid = "new-uuid"
+
+        with patch.object(fmt, "create", side_effect=create), \
+                patch.object(dev1, "setup"), \
+                patch.object(dev1, "update_sysfs_path"), \
+                patch("blivet.deviceaction.udev") as udev:
+            udev.device_get_uuid.return_value = "new-uuid"
+            udev.device_get_symlinks.return_value = []
+            action.execute()
+
+        self.assertEqual(dt.get_device_by_uuid("new-uuid"), dev1)
+        self.assertEqual(dt.get_device_by_uuid("old-uuid"), None)
+
+    def test_device_lookup_unannounced_change(self):
+        dt = DeviceTree()
+
+        dev1 = StorageDevice("dev1", exists=True, fmt=get_format("ext4", uuid="old-uuid"))
+        dt._add_device(dev1)
+        dev2 = StorageDevice("dev2", exists=True)
+        dt._add_device(dev2)
+
+        # changes the tree is not told about are still found
+        dev1.format.uuid = "new-uuid"
+        dev2.format.uuid = "dev2-uuid"
+        self.assertEqual(dt.get_device_by_uuid("new-uuid"), dev1)
+        self.assertEqual(dt.get_device_by_uuid("old-uuid"), None)
+        self.assertEqual(dt.get_device_by_uuid("dev2-uuid"), dev2)
+
+        # and are indexed once they have been found
+        self.assertIn(dev1, dt._index["uuid"]["new-uuid"])
+        self.assertNotIn("old-uuid", dt._index["uuid"])
+
+    def test_devices(self):
+        dt = DeviceTree()
+
+        dev1 = StorageDevice("dev1", exists=True, uuid="dev1-uuid")
+        dt._add_device(dev1)
+
+        dev2 = StorageDevice("dev2", exists=True, uuid="dev1-uuid")
+        with self.assertRaisesRegex(ValueError, "already in tree"):
+            dt._add_device(dev2)
+
+        dev2 = StorageDevice("dev2", exists=True, uuid="dev2-uuid")
+        dt._add_device(dev2)
+        devices = dt.devices
+        self.assertEqual(devices, [dev1, dev2])
+
+        # the returned list belongs to the caller
+        devices.remove(dev1)
+        self.assertEqual(dt.devices, [dev1, dev2])
+
+        dt._remove_device(dev1)
+        self.assertEqual(dt.devices, [dev2])
+
+        # incomplete devices are excluded as soon as they become incomplete
+        dev3 = IncompleteDevice("dev3", exists=True)
+        dt._add_device(dev3)
+        self.assertEqual(dt.devices, [dev2, dev3])
+        dev3.complete = False
+        self.assertEqual(dt.devices, [dev2])
+        dev3.complete = True
+        self.assertEqual(dt.devices, [dev2, dev3])
+
+    def test_device_views(self):
+        dt = DeviceTree()
+
+        dev1 = StorageDevice("dev1", exists=True, size=Size("1 GiB"),
+                             fmt=get_format("swap"))
+        dt._add_device(dev1)
+        dev2 = StorageDevice("dev0", exists=True, size=Size("1 GiB"))
+        dt._add_device(dev2)
+
+        self.assertEqual(dt.get_devices_by_view("devices"), [dev2, dev1])
+        self.assertEqual(dt.get_devices_by_view("swaps"), [dev1])
+        self.assertEqual(dt.get_devices_by_view("pvs"), [])
+
+        # views follow format changes and renames
+        dev2.format = get_format("swap")
+        self.assertEqual(dt.get_devices_by_view("swaps"), [dev2, dev1])
+        dev2.name = "dev2"
+        self.assertEqual(dt.get_devices_by_view("swaps"), [dev1, dev2])
+        dev1.format = get_format("lvmpv")
+        self.assertEqual(dt.get_devices_by_view("swaps"), [dev2])
+        self.assertEqual(dt.get_devices_by_view("pvs"), [dev1])
+
+        dt.hide(dev1)
+        self.assertEqual(dt.get_devices_by_view("pvs"), [])
+        self.assertEqual(dt.get_devices_by_view("devices"), [dev2])
+
+        dt.unhide(dev1)
+        self.assertEqual(dt.get_devices_by_view("devices"), [dev1, dev2])
+
+        dt._remove_device(dev2)
+        self.assertEqual(dt.get_devices_by_view("swaps"), [])
+
+    def test_dependent_devices(self):
+        dt = DeviceTree()
+
+        disk1 = StorageDevice("disk1", exists=True)
+        dt._add_device(disk1)
+        disk2 = StorageDevice("disk2", exists=True)
+        dt._add_device(disk2)
+        dev1 = StorageDevice("dev1", exists=True, parents=[disk1])
+        dt._add_device(dev1)
+        dev2 = StorageDevice("dev2", exists=True, parents=[dev1, disk2])
+        dt._add_device(dev2)
+        dev3 = StorageDevice("dev3", exists=True, parents=[disk2])
+        dt._add_device(dev3)
+
+        self.assertEqual(dt.get_dependent_devices(disk1), [dev1, dev2])
+        self.assertEqual(dt.get_dependent_devices(disk2), [dev2, dev3])
+        self.assertEqual(dt.get_dependent_devices(dev2), [])
+        self.assertTrue(dev2.depends_on(disk1))
+        self.assertFalse(dev3.depends_on(disk1))
+
+        # cached ancestry follows parent changes
+        dev3.parents.append(dev1)
+        self.assertTrue(dev3.depends_on(disk1))
+        self.assertEqual(dt.get_dependent_devices(disk1), [dev1, dev2, dev3])
+        dev3.parents.remove(dev1)
+        self.assertFalse(dev3.depends_on(disk1))
+
+        # hidden devices are only included on request
+        dt.hide(dev2)
+        self.assertEqual(dt.get_dependent_devices(disk1), [dev1])
+        self.assertEqual(dt.get_dependent_devices(disk1, hidden=True), [dev1, dev2])
+
+    def test_dependent_devices_copy(self):
+        disk = StorageDevice("disk", exists=True)
+        dev = StorageDevice("dev", exists=True, parents=[disk])
+        self.assertTrue(dev.depends_on(disk))
+
+        # a copy keeps the ids of the devices but has ancestors of its own
+        dev_copy = copy.deepcopy(dev)
+        disk_copy = dev_copy.parents[0]
+        self.assertEqual(disk_copy.id, disk.id)
+        self.assertTrue(dev_copy.depends_on(disk_copy))
+        self.assertFalse(dev_copy.depends_on(disk))
+        self.assertFalse(dev.depends_on(disk_copy))
+        self.assertIs(dev_copy._ancestry[0].pop(), disk_copy)
+        self.assertEqual(disk_copy.dependents, [dev_copy])
+
+    def test_snapshot(self):
+        dt = DeviceTree()
+
+        disk = StorageDevice("disk", exists=True, size=Size("10 GiB"))
+        dt._add_device(disk)
+        dev1 = StorageDevice("dev1", exists=True, size=Size("1 GiB"),
+                             parents=[disk], fmt=get_format("swap"))
+        dt._add_device(dev1)
+        untouched = StorageDevice("untouched", exists=True, size=Size("1 GiB"))
+        dt._add_device(untouched)
+
+        swap = dev1.format
+        snapshot = dt.snapshot()
+        self.assertTrue(snapshot.active)
+
+        dev2 = StorageDevice("dev2", size=Size("1 GiB"), parents=[disk])
+        dt._add_device(dev2)
+        dev1.format = get_format("lvmpv")
+        dev1.name = "renamed"
+        dt._remove_device(dev1)
+        self.assertEqual(disk.children, [dev2])
+
+        # only pre-existing objects that changed have been saved
+        self.assertIn(disk, snapshot.changed)
+        self.assertIn(dev1, snapshot.changed)
+        self.assertNotIn(dev2, snapshot.changed)
+        self.assertNotIn(untouched, snapshot.changed)
+
+        dt.restore_snapshot(snapshot)
+        self.assertFalse(snapshot.active)
+        self.assertEqual(dt.devices, [disk, dev1, untouched])
+        self.assertEqual(dev1.name, "dev1")
+        self.assertIs(dev1.format, swap)
+        self.assertEqual(list(dev1.parents), [disk])
+        self.assertEqual(disk.children, [dev1])
+        self.assertEqual(dt.get_device_by_name("dev1"), dev1)
+        self.assertIsNone(dt.get_device_by_name("renamed"))
+        self.assertIsNone(dt.get_device_by_name("dev2"))
+        self.assertEqual(dt.get_devices_by_view("swaps"), [dev1])
+
+        # changes are not recorded after the snapshot is restored
+        dev1.name = "renamed"
+        self.assertEqual(snapshot.changed.count(dev1), 1)
+
+    def test_snapshot_journal(self):
+        dt = DeviceTree()
+
+        disk = StorageDevice("disk", exists=True, size=Size("10 GiB"))
+        dt._add_device(disk)
+        dev1 = StorageDevice("dev1", size=Size("1 GiB"), parents=[disk])
+        dt.actions.add(ActionCreateDevice(dev1))
+        names = dt.names[:]
+
+        outer = dt.snapshot()
+        dev2 = StorageDevice("dev2", size=Size("1 MiB"), parents=[disk])
+        dt.actions.add(ActionCreateDevice(dev2))
+
+        # a nested snapshot is a savepoint within the outer one
+        inner = dt.snapshot()
+        dt.actions.remove(dt.actions.find(device=dev1)[0])
+        dt.actions.add(ActionCreateFormat(dev2, get_format("biosboot")))
+        self.assertEqual(dt.devices, [disk, dev2])
+
+        dt.restore_snapshot(inner)
+        self.assertTrue(outer.active)
+        self.assertEqual(dt.devices, [disk, dev1, dev2])
+        self.assertEqual([a.device for a in dt.actions], [dev1, dev2])
+        self.assertEqual(dt.actions.find(device=dev2, action_type="create", object_type="format"), [])
+        self.assertEqual(dt.get_device_by_name("dev1"), dev1)
+
+        dt.restore_snapshot(outer)
+        self.assertEqual(dt.devices, [disk, dev1])
+        self.assertEqual([a.device for a in dt.actions], [dev1])
+        self.assertEqual(dt.actions.find(device=dev2), [])
+        self.assertEqual(dt.names, names)
+        self.assertIsNone(dt.get_device_by_name("dev2"))
+
+
+class IncompleteDevice(StorageDevice):
+    complete = True
+
 
 def recursive_getattr(x, attr, default=None):
     """ Resolve a possibly-dot-containing attribute name. """
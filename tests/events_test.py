@@ -1,4 +1,6 @@
 
+import threading
+import time
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
@@ -13,7 +15,7 @@ class FakeEventManager(EventManager):
         pass
 
     def disable(self):
-        pass
+        super().disable()
 
     def _create_event(self, *args, **kwargs):
         return Event(*args, **kwargs)
@@ -28,6 +30,7 @@ class EventManagerTest(TestCase):
         device = "sdc"
         action = "add"
         mgr.handle_event(action, device)
+        mgr.wait()
         self.assertEqual(handler_cb.call_count, 1)
         event = handler_cb.call_args[1]["event"]  # pylint: disable=unsubscriptable-object
         self.assertEqual(event.device, device)
@@ -37,6 +40,7 @@ class EventManagerTest(TestCase):
         handler_cb.reset_mock()
         mask = mgr.add_mask(device=device, action=action + 'x')
         mgr.handle_event(action, device)
+        mgr.wait()
         self.assertEqual(handler_cb.call_count, 1)
         event = handler_cb.call_args[1]["event"]  # pylint: disable=unsubscriptable-object
         self.assertEqual(event.device, device)
@@ -46,6 +50,7 @@ class EventManagerTest(TestCase):
         handler_cb.reset_mock()
         mask = mgr.add_mask(device=device + 'x', action=action)
         mgr.handle_event(action, device)
+        mgr.wait()
         self.assertEqual(handler_cb.call_count, 1)
         event = handler_cb.call_args[1]["event"]  # pylint: disable=unsubscriptable-object
         self.assertEqual(event.device, device)
@@ -56,6 +61,7 @@ class EventManagerTest(TestCase):
         mgr.remove_mask(mask)
         mask = mgr.add_mask(device=device, action=action)
         mgr.handle_event(action, device)
+        mgr.wait()
         self.assertEqual(handler_cb.call_count, 0)
 
         # device-only mask matches -> event is ignored
@@ -63,6 +69,7 @@ class EventManagerTest(TestCase):
         mgr.remove_mask(mask)
         mask = mgr.add_mask(device=device)
         mgr.handle_event(action, device)
+        mgr.wait()
         self.assertEqual(handler_cb.call_count, 0)
 
         # action-only mask matches -> event is ignored
@@ -70,5 +77,130 @@ class EventManagerTest(TestCase):
         mgr.remove_mask(mask)
         mask = mgr.add_mask(action=action)
         mgr.handle_event(action, device)
+        mgr.wait()
         self.assertEqual(handler_cb.call_count, 0)
         mgr.remove_mask(mask)
+
+    def test_event_queue(self):
+        handled = []
+        release = threading.Event()
+
+        def handler_cb(event, notify_cb):  # pylint: disable=unused-argument
+            release.wait()
+            handled.append((event.action, event.device))
+
+        mgr = FakeEventManager(handler_cb=handler_cb)
+
+        # the worker is busy with the first event while the rest are queued
+        mgr.handle_event("change", "sda")
+        mgr.handle_event("change", "sdb")
+        mgr.handle_event("change", "sdb")
+        mgr.handle_event("change", "sdb")
+        mgr.handle_event("add", "sdc")
+        mgr.handle_event("change", "sdc")
+        mgr.handle_event("remove", "sdc")
+        mgr.handle_event("remove", "sdd")
+        mgr.handle_event("add", "sdd")
+
+        release.set()
+        self.assertTrue(mgr.wait(timeout=5))
+
+        # repeated changes are handled once, and sdc came and went
+        self.assertEqual(handled, [("change", "sda"), ("change", "sdb"),
+                                   ("remove", "sdd"), ("add", "sdd")])
+
+        stats = mgr.stats
+        self.assertEqual(stats["handled"], 4)
+        self.assertEqual(stats["coalesced"], 2)
+        self.assertEqual(stats["cancelled"], 3)
+        self.assertEqual(stats["depth"], 0)
+        self.assertEqual(mgr.queue_depth, 0)
+
+    def test_event_queue_devices(self):
+        started = threading.Event()
+        release = threading.Event()
+        handled = []
+
+        def handler_cb(event, notify_cb):  # pylint: disable=unused-argument
+            if event.device == "sda":
+                started.set()
+                release.wait()
+            handled.append((event.action, event.device))
+
+        mgr = FakeEventManager(handler_cb=handler_cb, workers=2)
+        self.addCleanup(release.set)
+        mgr.handle_event("add", "sda")
+        self.assertTrue(started.wait(timeout=5))
+
+        # events on sda wait for the one being handled, the others do not
+        mgr.handle_event("change", "sda")
+        mgr.handle_event("add", "sdb")
+        mgr.handle_event("change", "sdb")
+        for _i in range(50):
+            if len(handled) == 2:
+                break
+            time.sleep(0.1)
+
+        self.assertEqual(handled, [("add", "sdb"), ("change", "sdb")])
+        self.assertEqual(mgr.queue_depth, 1)
+
+        release.set()
+        self.assertTrue(mgr.wait(timeout=5))
+        self.assertEqual(handled[2:], [("add", "sda"), ("change", "sda")])
+
+    def test_event_queue_full(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def handler_cb(event, notify_cb):  # pylint: disable=unused-argument
+            started.set()
+            release.wait()
+
+        mgr = FakeEventManager(handler_cb=handler_cb, max_queued=2)
+        self.addCleanup(release.set)
+        mgr.handle_event("add", "sda")
+        self.assertTrue(started.wait(timeout=5))
+
+        # events reported while the queue is full are dropped right away
+        for device in ("sdb", "sdc", "sdd"):
+            mgr.handle_event("add", device)
+
+        stats = mgr.stats
+        self.assertEqual(stats["queued"], 3)
+        self.assertEqual(stats["dropped"], 1)
+        self.assertEqual(stats["depth"], 2)
+
+        release.set()
+        self.assertTrue(mgr.wait(timeout=5))
+        self.assertEqual(mgr.stats["handled"], 3)
+
+    @patch("blivet.events.manager.disable_callbacks")
+    def test_disable(self, _disable_callbacks):
+        started = threading.Event()
+        release = threading.Event()
+        handled = []
+
+        def handler_cb(event, notify_cb):  # pylint: disable=unused-argument
+            started.set()
+            release.wait()
+            handled.append(event.device)
+
+        mgr = FakeEventManager(handler_cb=handler_cb, workers=2)
+        mgr.handle_event("add", "sda")
+        self.assertTrue(started.wait(timeout=5))
+        mgr.handle_event("add", "sda")
+        workers = list(mgr._workers)
+        self.assertEqual(len(workers), 2)
+
+        # the workers exit once the event being handled is done
+        threading.Timer(0.1, release.set).start()
+        mgr.disable()
+        self.assertFalse(any(w.is_alive() for w in workers))
+        self.assertEqual(handled, ["sda"])
+        self.assertEqual(mgr.stats["dropped"], 1)
+        self.assertEqual(mgr.queue_depth, 0)
+
+        # new events start new workers
+        mgr.handle_event("add", "sdb")
+        self.assertTrue(mgr.wait(timeout=5))
+        self.assertEqual(handled, ["sda", "sdb"])
@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch, PropertyMock
 
 import blivet
 
@@ -79,3 +80,40 @@ class DeviceValueTestCase(unittest.TestCase):
                 an_fs.device = "/abc:/def"
                 self.assertEqual(an_fs.type, typ)
                 self.assertEqual(an_fs.device, "/abc:/def")
+
+
+class DeviceFormatCreateTestCase(unittest.TestCase):
+
+    @patch("blivet.tasks.fsmkfs.util.run_program", return_value=0)
+    @patch("blivet.formats.os.path.exists", return_value=True)
+    def test_prepare_create(self, _exists, run_program):
+        """Test creating a filesystem with its mkfs run separately."""
+        an_fs = blivet.formats.get_format("ext4")
+        with patch.object(type(an_fs._mkfs), "availability_errors", new_callable=PropertyMock) as errors:
+            errors.return_value = []
+            program = an_fs.prepare_create(device="/dev/sda1", options=["-q"])
+            self.assertFalse(run_program.called)
+            self.assertFalse(an_fs.exists)
+
+            # the program does not use the format
+            an_fs.device = "/dev/sdb1"
+            program()
+            self.assertEqual(run_program.call_args[0][0][-1], "/dev/sda1")
+            self.assertIn("-q", run_program.call_args[0][0])
+            self.assertFalse(an_fs.exists)
+
+            an_fs.finish_create()
+            self.assertTrue(an_fs.exists)
+
+            # failures are reported like the ones of create
+            run_program.return_value = 1
+            an_fs = blivet.formats.get_format("ext4")
+            program = an_fs.prepare_create(device="/dev/sda1")
+            with self.assertRaises(blivet.errors.FormatCreateError):
+                program()
+
+    def test_prepare_create_whole(self):
+        """Test that formats not created by a program are created right away."""
+        an_fs = blivet.formats.get_format("btrfs")
+        self.assertIsNone(an_fs.prepare_create(device="/dev/sda1"))
+        self.assertTrue(an_fs.exists)
@@ -66,3 +66,40 @@ class DiskLabelTestCase(unittest.TestCase):
         # test the old deprecated properties' values
         self.assertEqual(dl.alignment, dl._get_optimal_alignment())
         self.assertEqual(dl.end_alignment, dl.get_end_alignment())
+
+    @patch("blivet.formats.disklabel.DiskLabel.fresh_parted_disk", None)
+    def test_layout_cache(self):
+        dl = blivet.formats.disklabel.DiskLabel()
+        dl._parted_disk = mock.Mock()
+        dl._parted_device = mock.Mock()
+        parted_disk = dl._parted_disk
+        parted_disk.getFreeSpaceRegions.return_value = ["free1", "free2"]
+        parted_disk.getLogicalPartitions.return_value = []
+        parted_disk.primaryPartitionCount = 1
+        parted_disk.maxPrimaryPartitionCount = 4
+
+        # the parted disk is only asked once
+        self.assertEqual(dl.free_space_regions, ["free1", "free2"])
+        self.assertEqual(dl.free_space_regions, ["free1", "free2"])
+        self.assertEqual(parted_disk.getFreeSpaceRegions.call_count, 1)
+        self.assertEqual(dl.partition_slots.primary, 1)
+        self.assertEqual(dl.partition_slots.max_primary, 4)
+        self.assertEqual(parted_disk.getLogicalPartitions.call_count, 1)
+
+        # changing the partitions makes it ask again
+        parted_disk.primaryPartitionCount = 0
+        dl.remove_partition("part1")
+        parted_disk.removePartition.assert_called_once_with("part1")
+        self.assertEqual(dl.partition_slots.primary, 0)
+        self.assertEqual(dl.free_space_regions, ["free1", "free2"])
+        self.assertEqual(parted_disk.getFreeSpaceRegions.call_count, 2)
+
+        dl._orig_parted_disk = parted_disk
+        dl.reset_parted_disk()
+        self.assertEqual(dl.free_space_regions, ["free1", "free2"])
+        self.assertEqual(parted_disk.getFreeSpaceRegions.call_count, 3)
+
+        # so does replacing the parted disk
+        dl._parted_disk = mock.Mock()
+        dl._parted_disk.getFreeSpaceRegions.return_value = []
+        self.assertEqual(dl.free_space_regions, [])
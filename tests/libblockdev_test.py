@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+from blivet import libblockdev
+
+
+class LibBlockDevTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bd = Mock(name="BlockDev")
+        self.bd.try_reinit.return_value = (False, ["lvm"])
+        self.bd.plugin_specs_from_names.side_effect = lambda names: sorted(names)
+
+        for patcher in (patch.object(libblockdev, "_blockdev", new=self.bd),
+                        patch.object(libblockdev, "_requested_plugins", new=set()),
+                        patch.object(libblockdev, "_loaded_plugins", new=set())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_load_plugins(self):
+        self.assertEqual(libblockdev.load_plugins(["lvm", "btrfs"]), set(["lvm"]))
+        self.bd.plugin_specs_from_names.assert_called_once_with(set(["lvm", "btrfs"]))
+
+        # plugins are only tried once
+        self.assertEqual(libblockdev.load_plugins(["btrfs"]), set(["lvm"]))
+        self.assertEqual(self.bd.try_reinit.call_count, 1)
+
+        # plugins loaded before are still required when loading more of them
+        self.bd.try_reinit.return_value = (True, ["lvm", "dm"])
+        self.assertEqual(libblockdev.load_plugins(["dm"]), set(["lvm", "dm"]))
+        self.bd.plugin_specs_from_names.assert_called_with(set(["lvm", "btrfs", "dm"]))
+
+    def test_lazy_blockdev(self):
+        blockdev = libblockdev.blockdev
+        self.assertIs(blockdev.BlockDevError, self.bd.BlockDevError)
+        self.assertFalse(self.bd.try_reinit.called)
+
+        self.assertIs(blockdev.md, self.bd.md)
+        self.assertEqual(libblockdev._requested_plugins, set(["mdraid"]))
+
+        blockdev.mpath_is_mpath_member("/dev/sda")
+        self.bd.mpath_is_mpath_member.assert_called_once_with("/dev/sda")
+        self.assertEqual(libblockdev._requested_plugins, set(["mdraid", "mpath"]))
+
+        blockdev.md.examine("/dev/sda")
+        self.assertEqual(self.bd.try_reinit.call_count, 2)
+
+    def test_import(self):
+        # importing blivet's modules does not initialize any plugin
+        topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (topdir, env.get("PYTHONPATH")) if p)
+        code = "import blivet.blivet; from blivet import libblockdev; print(sorted(libblockdev._requested_plugins))"
+        out = subprocess.check_output([sys.executable, "-c", code], env=env, universal_newlines=True)
+        self.assertEqual(out.strip(), "[]")
@@ -0,0 +1,74 @@
+import os
+import stat
+import unittest
+from unittest.mock import Mock, mock_open, patch
+
+from blivet.mounts import MountsCache
+
+MOUNTINFO = """\
+23 28 0:22 / /proc rw,relatime - proc proc rw
+28 1 8:1 / / rw,relatime - ext4 /dev/sda1 rw
+40 28 8:1 / /mnt/again rw,relatime - ext4 /dev/sda1 rw
+41 28 0:45 /home /home rw,relatime shared:1 - btrfs /dev/sdb rw
+42 28 0:45 / /mnt/btrfs rw,relatime - btrfs /dev/sdb rw
+bogus line
+"""
+
+DEVICES = {"/dev/sda1": os.makedev(8, 1),
+           "/dev/sdb": os.makedev(8, 16)}
+
+
+def fake_stat(path):
+    if path not in DEVICES:
+        raise FileNotFoundError(path)
+
+    return Mock(st_mode=stat.S_IFBLK, st_rdev=DEVICES[path])
+
+
+class MountsCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        stat_patcher = patch("blivet.mounts.os.stat", side_effect=fake_stat)
+        stat_patcher.start()
+        self.addCleanup(stat_patcher.stop)
+
+        self.cache = MountsCache()
+        self.cache._changed = Mock(return_value=True)
+        with patch("blivet.mounts.open", mock_open(read_data=MOUNTINFO), create=True):
+            self.cache._cache_check()
+
+        self.cache._changed.return_value = False
+
+    def test_get_mountpoints(self):
+        self.assertEqual(self.cache.get_mountpoints("/dev/sda1"), ["/", "/mnt/again"])
+        self.assertEqual(self.cache.get_mountpoints("/dev/sdb", "home"), ["/home"])
+        self.assertEqual(self.cache.get_mountpoints("/dev/sdb", 5), ["/mnt/btrfs"])
+        self.assertEqual(self.cache.get_mountpoints("/dev/sdb"), [])
+        self.assertEqual(self.cache.get_mountpoints("/dev/sdc"), [])
+        self.assertEqual(self.cache.get_mountpoints(None), [])
+
+        with patch("blivet.mounts.resolve_devspec", return_value="sda1"):
+            self.assertEqual(self.cache.get_mountpoints("UUID=1234"), ["/", "/mnt/again"])
+
+    def test_is_mountpoint(self):
+        self.assertTrue(self.cache.is_mountpoint("/proc"))
+        self.assertTrue(self.cache.is_mountpoint("/mnt/btrfs"))
+        self.assertFalse(self.cache.is_mountpoint("/mnt"))
+
+    def test_cache_check(self):
+        # the mount table is only read again after it changed
+        self.cache._changed.return_value = True
+        with patch("blivet.mounts.open", mock_open(read_data=MOUNTINFO.split("\n", 2)[2]), create=True):
+            self.assertFalse(self.cache.is_mountpoint("/proc"))
+
+        self.cache._changed.return_value = False
+        self.assertEqual(self.cache.get_mountpoints("/dev/sda1"), ["/mnt/again"])
+
+    def test_changed(self):
+        cache = MountsCache()
+        self.assertTrue(cache._changed())
+        self.assertFalse(cache._changed())
+
+        cache._poller = Mock()
+        cache._poller.poll.return_value = [(cache._mounts_file.fileno(), 0)]
+        self.assertTrue(cache._changed())
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+#
+# partitioning_benchmark.py - measure the cost of blivet's allocation code
+#
+# Copyright (C) 2017  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+# Every layout of N disks and M requests is set up on disks backed by sparse
+# files, so no real disks are needed, and run through these phases:
+#
+#   do_partitioning  allocate and grow M partitions: fixed, growable, growable
+#                    with a maximum size and members of size sets
+#   grow_lvm         grow the LVs of a VG on the size set members
+#   configure        configure M / 4 partitions and LVs with device factories,
+#                    on disks of their own
+#
+# The wall time (best of --runs), the peak memory allocated and the number of
+# Python function calls are reported for each phase as JSON:
+#
+#   PYTHONPATH=. python3 -m tests.partitioning_benchmark > baseline.json
+#   ... change things ...
+#   make benchmark BENCHMARK_BASELINE=baseline.json
+#
+# which exits with status 1 if any phase got slower or made more calls than
+# allowed by --tolerance. Layouts that fail to be set up are reported as an
+# "error" and make it exit with status 1, with or without a baseline.
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+import blivet
+from blivet import devicefactory
+from blivet.partitioning import do_partitioning, grow_lvm, SameSizeSet, TotalSizeSet
+from blivet.size import Size
+
+from tests.storagetestcase import StorageTestCase
+
+# functions whose number of calls is reported separately
+TRACKED_FUNCTIONS = ["allocate_partitions", "grow_partitions", "manage_size_sets",
+                     "get_best_free_space_region", "get_disk_chunks", "grow_requests",
+                     "grow_lvm", "configure"]
+
+# partition requests, used in turns
+REQUEST_KINDS = ["fixed", "grow", "grow_max", "size_set"]
+
+# number of size set members per set
+SET_SIZE = 4
+
+
+class PartitioningBenchmark(StorageTestCase):
+
+    """ One layout of disks and requests. """
+
+    def __init__(self, disks, requests, disk_size):
+        super(PartitioningBenchmark, self).__init__()
+        self.disk_count = disks
+        self.request_count = requests
+        self.disk_size = disk_size
+        self.disks = []
+        self.set_members = []
+
+    def runTest(self):
+        pass
+
+    def setUp(self):
+        super(PartitioningBenchmark, self).setUp()
+        # disks with alternating disklabel types, starting with gpt so that a
+        # single disk can hold many partitions
+        for i in range(self.disk_count):
+            self.disks.append(self.new_disk_file(self.disk_size,
+                                                 label_type=("gpt", "msdos")[i % 2]))
+
+    def tearDown(self):
+        self.doCleanups()
+        super(PartitioningBenchmark, self).tearDown()
+
+    def _add_partitions(self):
+        for i in range(self.request_count):
+            kind = REQUEST_KINDS[i % len(REQUEST_KINDS)]
+            if kind == "fixed":
+                part = self.storage.new_partition(size=Size("1 GiB"), fmt_type="ext4")
+            elif kind == "grow":
+                part = self.storage.new_partition(size=Size("512 MiB"), grow=True,
+                                                  fmt_type="ext4")
+            elif kind == "grow_max":
+                part = self.storage.new_partition(size=Size("256 MiB"), grow=True,
+                                                  maxsize=Size("4 GiB"), fmt_type="ext4")
+            else:
+                part = self.storage.new_partition(size=Size("512 MiB"), grow=True,
+                                                  fmt_type="lvmpv")
+                self.set_members.append(part)
+
+            self.storage.create_device(part)
+
+        # the members are split into sets of both kinds
+        for (i, start) in enumerate(range(0, len(self.set_members), SET_SIZE)):
+            members = self.set_members[start:start + SET_SIZE]
+            size = Size("2 GiB") * len(members)
+            if i % 2:
+                self.storage.size_sets.append(TotalSizeSet(members, size))
+            else:
+                self.storage.size_sets.append(SameSizeSet(members, size, grow=True))
+
+    def _add_lvs(self):
+        vg = self.storage.new_vg(parents=self.set_members)
+        self.storage.create_device(vg)
+        for i in range(max(1, self.request_count // SET_SIZE)):
+            lv = self.storage.new_lv(parents=[vg], size=Size("1 GiB"), grow=bool(i % 2),
+                                     fmt_type="ext4")
+            self.storage.create_device(lv)
+
+    def _configure(self):
+        for i in range(max(1, self.request_count // SET_SIZE)):
+            device_type = (devicefactory.DEVICE_TYPE_PARTITION, devicefactory.DEVICE_TYPE_LVM)[i % 2]
+            factory = devicefactory.get_device_factory(self.storage, device_type, Size("2 GiB"),
+                                                       disks=self.disks, fstype="ext4",
+                                                       mountpoint="/bench%d" % i)
+            factory.configure()
+
+    def partitioning_phases(self):
+        """ Yield the names and functions of the allocation phases, in order.
+
+            The set-up work for a phase happens when it is yielded, so only
+            the returned function needs to be measured.
+        """
+        self._add_partitions()
+        yield ("do_partitioning", lambda: do_partitioning(self.storage))
+
+        if self.set_members:
+            self._add_lvs()
+            yield ("grow_lvm", lambda: grow_lvm(self.storage))
+
+    def factory_phases(self):
+        """ Yield the name and function of the device factory phase. """
+        yield ("configure", self._configure)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return {"time": time.perf_counter() - start}
+
+
+def _traced(func):
+    tracemalloc.start()
+    try:
+        func()
+        (_current, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"peak_memory": peak}
+
+
+def _profiled(func):
+    profile = cProfile.Profile()
+    profile.runcall(func)
+
+    topdir = os.path.dirname(os.path.abspath(blivet.__file__))
+    calls = 0
+    functions = dict((name, 0) for name in TRACKED_FUNCTIONS)
+    for ((filename, _line, name), (_cc, ncalls, _tt, _ct, _callers)) in pstats.Stats(profile).stats.items():
+        calls += ncalls
+        if name in functions and filename.startswith(topdir):
+            functions[name] += ncalls
+
+    return {"calls": calls, "functions": functions}
+
+
+def run_layout(disks, requests, disk_size, runs):
+    """ Return the measurements of every phase for a layout.
+
+        The layout is set up from scratch for every measurement, the wall
+        time is measured without tracing or profiling and is the best of
+        the given number of runs.
+    """
+    results = {}
+    for measure in [_timed] * runs + [_traced, _profiled]:
+        # the device factories get a layout of their own
+        for phases in (PartitioningBenchmark.partitioning_phases, PartitioningBenchmark.factory_phases):
+            benchmark = PartitioningBenchmark(disks, requests, disk_size)
+            benchmark.setUp()
+            try:
+                for (name, func) in phases(benchmark):
+                    values = measure(func)
+                    phase = results.setdefault(name, {})
+                    if "time" in values and "time" in phase:
+                        values["time"] = min(values["time"], phase["time"])
+                    phase.update(values)
+            finally:
+                benchmark.tearDown()
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Return descriptions of the measurements that got worse than allowed. """
+    regressions = []
+    for (layout, phases) in sorted(results.items()):
+        for (name, values) in sorted(phases.items()):
+            base = baseline.get(layout, {}).get(name)
+            if base is None:
+                continue
+
+            for key in ("time", "calls"):
+                if key in base and values[key] > base[key] * (1 + tolerance / 100):
+                    regressions.append("%s %s: %s %s, baseline %s" % (layout, name, key,
+                                                                      values[key], base[key]))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="measure the cost of allocating partitions and LVs")
+    parser.add_argument("-d", "--disks", default="1,2,4,8",
+                        help="comma separated numbers of disks (default: %(default)s)")
+    parser.add_argument("-n", "--requests", default="8,32,128",
+                        help="comma separated numbers of requests (default: %(default)s)")
+    parser.add_argument("-s", "--disk-size", default="500 GiB",
+                        help="size of every disk (default: %(default)s)")
+    parser.add_argument("-r", "--runs", type=int, default=3,
+                        help="number of timed runs per layout, the best one is reported")
+    parser.add_argument("-b", "--baseline", metavar="FILE",
+                        help="JSON output of an earlier run to compare the results with")
+    parser.add_argument("-t", "--tolerance", type=float, default=20.0,
+                        help="allowed slowdown against the baseline in percent")
+    args = parser.parse_args()
+
+    results = {}
+    for disks in (int(d) for d in args.disks.split(",")):
+        for requests in (int(r) for r in args.requests.split(",")):
+            layout = "%d disks x %d requests" % (disks, requests)
+            try:
+                results[layout] = run_layout(disks, requests, Size(args.disk_size), args.runs)
+            except Exception as e:  # pylint: disable=broad-except
+                results[layout] = {"error": str(e)}
+
+    print(json.dumps(results, indent=4, sort_keys=True))
+
+    # a layout that cannot be set up any more is the worst regression there is
+    failures = ["%s: %s" % (l, p["error"]) for (l, p) in sorted(results.items()) if "error" in p]
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        failures += compare(dict((l, p) for (l, p) in results.items() if "error" not in p), baseline,
+                            args.tolerance)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
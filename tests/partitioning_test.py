@@ -1,5 +1,7 @@
 
+import random
 import unittest
+from decimal import Decimal
 from mock import Mock, patch
 
 import parted
@@ -15,6 +17,7 @@ from blivet.partitioning import LVRequest
 from blivet.partitioning import VGChunk
 from blivet.partitioning import DiskChunk
 from blivet.partitioning import PartitionRequest
+from blivet.partitioning import proportional_share
 
 from blivet.devices import StorageDevice
 from blivet.devices import LVMVolumeGroupDevice
@@ -317,6 +320,28 @@ class PartitioningTestCase(unittest.TestCase):
         self.assertEqual(req2.growth, 0)
         self.assertEqual(req3.growth, 35)
 
+    def test_proportional_share(self):
+        def decimal_share(base, total, pool):
+            return int(Decimal(base) / Decimal(total) * pool)
+
+        # the decimal quotient of 1/3 is rounded down, so 3 units of 1/3 come
+        # out below 1
+        self.assertEqual(proportional_share(1, 3, 3), 0)
+        self.assertEqual(proportional_share(3, 3, 17), 17)
+        self.assertEqual(proportional_share(0, 3, 17), 0)
+
+        rand = random.Random(1)
+        for _i in range(10000):
+            total = rand.randint(1, 2 ** rand.randint(1, 40))
+            base = rand.randint(0, total)
+            pool = rand.randint(0, 2 ** rand.randint(1, 40))
+            if rand.random() < 0.2:
+                # make the exact share a whole number
+                pool = total * rand.randint(0, 1000)
+
+            self.assertEqual(proportional_share(base, total, pool),
+                             decimal_share(base, total, pool))
+
     def test_disk_chunk1(self):
         disk_size = Size("100 MiB")
         with sparsetmpfile("chunktest", disk_size) as disk_file:
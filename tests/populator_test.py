@@ -1,5 +1,6 @@
 import gi
 import os
+from types import SimpleNamespace
 import unittest
 from unittest.mock import call, patch, sentinel, Mock, PropertyMock
 
@@ -15,6 +16,7 @@ from blivet.devicetree import DeviceTree
 from blivet.flags import flags
 from blivet.formats import get_device_format_class, get_format, DeviceFormat
 from blivet.formats.disklabel import DiskLabel
+from blivet.formats.fs import Ext4FS
 from blivet.osinstall import storage_initialize
 from blivet.populator.helpers import DiskDevicePopulator, DMDevicePopulator, LoopDevicePopulator
 from blivet.populator.helpers import LVMDevicePopulator, MDDevicePopulator, MultipathDevicePopulator
@@ -24,7 +26,10 @@ from blivet.populator.helpers import get_format_helper, get_device_helper
 from blivet.populator.helpers.boot import AppleBootFormatPopulator, EFIFormatPopulator, MacEFIFormatPopulator
 from blivet.populator.helpers.formatpopulator import FormatPopulator
 from blivet.populator.helpers.disklabel import DiskLabelFormatPopulator
+from blivet.populator.profile import PopulateProfile
 from blivet.size import Size
+from blivet.static_data import lvm_info, probe_data
+from blivet.tasks import fsck, fsinfo, fsminsize, fsresize
 try:
     from pyanaconda import kickstart
     pyanaconda_present = True
@@ -734,7 +739,7 @@ class FormatPopulatorTestCase(PopulatorHelperTestCase):
             self.assertTrue(self.helper_class.match(data, device),
                             msg="Failed to match %s against %s" % (self.udev_type, self.helper_name))
 
-    @patch("blivet.populator.helpers.disklabel.blockdev.mpath_is_mpath_member", return_value=False)
+    @patch("blivet.static_data.probe_data.blockdev.mpath_is_mpath_member", return_value=False)
     @patch("blivet.udev.device_is_partition", return_value=False)
     @patch("blivet.udev.device_is_dm_partition", return_value=False)
     # pylint: disable=unused-argument
@@ -790,7 +795,7 @@ class HFSPopulatorTestCase(FormatPopulatorTestCase):
 class DiskLabelPopulatorTestCase(PopulatorHelperTestCase):
     helper_class = DiskLabelFormatPopulator
 
-    @patch("blivet.populator.helpers.disklabel.blockdev.mpath_is_mpath_member", return_value=False)
+    @patch("blivet.static_data.probe_data.blockdev.mpath_is_mpath_member", return_value=False)
     @patch("blivet.udev.device_is_biosraid_member", return_value=False)
     @patch("blivet.udev.device_get_format", return_value=None)
     @patch("blivet.udev.device_get_disklabel_type", return_value="dos")
@@ -828,7 +833,7 @@ class DiskLabelPopulatorTestCase(PopulatorHelperTestCase):
         self.assertFalse(self.helper_class.match(data, device))
         is_mpath_member.return_value = False
 
-    @patch("blivet.populator.helpers.disklabel.blockdev.mpath_is_mpath_member", return_value=False)
+    @patch("blivet.static_data.probe_data.blockdev.mpath_is_mpath_member", return_value=False)
     @patch("blivet.udev.device_is_biosraid_member", return_value=False)
     @patch("blivet.udev.device_get_format", return_value=None)
     @patch("blivet.udev.device_get_disklabel_type", return_value="dos")
@@ -859,6 +864,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         blockdev.lvm.pvs = self._pvs
         blockdev.lvm.vgs = self._vgs
         blockdev.lvm.lvs = self._lvs
+        lvm_info.drop_cache()
 
     @patch("blivet.udev.device_get_name")
     @patch.object(DeviceFormat, "_device_check", return_value=None)
@@ -882,6 +888,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         blockdev.lvm.vgs = Mock(return_value=[])
         blockdev.lvm.lvs = Mock(return_value=[])
         self.addCleanup(self._clean_up)
+        lvm_info.drop_cache()
 
         # base case: pv format with no vg
         with patch("blivet.udev.device_get_format", return_value=self.udev_type):
@@ -906,7 +913,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         vg_device.lvs = []
         get_device_by_uuid.return_value = vg_device
 
-        with patch("blivet.static_data.lvm_info.PVsInfo.cache", new_callable=PropertyMock) as mock_pvs_cache:
+        with patch("blivet.static_data.lvm_info.LVMInfo.pvs", new_callable=PropertyMock) as mock_pvs_cache:
             mock_pvs_cache.return_value = {sentinel.pv_path: pv_info}
             with patch("blivet.udev.device_get_format", return_value=self.udev_type):
                 helper = self.helper_class(devicetree, data, device)
@@ -931,7 +938,7 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
         pv_info.vg_free_count = 0
         pv_info.vg_pv_count = 1
 
-        with patch("blivet.static_data.lvm_info.PVsInfo.cache", new_callable=PropertyMock) as mock_pvs_cache:
+        with patch("blivet.static_data.lvm_info.LVMInfo.pvs", new_callable=PropertyMock) as mock_pvs_cache:
             mock_pvs_cache.return_value = {sentinel.pv_path: pv_info}
             with patch("blivet.udev.device_get_format", return_value=self.udev_type):
                 helper = self.helper_class(devicetree, data, device)
@@ -977,9 +984,9 @@ class LVMFormatPopulatorTestCase(FormatPopulatorTestCase):
             return next((d for d in devicetree.devices if d.uuid == uuid), None)
         get_device_by_uuid.side_effect = gdbu
 
-        with patch("blivet.static_data.lvm_info.PVsInfo.cache", new_callable=PropertyMock) as mock_pvs_cache:
+        with patch("blivet.static_data.lvm_info.LVMInfo.pvs", new_callable=PropertyMock) as mock_pvs_cache:
             mock_pvs_cache.return_value = {sentinel.pv_path: pv_info}
-            with patch("blivet.static_data.lvm_info.LVsInfo.cache", new_callable=PropertyMock) as mock_lvs_cache:
+            with patch("blivet.static_data.lvm_info.LVMInfo.lvs", new_callable=PropertyMock) as mock_lvs_cache:
                 mock_lvs_cache.return_value = lv_info
                 with patch("blivet.udev.device_get_format", return_value=self.udev_type):
                     self.assertEqual(devicetree.get_device_by_name(pv_info.vg_name, incomplete=True), None)
@@ -1190,5 +1197,243 @@ class AppleBootFormatPopulatorTestCase(BootFormatPopulatorTestCase):
     helper_class = AppleBootFormatPopulator
 
 
+class PopulatorProbeTestCase(unittest.TestCase):
+
+    def test_probe_data(self):
+        """Test prefetching of device probes."""
+        calls = []
+
+        def probe(path):
+            calls.append(path)
+            if path == "/dev/sdz":
+                raise ValueError("no such device")
+            return path.upper()
+
+        probe_data.prefetch([(probe, "/dev/sda"), (probe, "/dev/sdz")], workers=2)
+        self.addCleanup(probe_data.drop_cache)
+        self.assertEqual(probe_data.get(probe, "/dev/sda"), "/DEV/SDA")
+        self.assertEqual(probe_data.get(probe, "/dev/sda"), "/DEV/SDA")
+        with self.assertRaises(ValueError):
+            probe_data.get(probe, "/dev/sdz")
+        self.assertEqual(sorted(calls), ["/dev/sda", "/dev/sdz"])
+
+        # probes that were not prefetched run in the calling thread
+        self.assertEqual(probe_data.get(probe, "/dev/sdb"), "/DEV/SDB")
+        self.assertEqual(probe_data.get(probe, "/dev/sdb"), "/DEV/SDB")
+        self.assertEqual(len(calls), 4)
+
+        probe_data.drop_cache()
+        self.assertEqual(probe_data.get(probe, "/dev/sda"), "/DEV/SDA")
+        self.assertEqual(len(calls), 5)
+
+    @patch("blivet.static_data.probe_data.util.run_program_and_capture_output")
+    def test_probe_data_programs(self, run_program):
+        """Test prefetching of external programs."""
+        def run(argv):
+            if argv[0] == "missing":
+                raise OSError("no such program")
+            return (0, " ".join(argv))
+
+        run_program.side_effect = run
+        probe_data.prefetch_programs([[["check", "/dev/sda1"], ["info", "/dev/sda1"]],
+                                      [["missing", "/dev/sdb1"]]],
+                                     workers=2)
+        self.addCleanup(probe_data.drop_cache)
+        self.assertEqual(probe_data.run_program(["check", "/dev/sda1"]), (0, "check /dev/sda1"))
+        self.assertEqual(probe_data.run_program(["info", "/dev/sda1"]), (0, "info /dev/sda1"))
+        with self.assertRaises(OSError):
+            probe_data.run_program(["missing", "/dev/sdb1"])
+        self.assertEqual(run_program.call_count, 3)
+
+        # a prefetched run is only used once
+        self.assertEqual(probe_data.run_program(["check", "/dev/sda1"]), (0, "check /dev/sda1"))
+        self.assertEqual(run_program.call_count, 4)
+
+    @patch("os.path.exists", return_value=True)
+    @patch("blivet.static_data.probe_data.util.run_program_and_capture_output")
+    def test_fs_size_info_programs(self, run_program, _exists):
+        """Test prefetching of the programs gathering a filesystem's size."""
+        outputs = {"e2fsck": "",
+                   "dumpe2fs": "Block count: 2560\nBlock size: 4096\n",
+                   "resize2fs": "Estimated minimum size of the filesystem: 1280\n"}
+        run_program.side_effect = lambda argv: (0, outputs[argv[0]])
+
+        with patch.object(fsck.Ext2FSCK, "_availability_errors", []), \
+                patch.object(fsinfo.Ext2FSInfo, "_availability_errors", []), \
+                patch.object(fsminsize.Ext2FSMinSize, "_availability_errors", []), \
+                patch.object(fsresize.Ext2FSResize, "_availability_errors", []), \
+                patch("blivet.formats.fs.flags.auto_dev_updates", True):
+            programs = Ext4FS.size_info_programs("/dev/sda1")
+            self.assertEqual([argv[0] for argv in programs], ["e2fsck", "dumpe2fs", "resize2fs"])
+            self.assertTrue(all(argv[-1] == "/dev/sda1" for argv in programs))
+
+            probe_data.prefetch_programs([programs], workers=2)
+            self.addCleanup(probe_data.drop_cache)
+            fmt = Ext4FS(device="/dev/sda1", exists=True)
+
+        # the format used the prefetched runs instead of running the programs again
+        self.assertEqual(run_program.call_count, 3)
+        self.assertEqual(fmt.current_size, Size("10 MiB"))
+        self.assertTrue(fmt.resizable)
+
+        with patch("blivet.formats.fs.flags.auto_dev_updates", False):
+            self.assertEqual(Ext4FS.size_info_programs("/dev/sda1"), [])
+
+    def test_populate_drops_probes(self):
+        """Test that probes are not reused across populate passes."""
+        sda = Mock(name="sda")
+        sdb = Mock(name="sdb")
+        events = []
+
+        devicetree = DeviceTree()
+        with patch("blivet.populator.populator.udev") as udev, \
+                patch.object(probe_data, "drop_cache", side_effect=lambda: events.append("drop")), \
+                patch.object(devicetree, "_prefetch_device_probes"), \
+                patch.object(devicetree, "handle_device", side_effect=events.append), \
+                patch.object(devicetree, "setup_disk_images"), \
+                patch.object(devicetree, "_handle_inconsistencies"), \
+                patch.object(devicetree, "drop_lvm_cache"), \
+                patch("blivet.populator.populator.flags.auto_dev_updates", False):
+            udev.get_devices.side_effect = [[sda], [sda, sdb], [sda, sdb]]
+            udev.device_get_name.side_effect = lambda info: info._mock_name
+            devicetree._populate()
+
+        self.assertEqual(events, ["drop", sda, "drop", sdb])
+
+    @patch("blivet.udev.device_is_partition")
+    def test_udev_device_layers(self, device_is_partition):
+        """Test ordering of udev devices by their depth in the device stack."""
+        class UdevInfo(dict):
+            def __init__(self, sys_name, sys_path):
+                super().__init__()
+                self.sys_name = sys_name
+                self.sys_path = sys_path
+
+        slaves = {"/sys/block/sda/slaves": [],
+                  "/sys/block/sda/sda1/slaves": [],
+                  "/sys/block/md0/slaves": ["sda1", "sdb1"],
+                  "/sys/block/dm-0/slaves": ["md0"]}
+        devices = [UdevInfo("dm-0", "/sys/block/dm-0"),
+                   UdevInfo("md0", "/sys/block/md0"),
+                   UdevInfo("sda1", "/sys/block/sda/sda1"),
+                   UdevInfo("sda", "/sys/block/sda")]
+        device_is_partition.side_effect = lambda info: info.sys_name == "sda1"
+
+        devicetree = DeviceTree()
+        with patch("os.listdir", side_effect=lambda path: slaves[path]):
+            layers = devicetree._udev_device_layers(devices)
+
+        self.assertEqual(layers, {"sda": 0, "sda1": 1, "md0": 2, "dm-0": 3})
+
+
+class PopulateProfileTestCase(unittest.TestCase):
+
+    @patch("blivet.populator.profile.time.time")
+    def test_populate_profile(self, mock_time):
+        """Test recording of populate timing by helper and by device."""
+        clock = [0.0]
+
+        def tick(seconds):
+            clock[0] += seconds
+
+        mock_time.side_effect = lambda: clock[0]
+
+        profile = PopulateProfile()
+        with profile.measure("devices", "sda"):
+            tick(1.0)
+        self.assertEqual(profile.report()["devices"], {})
+
+        profile.start()
+        self.addCleanup(profile.stop)
+        with profile.measure("devices", "md0"):
+            tick(1.0)
+            with profile.measure("devices", "sda1"):
+                with profile.measure("helpers", "PartitionDevicePopulator"):
+                    tick(2.0)
+                    util.run_program(["true"])
+            with profile.measure("helpers", "MDDevicePopulator"):
+                tick(3.0)
+                util.run_program(["true"])
+                util.run_program(["true"])
+        profile.stop()
+
+        # programs run after the profile was stopped are not counted
+        util.run_program(["true"])
+
+        report = profile.report()
+        self.assertEqual(report["time"], 6.0)
+        self.assertEqual(report["commands"], 3)
+        self.assertEqual(report["programs"]["true"]["calls"], 3)
+        self.assertEqual(report["devices"]["md0"],
+                         {"calls": 1, "time": 6.0, "self_time": 4.0, "commands": 2})
+        self.assertEqual(report["devices"]["sda1"],
+                         {"calls": 1, "time": 2.0, "self_time": 2.0, "commands": 1})
+        self.assertEqual(report["helpers"]["MDDevicePopulator"],
+                         {"calls": 1, "time": 3.0, "self_time": 3.0, "commands": 2})
+        self.assertNotIn("sda", report["devices"])
+
+
+class LVMInfoTestCase(unittest.TestCase):
+
+    @patch("blivet.static_data.lvm_info.blockdev")
+    def test_lvm_info(self, mock_blockdev):
+        """Test the cached snapshot of lvm metadata."""
+        mock_blockdev.LVMError = RuntimeError
+        mock_blockdev.lvm.lvs.return_value = [SimpleNamespace(vg_name="vg", lv_name="lv", uuid="lv-uuid"),
+                                              SimpleNamespace(vg_name="vg", lv_name="thin", uuid="thin-uuid",
+                                                              origin=None, pool_lv="pool"),
+                                              SimpleNamespace(vg_name="vg", lv_name="pool", uuid="pool-uuid",
+                                                              data_lv="pool_tdata", metadata_lv="pool_tmeta")]
+        mock_blockdev.lvm.pvs.return_value = [SimpleNamespace(pv_name="/dev/sda1")]
+        mock_blockdev.lvm.lvorigin.return_value = "origin"
+        mock_blockdev.lvm.cache_pool_name.side_effect = RuntimeError("not a cached lv")
+        self.addCleanup(lvm_info.drop_cache)
+        lvm_info.drop_cache()
+
+        self.assertEqual(sorted(lvm_info.lvs.keys()), ["vg-lv", "vg-pool", "vg-thin"])
+        self.assertEqual(list(lvm_info.pvs.keys()), ["/dev/sda1"])
+        self.assertEqual(mock_blockdev.lvm.lvs.call_count, 1)
+        self.assertFalse(mock_blockdev.lvm.vgs.called)
+
+        # lookups are done once, using the listing where it has the information
+        self.assertEqual(lvm_info.lv_origin("vg", "lv"), "origin")
+        self.assertEqual(lvm_info.lv_origin("vg", "lv"), "origin")
+        self.assertEqual(mock_blockdev.lvm.lvorigin.call_count, 1)
+        self.assertIsNone(lvm_info.lv_origin("vg", "thin"))
+        self.assertEqual(lvm_info.thin_pool_name("vg", "thin"), "pool")
+        self.assertEqual(mock_blockdev.lvm.lvorigin.call_count, 1)
+        self.assertFalse(mock_blockdev.lvm.thlvpoolname.called)
+        self.assertEqual(lvm_info.data_lv_name("vg", "pool"), "pool_tdata")
+        self.assertEqual(lvm_info.metadata_lv_name("vg", "pool"), "pool_tmeta")
+        self.assertFalse(mock_blockdev.lvm.data_lv_name.called)
+        self.assertFalse(mock_blockdev.lvm.metadata_lv_name.called)
+
+        # pools are looked up once when the listing does not name their LVs
+        mock_blockdev.lvm.data_lv_name.return_value = "lv_tdata"
+        for _i in range(2):
+            self.assertEqual(lvm_info.data_lv_name("vg", "lv"), "lv_tdata")
+        self.assertEqual(mock_blockdev.lvm.data_lv_name.call_count, 1)
+
+        # so are failed lookups
+        for _i in range(2):
+            with self.assertRaises(RuntimeError):
+                lvm_info.cache_pool_name("vg", "lv")
+        self.assertEqual(mock_blockdev.lvm.cache_pool_name.call_count, 1)
+
+        lvm_info.drop_cache()
+        self.assertEqual(lvm_info.lv_origin("vg", "lv"), "origin")
+        self.assertEqual(mock_blockdev.lvm.lvorigin.call_count, 2)
+        self.assertEqual(mock_blockdev.lvm.lvs.call_count, 2)
+
+        # single PVs are looked up by themselves while nothing is listed
+        lvm_info.drop_cache()
+        mock_blockdev.lvm.pvinfo.return_value = SimpleNamespace(pv_name="/dev/sdb1")
+        self.assertEqual(lvm_info.pv_info("/dev/sdb1").pv_name, "/dev/sdb1")
+        self.assertEqual(mock_blockdev.lvm.pvs.call_count, 2)
+        self.assertEqual(lvm_info.pvs["/dev/sda1"].pv_name, "/dev/sda1")
+        self.assertEqual(lvm_info.pv_info("/dev/sda1").pv_name, "/dev/sda1")
+        self.assertEqual(mock_blockdev.lvm.pvinfo.call_count, 1)
+
+
 if __name__ == "__main__":
     unittest.main()
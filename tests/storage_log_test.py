@@ -0,0 +1,60 @@
+import inspect
+import logging
+import unittest
+from unittest.mock import patch
+
+from blivet import storage_log
+from blivet.flags import flags
+from blivet.storage_log import log_method_call, log_method_return
+
+
+class Traced(object):
+
+    def lookup(self, name):
+        log_method_call(self, name=name)
+        result = self.untimed(name)
+        log_method_return(self, result)
+        return result
+
+    def untimed(self, name):
+        log_method_call(self, name=name)
+        return name
+
+
+class StorageLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(storage_log.stop_method_stats)
+
+    def test_function_name_and_depth(self):
+        depth = len(inspect.stack())
+        self.assertEqual(storage_log.function_name_and_depth(),
+                         ("test_function_name_and_depth", depth))
+
+    @patch("blivet.storage_log.time.time")
+    def test_method_stats(self, mock_time):
+        mock_time.side_effect = [1.0, 1.5, 4.0]
+
+        traced = Traced()
+        # nothing is recorded unless asked to
+        traced.lookup("sda")
+
+        stats = storage_log.start_method_stats()
+        traced.lookup("sda")
+        self.assertIs(storage_log.stop_method_stats(), stats)
+        traced.lookup("sda")
+
+        report = stats.report()
+        self.assertEqual(report["Traced.lookup"], {"calls": 1, "timed_calls": 1, "time": 3.0})
+        self.assertEqual(report["Traced.untimed"], {"calls": 1, "timed_calls": 0, "time": 0.0})
+
+    def test_trace_flag(self):
+        traced = Traced()
+        with patch.object(flags, "trace_method_calls", new=False):
+            stats = storage_log.start_method_stats()
+            with self.assertLogs("blivet", level=logging.DEBUG) as logs:
+                traced.lookup("sda")
+                storage_log.log.debug("done")
+
+        self.assertEqual(logs.output, ["DEBUG:blivet:done"])
+        self.assertEqual(stats.report(), {})
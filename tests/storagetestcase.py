@@ -1,4 +1,5 @@
 
+import os
 import unittest
 from mock import Mock
 
@@ -6,10 +7,12 @@ import parted
 
 import blivet as blivet
 from blivet.formats import get_format
+from blivet.util import create_sparse_tempfile
 
 # device classes for brevity's sake -- later on, that is
 from blivet.devices import StorageDevice
 from blivet.devices import PartitionDevice
+from blivet.devices import DiskFile
 
 
 class StorageTestCase(unittest.TestCase):
@@ -166,6 +169,30 @@ class StorageTestCase(unittest.TestCase):
 
         return fmt
 
+    def new_disk_file(self, size, label_type=None):
+        """ Return a new disk backed by a sparse file, with a new disklabel.
+
+            The disk is added to the devicetree and the file is removed when
+            the test case is cleaned up.
+
+            Keyword Arguments:
+
+                label_type - type of the disklabel to create on the disk, the
+                             platform's default if None
+        """
+        filename = create_sparse_tempfile("storagetest", size)
+        self.addCleanup(os.unlink, filename)
+
+        disk = DiskFile(filename)
+        self.storage.devicetree._add_device(disk)
+        if label_type is None:
+            self.storage.initialize_disk(disk)
+        else:
+            self.storage.format_device(disk, get_format("disklabel", device=disk.path,
+                                                        label_type=label_type))
+
+        return disk
+
     def destroy_all_devices(self, disks=None):
         """ Remove all devices from the devicetree.
 
@@ -0,0 +1,90 @@
+from distutils.version import LooseVersion
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch, PropertyMock
+
+import blivet.tasks.availability as availability
+
+
+class AvailabilityCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bindir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.bindir)
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        self.cache_file = os.path.join(cachedir, "cache.json")
+
+        program = os.path.join(self.bindir, "blivet-test-app")
+        with open(program, "w") as f:
+            f.write("#!/bin/sh\n")
+        os.chmod(program, stat.S_IRWXU)
+
+        patcher = patch.dict(os.environ, {"PATH": self.bindir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolve(self):
+        present = availability.application("blivet-test-app")
+        missing = availability.application("blivet-missing-app")
+        plugin = availability.blockdev_plugin("blivet-test-plugin")
+
+        with patch("blivet.tasks.availability.util.find_program_in_path") as find_program:
+            availability.resolve([present, missing])
+            self.assertFalse(find_program.called)
+
+        self.assertTrue(present.available)
+        self.assertFalse(missing.available)
+        self.assertIsNone(plugin._availability_errors)
+
+        with patch("blivet.tasks.availability.load_plugins",
+                   return_value=set(["blivet-test-plugin"])) as load_plugins:
+            availability.resolve([plugin, availability.blockdev_plugin("other")])
+            load_plugins.assert_called_once()
+            self.assertEqual(set(load_plugins.call_args[0][0]), set(["blivet-test-plugin", "other"]))
+
+        self.assertTrue(plugin.available)
+
+    def test_cache_file(self):
+        present = availability.application("blivet-test-app")
+        missing = availability.application("blivet-missing-app")
+        availability.prefetch([present, missing], cache_file=self.cache_file)
+        self.assertTrue(os.path.exists(self.cache_file))
+
+        # new resources take their results from the cache
+        present = availability.application("blivet-test-app")
+        missing = availability.application("blivet-missing-app")
+        self.assertTrue(availability.load_cache(self.cache_file))
+        self.assertEqual(present._availability_errors, [])
+        self.assertNotEqual(missing._availability_errors, [])
+
+        # installing a program makes the cache out of date
+        present = availability.application("blivet-test-app")
+        shutil.copy(os.path.join(self.bindir, "blivet-test-app"),
+                    os.path.join(self.bindir, "blivet-missing-app"))
+        os.utime(self.bindir, (0, 0))
+        self.assertFalse(availability.load_cache(self.cache_file))
+        self.assertIsNone(present._availability_errors)
+
+    def test_prefetch_version_errors(self):
+        package = availability.PackageMethod(availability.PackageInfo("blivet-test", LooseVersion("1.0")))
+        app = availability.application_by_package("blivet-test-app", package)
+
+        # a failed version check is raised and nothing is recorded
+        with patch.object(availability.PackageMethod, "package_version", new_callable=PropertyMock,
+                          side_effect=RuntimeError("broken package database")):
+            with self.assertRaises(RuntimeError):
+                availability.prefetch([app])
+
+        self.assertIsNone(package._version_errors)
+        self.assertIsNone(app._availability_errors)
+
+        with patch.object(availability.PackageMethod, "package_version", new_callable=PropertyMock,
+                          return_value=LooseVersion("0.9")):
+            availability.prefetch([app])
+
+        self.assertEqual(len(package._version_errors), 1)
+        self.assertFalse(app.available)
@@ -51,3 +51,16 @@ class TopologicalSortTestCase(unittest.TestCase):
         # verify that all ordering constraints are satisfied
         self.assertTrue(check_order(order, graph),
                         "ordering constraints not satisfied")
+
+    def test_tsort(self):
+        self.run_test()
+
+        # the graph is left intact and the result is deterministic
+        items = list(range(6))
+        edges = [(0, 3), (1, 3), (3, 4), (2, 5)]
+        graph = blivet.tsort.create_graph(items, edges)
+        order = blivet.tsort.tsort(graph)
+        self.assertEqual(order, [2, 5, 1, 0, 3, 4])
+        self.assertEqual(graph['edges'], edges)
+        self.assertEqual(graph['incoming'], {0: 0, 1: 0, 2: 0, 3: 2, 4: 1, 5: 1})
+        self.assertEqual(blivet.tsort.tsort(graph), order)
@@ -35,3 +35,75 @@ class UdevTest(unittest.TestCase):
         import blivet.udev
         blivet.udev.trigger()
         self.assertTrue(blivet.udev.util.run_program.called)
+
+    def test_udev_settle_coalescing(self):
+        import blivet.udev
+        blivet.udev.os.path.exists.return_value = False
+        stats = blivet.udev.settle_stats
+        executed = stats.executed
+        skipped = stats.skipped
+
+        with mock.patch.object(blivet.udev, "_get_uevent_seqnum", return_value=42):
+            blivet.udev.settle(coalesce=True)
+            self.assertEqual(stats.executed, executed + 1)
+            self.assertEqual(blivet.udev.util.run_program.call_count, 1)
+
+            # no new uevents and an empty queue, so there is nothing to wait for
+            blivet.udev.settle(coalesce=True)
+            self.assertEqual(stats.executed, executed + 1)
+            self.assertEqual(stats.skipped, skipped + 1)
+            self.assertEqual(blivet.udev.util.run_program.call_count, 1)
+
+            # events still in udev's queue
+            blivet.udev.os.path.exists.return_value = True
+            blivet.udev.settle(coalesce=True)
+            self.assertEqual(stats.executed, executed + 2)
+
+            # settling after a change always waits for udev
+            blivet.udev.os.path.exists.return_value = False
+            blivet.udev.settle()
+            self.assertEqual(stats.executed, executed + 3)
+            self.assertEqual(stats.skipped, skipped + 1)
+
+        blivet.udev.os.path.exists.return_value = False
+        with mock.patch.object(blivet.udev, "_get_uevent_seqnum", return_value=43):
+            blivet.udev.settle(coalesce=True)
+            self.assertEqual(stats.executed, executed + 4)
+            self.assertEqual(stats.skipped, skipped + 1)
+
+        stats.seqnum = None
+
+    def test_udev_resolve_devspec(self):
+        import blivet.udev
+
+        class UdevInfo(dict):
+            def __init__(self, sys_name, **kwargs):
+                super().__init__(**kwargs)
+                self.sys_name = sys_name
+
+        sda1 = UdevInfo("sda1", ID_FS_LABEL="boot", ID_FS_UUID="1234",
+                        DEVLINKS="/dev/disk/by-label/boot /dev/disk/by-uuid/1234")
+        dm0 = UdevInfo("dm-0", DM_NAME="vg-root", DEVLINKS="/dev/vg/root /dev/mapper/vg-root")
+        devices = [sda1, dm0]
+
+        with mock.patch.object(blivet.udev, "_list_devices", return_value=devices) as list_devices:
+            blivet.udev.invalidate_device_snapshot()
+            self.assertEqual(blivet.udev.resolve_devspec("LABEL=boot"), "sda1")
+            self.assertEqual(blivet.udev.resolve_devspec("UUID=1234"), "sda1")
+            self.assertEqual(blivet.udev.resolve_devspec("/dev/sda1"), "sda1")
+            self.assertEqual(blivet.udev.resolve_devspec("/dev/disk/by-label/boot"), "sda1")
+            self.assertEqual(blivet.udev.resolve_devspec("/dev/mapper/vg-root"), "vg-root")
+            self.assertEqual(blivet.udev.resolve_devspec("/dev/vg/root", sysname=True), "dm-0")
+            self.assertEqual(blivet.udev.resolve_devspec("dm-0"), "vg-root")
+            self.assertIsNone(blivet.udev.resolve_devspec("LABEL=home"))
+            self.assertIsNone(blivet.udev.resolve_devspec("/dev/sdb"))
+
+            # the udev database was only enumerated once
+            self.assertEqual(list_devices.call_count, 1)
+
+            # settling udev discards the snapshot
+            blivet.udev.settle()
+            self.assertEqual(blivet.udev.resolve_devspec("/dev/sda1"), "sda1")
+            self.assertEqual(list_devices.call_count, 2)
+
+        blivet.udev.invalidate_device_snapshot()